@@ -7,7 +7,7 @@ This module initializes the application and provides the application factory.
 __version__ = "0.1.0"
 
 from app.core.config import settings
-from app.core.init import init_application
+from app.core.init import init_application, startup_application, ashutdown_application
 
 def create_app():
     """
@@ -16,6 +16,7 @@ def create_app():
     Returns:
         FastAPI: The configured FastAPI application
     """
+    from contextlib import asynccontextmanager
     from fastapi import FastAPI
     from fastapi.middleware.cors import CORSMiddleware
     from app.api.routes import router as api_router
@@ -23,10 +24,18 @@ def create_app():
     # Initialize the application before creating the FastAPI instance
     init_application()
     
+    @asynccontextmanager
+    async def lifespan(app):
+        # Warm up shared resources on startup and release them on shutdown
+        startup_application()
+        yield
+        await ashutdown_application()
+    
     app = FastAPI(
         title=settings.APP_NAME,
         description=settings.APP_DESCRIPTION,
-        version=settings.APP_VERSION
+        version=settings.APP_VERSION,
+        lifespan=lifespan
     )
     
     # Configure CORS
@@ -36,9 +45,26 @@ def create_app():
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[settings.TRACING_RESPONSE_HEADER, "Server-Timing"],
     )
     
+    # Let the allowed origins read the stage timings from the browser's timing API
+    if settings.SERVER_TIMING_ENABLED:
+        from app.api.routes import allow_timing_origins
+        app.middleware("http")(allow_timing_origins)
+    
     # Include API router
     app.include_router(api_router)
     
+    # Expose Prometheus metrics and time every request
+    if settings.METRICS_ENABLED:
+        from app.api.routes import metrics_router, record_request_metrics
+        app.middleware("http")(record_request_metrics)
+        app.include_router(metrics_router)
+    
+    # Trace every request, returning its trace ID in a response header
+    if settings.TRACING_ENABLED:
+        from app.api.routes import trace_requests
+        app.middleware("http")(trace_requests)
+    
     return app 
\ No newline at end of file
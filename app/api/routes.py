@@ -2,16 +2,31 @@
 API routes module.
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Body
-from typing import Dict, Any
+import json
+import time
+from fastapi import APIRouter, HTTPException, Depends, Body, Request, Query
+from fastapi.responses import StreamingResponse, Response
+from typing import Dict, Any, AsyncIterator, Optional
 
-from app.schemas.chat import ChatRequest, ChatResponse
-from app.services.chat import chat_with_simple_chain, chat_with_graph
+from app.schemas.chat import ChatRequest, ChatResponse, MessagePage
+from app.services.chat import (
+    aget_session_messages,
+    achat_with_simple_chain,
+    achat_with_graph,
+    astream_chat_with_simple_chain,
+    astream_chat_with_graph
+)
 from app.enum.model import ModelProvider
+from app.core.config import settings
+from app.core.metrics import HTTP_REQUESTS, render_metrics, collect_request_timings, format_server_timing
+from app.core.tracing import request_span, finish_request_span, get_trace_id
 
 # Create API router
 router = APIRouter(prefix="/api")
 
+# Router of the Prometheus endpoint, mounted outside the API prefix
+metrics_router = APIRouter()
+
 def validate_model_provider(provider):
     """
     Validate and convert the model provider to the correct enum value.
@@ -42,6 +57,21 @@ def validate_model_provider(provider):
     # If we got here, the type is not supported
     raise ValueError(f"Unsupported model provider type: {type(provider)}")
 
+def timings_in_ms(timings: Dict[str, float], total: float) -> Dict[str, float]:
+    """
+    Convert stage durations to milliseconds for the response body.
+    
+    Args:
+        timings (Dict[str, float]): Stage name -> duration in seconds
+        total (float): Duration of the whole request in seconds
+        
+    Returns:
+        Dict[str, float]: Stage name -> duration in milliseconds, plus "total"
+    """
+    result = {stage: round(seconds * 1000, 1) for stage, seconds in timings.items()}
+    result["total"] = round(total * 1000, 1)
+    return result
+
 @router.get("/")
 async def root():
     """Root endpoint."""
@@ -50,39 +80,257 @@ async def root():
     }
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest = Body(...)):
+async def chat(http_response: Response, request: ChatRequest = Body(...)):
     """
     Chat endpoint.
     
+    The duration of each stage is returned in a Server-Timing header and, if
+    requested, in the timings field of the response.
+    
     Args:
+        http_response (Response): The response, to set the Server-Timing header
         request (ChatRequest): The chat request
     
     Returns:
         ChatResponse: The chat response
     """
+    started = time.perf_counter()
+    timings = collect_request_timings()
     try:
         # Validate the model provider
         
         validated_provider = validate_model_provider(request.model_provider)
         
         if request.use_graph:
-            response, session_id = chat_with_graph(
+            response, session_id = await achat_with_graph(
                 request.user_input, 
                 request.session_id, 
                 model_provider=validated_provider,
             )
         else:
-            response, session_id = chat_with_simple_chain(
+            response, session_id = await achat_with_simple_chain(
                 request.user_input, 
                 request.session_id, 
                 model_provider=validated_provider
             )
         
-        return ChatResponse(response=response, session_id=session_id)
+        total = time.perf_counter() - started
+        if settings.SERVER_TIMING_ENABLED:
+            http_response.headers["Server-Timing"] = format_server_timing(timings, total)
+        
+        return ChatResponse(
+            response=response,
+            session_id=session_id,
+            timings=timings_in_ms(timings, total) if request.include_timings else None
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
 
+def format_sse_event(data: Dict[str, Any], event: str = None) -> str:
+    """
+    Format a server-sent event.
+    
+    Args:
+        data (Dict[str, Any]): The event payload, sent as JSON
+        event (str, optional): The event name
+        
+    Returns:
+        str: The encoded event
+    """
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+async def stream_chat_events(chunks: AsyncIterator[str], session_id: str,
+                             timings: Optional[Dict[str, float]] = None, started: Optional[float] = None) -> AsyncIterator[str]:
+    """
+    Turn the response chunks into server-sent events.
+    
+    Args:
+        chunks (AsyncIterator[str]): The response text, chunk by chunk
+        session_id (str): The session ID
+        timings (Dict[str, float], optional): Stage durations of the request, added to the "done" event
+        started (float, optional): perf_counter() value at the start of the request
+        
+    Yields:
+        str: A "session" event, one "token" event per chunk and a final "done" or "error" event
+    """
+    yield format_sse_event({"session_id": session_id}, event="session")
+    
+    output = []
+    try:
+        async for chunk in chunks:
+            output.append(chunk)
+            yield format_sse_event({"token": chunk}, event="token")
+    except Exception as e:
+        yield format_sse_event({"detail": f"Error processing request: {str(e)}"}, event="error")
+        return
+    
+    done = {"output": "".join(output), "session_id": session_id}
+    if timings is not None:
+        done["timings"] = timings_in_ms(timings, time.perf_counter() - started)
+    yield format_sse_event(done, event="done")
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest = Body(...)):
+    """
+    Streaming chat endpoint.
+    
+    Streams the response as server-sent events while it is generated. The
+    assistant message is stored once the stream has finished. The Server-Timing
+    header covers the stages before the first event; if requested, the timings of
+    the whole request are sent in the "done" event.
+    
+    Args:
+        request (ChatRequest): The chat request
+    
+    Returns:
+        StreamingResponse: A text/event-stream response
+    """
+    started = time.perf_counter()
+    timings = collect_request_timings()
+    try:
+        # Validate the model provider
+        validated_provider = validate_model_provider(request.model_provider)
+        
+        if request.use_graph:
+            chunks, session_id = await astream_chat_with_graph(
+                request.user_input, 
+                request.session_id, 
+                model_provider=validated_provider,
+            )
+        else:
+            chunks, session_id = await astream_chat_with_simple_chain(
+                request.user_input, 
+                request.session_id, 
+                model_provider=validated_provider
+            )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
+    
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if settings.SERVER_TIMING_ENABLED:
+        headers["Server-Timing"] = format_server_timing(timings, time.perf_counter() - started)
+    
+    return StreamingResponse(
+        stream_chat_events(chunks, session_id, timings if request.include_timings else None, started),
+        media_type="text/event-stream",
+        headers=headers
+    )
+
+@router.get("/sessions/{session_id}/messages", response_model=MessagePage)
+async def session_messages(
+    session_id: str,
+    before: Optional[int] = Query(None, ge=0, description="Cursor returned by the previous page"),
+    limit: int = Query(20, ge=1, le=100, description="Page size")
+):
+    """
+    Session messages endpoint.
+    
+    Returns the newest messages of a session; pass the returned next_before as
+    before to page back through older messages.
+    
+    Args:
+        session_id (str): The session ID
+        before (int, optional): Cursor returned by the previous page
+        limit (int): Page size
+    
+    Returns:
+        MessagePage: The page of messages and the cursor of the next older page
+    """
+    try:
+        page = await aget_session_messages(session_id, before=before, limit=limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
+    
+    if page is None:
+        raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+    
+    messages, next_before = page
+    return MessagePage(session_id=session_id, messages=messages, next_before=next_before)
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "ok"} 
\ No newline at end of file
+    return {"status": "ok"}
+
+@metrics_router.get(settings.METRICS_PATH, include_in_schema=False)
+async def metrics():
+    """Prometheus metrics endpoint."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+async def record_request_metrics(request: Request, call_next):
+    """
+    HTTP middleware recording the duration and status of every request.
+    
+    Requests are labelled with the route template rather than the raw path, so
+    the number of series stays bounded.
+    
+    Args:
+        request (Request): The incoming request
+        call_next (Callable): The next handler
+    
+    Returns:
+        Response: The response of the next handler
+    """
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        if path != settings.METRICS_PATH:
+            HTTP_REQUESTS.labels(method=request.method, path=path, status=str(status)).observe(time.perf_counter() - started)
+
+async def trace_requests(request: Request, call_next):
+    """
+    HTTP middleware recording every request as the root span of its trace.
+    
+    A W3C traceparent header is continued, and the trace ID is returned in the
+    TRACING_RESPONSE_HEADER header. For streaming responses the span ends when the
+    headers are sent; the spans of the stream are still part of the trace.
+    
+    Args:
+        request (Request): The incoming request
+        call_next (Callable): The next handler
+    
+    Returns:
+        Response: The response of the next handler
+    """
+    with request_span(request.method, request.url.path, request.headers) as span:
+        response = await call_next(request)
+        if span is not None:
+            route = request.scope.get("route")
+            finish_request_span(span, request.method, getattr(route, "path", None), response.status_code)
+            trace_id = get_trace_id(span)
+            if trace_id:
+                response.headers[settings.TRACING_RESPONSE_HEADER] = trace_id
+        return response
+
+async def allow_timing_origins(request: Request, call_next):
+    """
+    HTTP middleware sending Timing-Allow-Origin to the allowed CORS origins.
+    
+    Browsers only show the Server-Timing entries of a cross-origin response in
+    their Resource Timing API when its origin is allowed by this header.
+    
+    Args:
+        request (Request): The incoming request
+        call_next (Callable): The next handler
+    
+    Returns:
+        Response: The response of the next handler
+    """
+    response = await call_next(request)
+    origin = request.headers.get("origin")
+    if "*" in settings.CORS_ORIGINS:
+        response.headers["Timing-Allow-Origin"] = "*"
+    elif origin in settings.CORS_ORIGINS:
+        response.headers["Timing-Allow-Origin"] = origin
+    return response
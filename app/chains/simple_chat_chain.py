@@ -1,25 +1,69 @@
+import asyncio
+from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
-from app.models.llm_models import get_model
+from app.models.llm_models import get_model, get_run_config
 from app.models.memory import get_conversation_memory
+from app.models.response_cache import get_response_cache_scope, lookup_response, alookup_response, store_response
+from app.services.persistence import enqueue_message_writes
+from app.core.metrics import stage_timer
 from app.utils.langsmith import get_langchain_tracer
 from app.config.config import LANGSMITH_TRACING
-from app.enum.model import ModelProvider, ModelGeminiName, ModelOpenAiName
+from app.enum.model import ModelProvider, ModelGeminiName, ModelOpenAiName, ModelFakeName
+from app.utils.get_prompt import SIMPLE_CHAT_SYSTEM_PROMPT, get_compiled_prompt
 
-def create_simple_chat_chain(session_id, model_provider: ModelProvider = ModelProvider.GEMINI, model_name: ModelGeminiName = ModelGeminiName.GEMINI_2_0_FLASH.value, temperature=0.7, max_tokens=200):
+# Prompt templates by provider, built once per process
+_simple_chat_prompts = {}
+
+def _get_simple_chat_prompt(model_provider):
     """
-    Create a simple conversational chain with memory.
+    Get the prompt template of the simple chat chain for a provider, building it on first use.
+    
+    Args:
+        model_provider (str): The LLM provider to use ('openai' or 'gemini')
+        
+    Returns:
+        ChatPromptTemplate: The prompt template
+    """
+    provider_value = model_provider.value if hasattr(model_provider, 'value') else str(model_provider)
+    prompt = _simple_chat_prompts.get(provider_value)
+    if prompt is not None:
+        return prompt
+    
+    system_instruction = get_compiled_prompt(SIMPLE_CHAT_SYSTEM_PROMPT).text
+    
+    if provider_value == ModelProvider.GEMINI.value:
+        # For Gemini, we include the system instruction in the first human message
+        prompt = ChatPromptTemplate.from_messages([
+            MessagesPlaceholder(variable_name="history"),
+            ("human", f"{system_instruction}\n\n{{input}}"),
+        ])
+    else:
+        # For other models like OpenAI, we use a separate system message
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", system_instruction),
+            MessagesPlaceholder(variable_name="history"),
+            ("human", "{input}"),
+        ])
+    
+    _simple_chat_prompts[provider_value] = prompt
+    return prompt
+
+def _build_simple_chain(session_id, model_provider, model_name, temperature, max_tokens):
+    """
+    Build the prompt | llm | parser chain, run config and response cache scope shared by the simple chat chains.
     
     Args:
         session_id (str): A unique identifier for the conversation
         model_provider (str): The LLM provider to use ('openai' or 'gemini')
         model_name (str, optional): The specific model name to use
         temperature (float): Controls randomness in responses
-        max_tokens (int): Maximum number of tokens in the response (default: 150)
+        max_tokens (int): Maximum number of tokens in the response
         
     Returns:
-        Runnable: A runnable chain for chatting
+        Tuple[Runnable, RunnableConfig, ResponseCacheScope]: The chain producing the response text, the invoke-time
+            config carrying the tracing run name and session metadata, and the scope of the cached responses
     """
     # Configure model parameters
     model_kwargs = {
@@ -29,6 +73,8 @@ def create_simple_chat_chain(session_id, model_provider: ModelProvider = ModelPr
     
     if model_provider == ModelProvider.OPENAI:
         model_name = ModelOpenAiName.OPENAI_GPT_4_1_NANO
+    elif model_provider == ModelProvider.FAKE:
+        model_name = ModelFakeName.FAKE_CHAT
     # Convert enum to string value if it's an enum
     model_name_value = model_name.value if hasattr(model_name, 'value') else model_name
     
@@ -38,51 +84,181 @@ def create_simple_chat_chain(session_id, model_provider: ModelProvider = ModelPr
     # Run name for tracing
     run_name = f"{model_provider}-simple-chat-{session_id}"
     
-    # Get the language model
-    llm = get_model(provider=model_provider, run_name=run_name, **model_kwargs)
+    # Get the pooled language model; tracing data is passed per call through the run config
+    llm = get_model(provider=model_provider, **model_kwargs)
+    config = get_run_config(run_name, session_id=session_id, provider=model_provider, model_name=model_name_value)
     
-    # Get conversation memory
-    message_history = get_conversation_memory(session_id)
+    # Cached responses are only reused with the same model and system instruction
+    cache_scope = get_response_cache_scope(model_provider, model_name_value, get_compiled_prompt(SIMPLE_CHAT_SYSTEM_PROMPT).cache_key)
     
-    # Create the prompt template - handle differently based on model provider
-    system_instruction = """You are a friendly and helpful HSK chatbot assistant. Your name is "mIA"
-    Please respond in the same language as the user's input.
-    You specialize in teaching Chinese (HSK) and can help with vocabulary, grammar, and language learning."""
-    
-    if model_provider == ModelProvider.GEMINI:
-        # For Gemini, we include the system instruction in the first human message
-        prompt = ChatPromptTemplate.from_messages([
-            MessagesPlaceholder(variable_name="history"),
-            ("human", f"{system_instruction}\n\n{{input}}"),
-        ])
-    elif model_provider == ModelProvider.OPENAI:
-        # For other models like OpenAI, we use a separate system message
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_instruction),
-            MessagesPlaceholder(variable_name="history"),
-            ("human", "{input}"),
-        ])
+    # The prompt template is built once per provider
+    prompt = _get_simple_chat_prompt(model_provider)
     
     # Chain together the components
-    chain = prompt | llm | StrOutputParser()
+    return prompt | llm | StrOutputParser(), config, cache_scope
+
+def create_simple_chat_chain(session_id, model_provider: ModelProvider = ModelProvider.GEMINI, model_name: ModelGeminiName = ModelGeminiName.GEMINI_2_0_FLASH.value, temperature=0.7, max_tokens=200):
+    """
+    Create a simple conversational chain with memory.
+    
+    Args:
+        session_id (str): A unique identifier for the conversation
+        model_provider (str): The LLM provider to use ('openai' or 'gemini')
+        model_name (str, optional): The specific model name to use
+        temperature (float): Controls randomness in responses
+        max_tokens (int): Maximum number of tokens in the response (default: 150)
+        
+    Returns:
+        Runnable: A runnable chain for chatting
+    """
+    chain, config, cache_scope = _build_simple_chain(session_id, model_provider, model_name, temperature, max_tokens)
+    
+    # Get conversation memory
+    message_history = get_conversation_memory(session_id)
     
     # Create the chain with memory handled manually
     def chain_with_memory(input_dict):
         # Get the chat history
-        history = message_history.messages
+        with stage_timer("history_fetch"):
+            history = message_history.messages
         
-        # Invoke the chain
-        output = chain.invoke({
-            "input": input_dict["input"],
-            "history": history
-        })
+        # Serve repeated questions from the response cache without calling the LLM;
+        # the cache is shared by every session, so only a turn without history uses it
+        with stage_timer("response_cache_lookup"):
+            cached = lookup_response(cache_scope, input_dict["input"]) if not history else None
+        if cached and cached.response is not None:
+            output = cached.response
+        else:
+            # Invoke the chain
+            with stage_timer("llm_generate"):
+                output = chain.invoke({
+                    "input": input_dict["input"],
+                    "history": history
+                }, config=config)
+            if cached:
+                store_response(cache_scope, input_dict["input"], output, cached.query_vector)
         
-        # Add to history
-        message_history.add_user_message(input_dict["input"])
-        message_history.add_ai_message(output)
+        # Save the turn to the chat session store and the vector store in the background, after the response is returned
+        enqueue_message_writes(session_id, [
+            HumanMessage(content=input_dict["input"]),
+            AIMessage(content=output)
+        ])
         
         # Return a dictionary with output key instead of just the string
         return {"output": output}
     
     # Return the chain function
-    return chain_with_memory 
\ No newline at end of file
+    return chain_with_memory
+
+def create_async_simple_chat_chain(session_id, model_provider: ModelProvider = ModelProvider.GEMINI, model_name: ModelGeminiName = ModelGeminiName.GEMINI_2_0_FLASH.value, temperature=0.7, max_tokens=200):
+    """
+    Create the asynchronous version of the simple conversational chain with memory.
+    
+    Args:
+        session_id (str): A unique identifier for the conversation
+        model_provider (str): The LLM provider to use ('openai' or 'gemini')
+        model_name (str, optional): The specific model name to use
+        temperature (float): Controls randomness in responses
+        max_tokens (int): Maximum number of tokens in the response (default: 150)
+        
+    Returns:
+        A coroutine function for chatting
+    """
+    chain, config, cache_scope = _build_simple_chain(session_id, model_provider, model_name, temperature, max_tokens)
+    
+    # Create the chain with memory handled manually
+    async def chain_with_memory(input_dict):
+        # Building the memory does blocking I/O, so keep it off the event loop
+        with stage_timer("history_fetch"):
+            message_history = await asyncio.to_thread(get_conversation_memory, session_id)
+            
+            # Get the chat history
+            history = await message_history.aget_messages()
+        
+        # Serve repeated questions from the response cache without calling the LLM;
+        # the cache is shared by every session, so only a turn without history uses it
+        with stage_timer("response_cache_lookup"):
+            cached = await alookup_response(cache_scope, input_dict["input"]) if not history else None
+        if cached and cached.response is not None:
+            output = cached.response
+        else:
+            # Invoke the chain
+            with stage_timer("llm_generate"):
+                output = await chain.ainvoke({
+                    "input": input_dict["input"],
+                    "history": history
+                }, config=config)
+            if cached:
+                store_response(cache_scope, input_dict["input"], output, cached.query_vector)
+        
+        # Save the turn to the chat session store and the vector store in the background, after the response is returned
+        enqueue_message_writes(session_id, [
+            HumanMessage(content=input_dict["input"]),
+            AIMessage(content=output)
+        ])
+        
+        # Return a dictionary with output key instead of just the string
+        return {"output": output}
+    
+    # Return the chain function
+    return chain_with_memory
+
+def create_streaming_simple_chat_chain(session_id, model_provider: ModelProvider = ModelProvider.GEMINI, model_name: ModelGeminiName = ModelGeminiName.GEMINI_2_0_FLASH.value, temperature=0.7, max_tokens=200):
+    """
+    Create the streaming version of the simple conversational chain with memory.
+    
+    Args:
+        session_id (str): A unique identifier for the conversation
+        model_provider (str): The LLM provider to use ('openai' or 'gemini')
+        model_name (str, optional): The specific model name to use
+        temperature (float): Controls randomness in responses
+        max_tokens (int): Maximum number of tokens in the response (default: 150)
+        
+    Returns:
+        An async generator function yielding the response text chunk by chunk
+    """
+    chain, config, cache_scope = _build_simple_chain(session_id, model_provider, model_name, temperature, max_tokens)
+    
+    # Create the stream with memory handled manually
+    async def stream_with_memory(input_dict):
+        # Building the memory does blocking I/O, so keep it off the event loop
+        with stage_timer("history_fetch"):
+            message_history = await asyncio.to_thread(get_conversation_memory, session_id)
+            
+            # Get the chat history
+            history = await message_history.aget_messages()
+        
+        # Serve repeated questions from the response cache as a single chunk;
+        # the cache is shared by every session, so only a turn without history uses it
+        with stage_timer("response_cache_lookup"):
+            cached = await alookup_response(cache_scope, input_dict["input"]) if not history else None
+        if cached and cached.response is not None:
+            chunks = [cached.response]
+            yield cached.response
+        else:
+            # Stream the chain output as it is generated
+            chunks = []
+            try:
+                async for chunk in chain.astream({
+                    "input": input_dict["input"],
+                    "history": history
+                }, config=config):
+                    chunks.append(chunk)
+                    yield chunk
+            except BaseException:
+                # Keep the turn if the client disconnected or generation failed mid-stream
+                enqueue_message_writes(session_id, [HumanMessage(content=input_dict["input"])] + (
+                    [AIMessage(content="".join(chunks))] if chunks else []
+                ))
+                raise
+            if cached:
+                store_response(cache_scope, input_dict["input"], "".join(chunks), cached.query_vector)
+        
+        # Save the turn to the chat session store and the vector store in the background once the full response is known
+        enqueue_message_writes(session_id, [
+            HumanMessage(content=input_dict["input"]),
+            AIMessage(content="".join(chunks))
+        ])
+    
+    # Return the stream function
+    return stream_with_memory
@@ -16,10 +16,88 @@ MONGODB_DB_NAME = os.getenv("MONGODB_DB_NAME", "hsk_chatbot")
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY", "")
 QDRANT_COLLECTION_NAME = os.getenv("QDRANT_COLLECTION_NAME", "hsk-chatbot")
+# Index session_id as the tenant key so each session's points are stored together
+QDRANT_TENANT_INDEX = os.getenv("QDRANT_TENANT_INDEX", "true").lower() == "true"
+# Keep payloads on disk instead of in RAM
+QDRANT_ON_DISK_PAYLOAD = os.getenv("QDRANT_ON_DISK_PAYLOAD", "false").lower() == "true"
+# HNSW parameters of new collections; QDRANT_HNSW_M=0 with QDRANT_HNSW_PAYLOAD_M set builds per-tenant graphs only
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+QDRANT_HNSW_PAYLOAD_M = int(os.getenv("QDRANT_HNSW_PAYLOAD_M")) if os.getenv("QDRANT_HNSW_PAYLOAD_M") else None
+QDRANT_HNSW_ON_DISK = os.getenv("QDRANT_HNSW_ON_DISK", "false").lower() == "true"
+# Vector quantization: "none", "scalar" (int8) or "binary"
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()
+QDRANT_QUANTIZATION_ALWAYS_RAM = os.getenv("QDRANT_QUANTIZATION_ALWAYS_RAM", "true").lower() == "true"
+QDRANT_SCALAR_QUANTILE = float(os.getenv("QDRANT_SCALAR_QUANTILE", "0.99"))
+# Re-score the oversampled quantized candidates with the original vectors
+QDRANT_SEARCH_RESCORE = os.getenv("QDRANT_SEARCH_RESCORE", "true").lower() == "true"
+QDRANT_SEARCH_OVERSAMPLING = float(os.getenv("QDRANT_SEARCH_OVERSAMPLING", "2.0"))
 
 # LangSmith Configuration
 LANGSMITH_API_KEY = os.getenv("LANGSMITH_API_KEY")
 LANGSMITH_PROJECT = os.getenv("LANGSMITH_PROJECT", "hsk_chatbot")
 # Only enable tracing if the API key is available
 LANGSMITH_TRACING = LANGSMITH_API_KEY is not None and os.getenv("LANGSMITH_TRACING", "true").lower() == "true"
-LANGSMITH_ENDPOINT = os.getenv("LANGSMITH_ENDPOINT", "https://api.smith.langchain.com") 
\ No newline at end of file
+LANGSMITH_ENDPOINT = os.getenv("LANGSMITH_ENDPOINT", "https://api.smith.langchain.com") 
+
+# Embedding Configuration
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+# Micro-batching of concurrent embedding calls into one encode batch
+EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64"))
+EMBEDDING_MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))
+EMBEDDING_QUEUE_SIZE = int(os.getenv("EMBEDDING_QUEUE_SIZE", "1024"))
+
+# Retrieval Configuration
+# Per-stage timeouts (seconds) for the concurrent history fetch and vector retrieval of a turn
+HISTORY_FETCH_TIMEOUT = float(os.getenv("HISTORY_FETCH_TIMEOUT", "2.0"))
+VECTOR_RETRIEVAL_TIMEOUT = float(os.getenv("VECTOR_RETRIEVAL_TIMEOUT", "1.5"))
+# Worker threads used by the synchronous pipeline to run retrieval stages concurrently
+RETRIEVAL_MAX_WORKERS = int(os.getenv("RETRIEVAL_MAX_WORKERS", "8"))
+
+# Vector Store Write Buffer Configuration
+# Messages are upserted to Qdrant in batches, flushed by size or time
+VECTOR_WRITE_BATCH_SIZE = int(os.getenv("VECTOR_WRITE_BATCH_SIZE", "64"))
+VECTOR_WRITE_FLUSH_INTERVAL_MS = float(os.getenv("VECTOR_WRITE_FLUSH_INTERVAL_MS", "200"))
+VECTOR_WRITE_MAX_BUFFER = int(os.getenv("VECTOR_WRITE_MAX_BUFFER", "10000"))
+
+# Session Vector Cache Configuration
+# Per-session embedding matrices kept in process so retrieval scoped to one session is answered locally.
+# Single worker only: an index is not invalidated when another process writes to its session.
+SESSION_VECTOR_CACHE_ENABLED = os.getenv("SESSION_VECTOR_CACHE_ENABLED", "false").lower() == "true"
+SESSION_VECTOR_CACHE_MAX_SESSIONS = int(os.getenv("SESSION_VECTOR_CACHE_MAX_SESSIONS", "1000"))
+SESSION_VECTOR_CACHE_MAX_BYTES = int(os.getenv("SESSION_VECTOR_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+SESSION_VECTOR_CACHE_TTL_SECONDS = float(os.getenv("SESSION_VECTOR_CACHE_TTL_SECONDS", "1800"))
+# Sessions with more points than this are not cached and are always searched in Qdrant
+SESSION_VECTOR_CACHE_MAX_POINTS = int(os.getenv("SESSION_VECTOR_CACHE_MAX_POINTS", "5000"))
+
+# Response Cache Configuration
+# Answers to repeated questions are served from memory, matched exactly on the normalized input or by embedding similarity.
+# Only turns without session history or retrieved context use it, since the cache is shared by every session
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "86400"))
+# Minimum cosine similarity for a near-duplicate question to reuse an answer, 0 disables the semantic match
+RESPONSE_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+
+# Prompt Configuration
+# Token budget and per-message length cap of the similar-messages context block added to the system prompt
+PROMPT_CONTEXT_MAX_TOKENS = int(os.getenv("PROMPT_CONTEXT_MAX_TOKENS", "600"))
+PROMPT_CONTEXT_MAX_MESSAGE_CHARS = int(os.getenv("PROMPT_CONTEXT_MAX_MESSAGE_CHARS", "400"))
+# tiktoken encoding used to count prompt tokens; a character estimate is used if it cannot be loaded
+PROMPT_TOKEN_ENCODING = os.getenv("PROMPT_TOKEN_ENCODING", "o200k_base")
+
+# Fake LLM Configuration
+# Offline provider returning deterministic responses, for load and latency tests without API calls
+FAKE_LLM_ENABLED = os.getenv("FAKE_LLM_ENABLED", "false").lower() == "true"
+# Time to the first token: "fixed", "uniform", "normal" or "lognormal" around FAKE_LLM_LATENCY_MS
+FAKE_LLM_LATENCY_DISTRIBUTION = os.getenv("FAKE_LLM_LATENCY_DISTRIBUTION", "normal").lower()
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "300"))
+FAKE_LLM_LATENCY_JITTER_MS = float(os.getenv("FAKE_LLM_LATENCY_JITTER_MS", "50"))
+# Rate at which the response tokens are generated, 0 for no delay between tokens
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "50"))
+FAKE_LLM_RESPONSE_TOKENS = int(os.getenv("FAKE_LLM_RESPONSE_TOKENS", "40"))
+# Fraction of calls failing with FakeLLMError
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+# Seed of the latency and error draws, so a run can be repeated
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
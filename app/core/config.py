@@ -21,6 +21,20 @@ class Settings(BaseModel):
     # Database settings
     MONGODB_URI: str = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
     MONGODB_DB_NAME: str = os.getenv("MONGODB_DB_NAME", "hsk_chatbot")
+    MONGODB_MAX_POOL_SIZE: int = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+    MONGODB_MIN_POOL_SIZE: int = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+    MONGODB_MAX_IDLE_TIME_MS: int = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "60000"))
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+    MONGODB_CONNECT_TIMEOUT_MS: int = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "5000"))
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+    MONGODB_SOCKET_TIMEOUT_MS: int = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "10000"))
+    MONGODB_RETRY_WRITES: bool = os.getenv("MONGODB_RETRY_WRITES", "true").lower() == "true"
+    MONGODB_WRITE_CONCERN: str = os.getenv("MONGODB_WRITE_CONCERN", "1")
+    # Unset leaves the journal acknowledgement to the server default; opt in with true
+    MONGODB_WRITE_CONCERN_JOURNAL: Optional[bool] = (
+        os.getenv("MONGODB_WRITE_CONCERN_JOURNAL").lower() == "true"
+        if os.getenv("MONGODB_WRITE_CONCERN_JOURNAL") else None
+    )
     
     # LLM API settings
     OPENAI_API_KEY: Optional[str] = os.getenv("OPENAI_API_KEY")
@@ -33,6 +47,41 @@ class Settings(BaseModel):
     LANGSMITH_TRACING: bool = os.getenv("LANGSMITH_TRACING", "false").lower() == "true"
     LANGSMITH_ENDPOINT: str = os.getenv("LANGSMITH_ENDPOINT", "https://api.smith.langchain.com")
     
+    # Write-behind persistence settings
+    WRITE_BEHIND_MAX_BATCH_SIZE: int = int(os.getenv("WRITE_BEHIND_MAX_BATCH_SIZE", "50"))
+    WRITE_BEHIND_MAX_WAIT_MS: float = float(os.getenv("WRITE_BEHIND_MAX_WAIT_MS", "20"))
+    WRITE_BEHIND_MAX_RETRIES: int = int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "3"))
+    WRITE_BEHIND_RETRY_BACKOFF_MS: float = float(os.getenv("WRITE_BEHIND_RETRY_BACKOFF_MS", "100"))
+    WRITE_BEHIND_QUEUE_SIZE: int = int(os.getenv("WRITE_BEHIND_QUEUE_SIZE", "10000"))
+    WRITE_BEHIND_SESSION_WAIT_TIMEOUT: float = float(os.getenv("WRITE_BEHIND_SESSION_WAIT_TIMEOUT", "5.0"))
+    WRITE_BEHIND_DRAIN_TIMEOUT: float = float(os.getenv("WRITE_BEHIND_DRAIN_TIMEOUT", "30.0"))
+    # Writes that failed every retry or found the queue full are kept and replayed at this interval
+    WRITE_BEHIND_FAILED_QUEUE_SIZE: int = int(os.getenv("WRITE_BEHIND_FAILED_QUEUE_SIZE", "10000"))
+    WRITE_BEHIND_REPLAY_INTERVAL: float = float(os.getenv("WRITE_BEHIND_REPLAY_INTERVAL", "30.0"))
+    
+    # Chat session storage settings
+    CHAT_SESSION_BUCKET_SIZE: int = int(os.getenv("CHAT_SESSION_BUCKET_SIZE", "100"))
+    
+    # Conversation memory cache settings
+    MEMORY_CACHE_MAX_ENTRIES: int = int(os.getenv("MEMORY_CACHE_MAX_ENTRIES", "1000"))
+    MEMORY_CACHE_MAX_BYTES: int = int(os.getenv("MEMORY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    MEMORY_CACHE_TTL_SECONDS: float = float(os.getenv("MEMORY_CACHE_TTL_SECONDS", "1800"))
+    MEMORY_CACHE_MAX_MESSAGES: int = int(os.getenv("MEMORY_CACHE_MAX_MESSAGES", "10"))
+    
+    # Metrics settings
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_PATH: str = os.getenv("METRICS_PATH", "/metrics")
+    SERVER_TIMING_ENABLED: bool = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+    
+    # Tracing settings
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+    TRACING_EXPORTER: str = os.getenv("TRACING_EXPORTER", "console")
+    TRACING_FILE_PATH: str = os.getenv("TRACING_FILE_PATH", "traces.jsonl")
+    TRACING_SAMPLE_RATIO: float = float(os.getenv("TRACING_SAMPLE_RATIO", "1.0"))
+    TRACING_SERVICE_NAME: str = os.getenv("TRACING_SERVICE_NAME", "hsk-chatbot")
+    TRACING_INSTRUMENT_MONGODB: bool = os.getenv("TRACING_INSTRUMENT_MONGODB", "true").lower() == "true"
+    TRACING_RESPONSE_HEADER: str = os.getenv("TRACING_RESPONSE_HEADER", "X-Trace-Id")
+    
     model_config = {
         "env_file": ".env",
         "case_sensitive": True,
@@ -5,8 +5,13 @@ Application initialization module.
 import os
 import logging
 from app.core.config import settings
-from app.repositories.mongodb import get_mongodb_client
+from app.repositories.mongodb import get_mongodb_client, close_mongodb_clients
 from app.core.langsmith import get_langsmith_client
+from app.core.tracing import init_tracing, shutdown_tracing
+from app.models.vector_store import warm_up_vector_stores, close_vector_stores, aclose_vector_stores
+from app.models.embedding import close_embeddings
+from app.services.persistence import drain_write_behind_queue
+from app.utils.get_prompt import compile_prompts
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -18,6 +23,9 @@ def init_application():
     Returns:
         bool: True if initialization was successful
     """
+    # Set up OpenTelemetry first, so the MongoDB clients are created with tracing
+    init_tracing()
+    
     # Connect to MongoDB to verify the connection
     client = get_mongodb_client()
     
@@ -46,4 +54,46 @@ def init_application():
         logger.info("LangSmith tracing is disabled.")
     
     logger.info("Application initialized successfully.")
-    return True 
\ No newline at end of file
+    return True 
+
+def startup_application():
+    """
+    Warm up long-lived resources before the first request is served.
+    
+    Returns:
+        bool: True if the warm-up was successful
+    """
+    # Compile the system prompts and load the tokenizer used for the context budget
+    prompts = compile_prompts()
+    for prompt in prompts.values():
+        logger.info(f"Compiled prompt {prompt.cache_key} ({prompt.tokens} tokens)")
+    
+    # Load the embedding model and connect to Qdrant once per process
+    try:
+        warm_up_vector_stores()
+        logger.info("Vector stores warmed up.")
+    except Exception as e:
+        logger.error(f"Failed to warm up vector stores: {e}")
+        return False
+    
+    return True
+
+def shutdown_application():
+    """
+    Release long-lived resources when the application stops.
+    """
+    # Flush the queued writes before closing the clients they use
+    drain_write_behind_queue()
+    close_vector_stores()
+    close_embeddings()
+    close_mongodb_clients()
+    # Export the spans of the shutdown too
+    shutdown_tracing()
+    logger.info("Application shut down successfully.")
+
+async def ashutdown_application():
+    """
+    Release long-lived resources, including the asynchronous clients, when the application stops.
+    """
+    await aclose_vector_stores()
+    shutdown_application()
@@ -0,0 +1,278 @@
+"""
+Prometheus metrics of the chat pipeline.
+
+Stage latencies, embedding batch sizes, LLM latency, tokens and errors are
+recorded as they happen; cache and buffer statistics are read from their
+owners when /metrics is scraped.
+"""
+
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from app.core.tracing import start_span
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_LATENCY = Histogram(
+    "hsk_stage_duration_seconds",
+    "Duration of a stage of the chat pipeline",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_ERRORS = Counter(
+    "hsk_stage_errors_total",
+    "Stages of the chat pipeline that raised an exception",
+    ["stage", "error"]
+)
+HTTP_REQUESTS = Histogram(
+    "hsk_http_request_duration_seconds",
+    "Duration of HTTP requests until the response headers are sent",
+    ["method", "path", "status"],
+    buckets=LATENCY_BUCKETS
+)
+EMBEDDING_BATCH_SIZE = Histogram(
+    "hsk_embedding_batch_size",
+    "Number of texts encoded in one embedding batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+LLM_LATENCY = Histogram(
+    "hsk_llm_duration_seconds",
+    "Duration of LLM calls",
+    ["provider", "model"],
+    buckets=LATENCY_BUCKETS
+)
+LLM_FIRST_TOKEN_LATENCY = Histogram(
+    "hsk_llm_first_token_seconds",
+    "Time to the first streamed token of LLM calls",
+    ["provider", "model"],
+    buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "hsk_llm_tokens_total",
+    "Tokens used by LLM calls",
+    ["provider", "model", "kind"]
+)
+LLM_ERRORS = Counter(
+    "hsk_llm_errors_total",
+    "LLM calls that failed",
+    ["provider", "model", "error"]
+)
+
+# Sources of cache statistics, read on every scrape: name -> callable returning a dict of numbers
+_stats_sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
+_stats_sources_lock = threading.Lock()
+
+# Stage durations of the current request in seconds, set by collect_request_timings
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+# One LLM callback per (provider, model), shared by every request
+_llm_callbacks: Dict[Tuple[str, str], "LLMMetricsCallback"] = {}
+_llm_callbacks_lock = threading.Lock()
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """
+    Time a stage of the chat pipeline, counting it as an error if it raises.
+    
+    The stage is also recorded as a span when tracing is enabled, and added to the
+    timings of the current request when they are collected.
+    
+    Works in both synchronous and asynchronous code:
+
+        with stage_timer("history_fetch"):
+            messages = history.messages
+    
+    Args:
+        stage (str): Name of the stage
+    """
+    with start_span(stage):
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            STAGE_ERRORS.labels(stage=stage, error=type(e).__name__).inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            STAGE_LATENCY.labels(stage=stage).observe(elapsed)
+            timings = _request_timings.get()
+            if timings is not None:
+                timings[stage] = timings.get(stage, 0.0) + elapsed
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """
+    Record the duration of a stage measured by the caller.
+    
+    Args:
+        stage (str): Name of the stage
+        seconds (float): Duration of the stage
+    """
+    STAGE_LATENCY.labels(stage=stage).observe(seconds)
+
+def collect_request_timings() -> Dict[str, float]:
+    """
+    Start collecting the stage durations of the current request.
+    
+    The returned dict is filled by stage_timer in this context and in the tasks and
+    threads that copy it, with the total seconds spent in each stage.
+    
+    Returns:
+        Dict[str, float]: Stage name -> duration in seconds
+    """
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+def format_server_timing(timings: Dict[str, float], total: Optional[float] = None) -> str:
+    """
+    Format stage durations as a Server-Timing header value.
+    
+    Args:
+        timings (Dict[str, float]): Stage name -> duration in seconds
+        total (float, optional): Duration of the whole request in seconds
+    
+    Returns:
+        str: The header value, e.g. "session_lookup;dur=3.2, llm_generate;dur=812.5"
+    """
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+def register_stats_source(name: str, source: Callable[[], Dict[str, Any]]) -> None:
+    """
+    Export the numeric values of a stats dict as hsk_cache_stat{cache=name, stat=key}.
+    
+    Args:
+        name (str): Name of the cache or buffer
+        source (Callable[[], Dict[str, Any]]): Returns the current statistics
+    """
+    with _stats_sources_lock:
+        _stats_sources[name] = source
+
+class StatsCollector:
+    """Collector reading the registered stats sources at scrape time."""
+    
+    def collect(self):
+        gauge = GaugeMetricFamily(
+            "hsk_cache_stat",
+            "Counters and usage of the in-process caches and buffers",
+            labels=["cache", "stat"]
+        )
+        with _stats_sources_lock:
+            sources = list(_stats_sources.items())
+        
+        for name, source in sources:
+            try:
+                stats = source()
+            except Exception as e:
+                logger.warning(f"Error reading stats of {name}: {str(e)}")
+                continue
+            for stat, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauge.add_metric([name, stat], float(value))
+        
+        yield gauge
+
+REGISTRY.register(StatsCollector())
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Callback recording latency, time to first token, token usage and errors of LLM calls."""
+    
+    def __init__(self, provider: str, model: str):
+        """
+        Initialize the callback.
+        
+        Args:
+            provider (str): The model provider label
+            model (str): The model name label
+        """
+        self.provider = provider
+        self.model = model
+        self._started: Dict[UUID, float] = {}
+        self._first_token_seen: Dict[UUID, bool] = {}
+    
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+    
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+    
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.get(run_id)
+        if started is not None and not self._first_token_seen.get(run_id):
+            self._first_token_seen[run_id] = True
+            LLM_FIRST_TOKEN_LATENCY.labels(provider=self.provider, model=self.model).observe(time.perf_counter() - started)
+    
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        self._first_token_seen.pop(run_id, None)
+        if started is not None:
+            LLM_LATENCY.labels(provider=self.provider, model=self.model).observe(time.perf_counter() - started)
+        
+        input_tokens, output_tokens = _usage_of(response)
+        if input_tokens:
+            LLM_TOKENS.labels(provider=self.provider, model=self.model, kind="input").inc(input_tokens)
+        if output_tokens:
+            LLM_TOKENS.labels(provider=self.provider, model=self.model, kind="output").inc(output_tokens)
+    
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started.pop(run_id, None)
+        self._first_token_seen.pop(run_id, None)
+        LLM_ERRORS.labels(provider=self.provider, model=self.model, error=type(error).__name__).inc()
+
+def _usage_of(response: LLMResult) -> Tuple[int, int]:
+    """Get the (input, output) token counts of an LLM result, 0 if the provider did not report them."""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    
+    # Older integrations only report the usage in llm_output
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+def get_llm_metrics_callback(provider: Any, model: Optional[Any]) -> LLMMetricsCallback:
+    """
+    Get the shared metrics callback of a provider and model.
+    
+    Args:
+        provider (ModelProvider): The model provider
+        model (str, optional): The model name
+    
+    Returns:
+        LLMMetricsCallback: The callback to pass in the run config
+    """
+    provider_value = provider.value if hasattr(provider, 'value') else str(provider)
+    model_value = model.value if hasattr(model, 'value') else str(model or "default")
+    key = (provider_value, model_value)
+    
+    callback = _llm_callbacks.get(key)
+    if callback is None:
+        with _llm_callbacks_lock:
+            callback = _llm_callbacks.get(key)
+            if callback is None:
+                callback = LLMMetricsCallback(provider_value, model_value)
+                _llm_callbacks[key] = callback
+    return callback
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Render every metric in the Prometheus text format.
+    
+    Returns:
+        Tuple[bytes, str]: The exposition body and its content type
+    """
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,190 @@
+"""
+OpenTelemetry tracing of the chat pipeline.
+
+Every stage timed with app.core.metrics.stage_timer is also recorded as a span,
+nested under the span of the HTTP request, and MongoDB commands are traced by
+the pymongo instrumentation. Spans are exported as JSON lines to the console or
+to a local file, so a slow request can be explained without an external service.
+"""
+
+import os
+import sys
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Any, ContextManager, Dict, IO, Iterator, Mapping, Optional
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace import Span, SpanKind, Status, StatusCode
+from app.core.config import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Process-wide tracer provider, None while tracing is disabled
+_provider: Optional[TracerProvider] = None
+_tracer: Optional[trace.Tracer] = None
+_trace_file: Optional[IO[str]] = None
+_tracing_lock = threading.Lock()
+
+def _format_span(span: ReadableSpan) -> str:
+    """Format a finished span as a single JSON line."""
+    return span.to_json(indent=None) + os.linesep
+
+def _create_exporter() -> ConsoleSpanExporter:
+    """
+    Create the span exporter selected by TRACING_EXPORTER.
+    
+    Returns:
+        ConsoleSpanExporter: Exporter writing to stdout ("console") or to TRACING_FILE_PATH ("file")
+    """
+    global _trace_file
+    
+    exporter = settings.TRACING_EXPORTER.lower()
+    if exporter == "console":
+        return ConsoleSpanExporter(service_name=settings.TRACING_SERVICE_NAME, out=sys.stdout, formatter=_format_span)
+    if exporter == "file":
+        _trace_file = open(settings.TRACING_FILE_PATH, "a", encoding="utf-8")
+        return ConsoleSpanExporter(service_name=settings.TRACING_SERVICE_NAME, out=_trace_file, formatter=_format_span)
+    raise ValueError(f"Unsupported trace exporter: {settings.TRACING_EXPORTER}. Use 'console' or 'file'.")
+
+def init_tracing() -> bool:
+    """
+    Set up the tracer provider if tracing is enabled.
+    
+    Must run before the MongoDB clients are created, so their commands are traced.
+    
+    Returns:
+        bool: True if tracing is enabled
+    """
+    global _provider, _tracer
+    
+    if not settings.TRACING_ENABLED:
+        return False
+    
+    with _tracing_lock:
+        if _provider is not None:
+            return True
+        
+        # Sample a ratio of new traces, and follow the decision of the caller for propagated ones
+        provider = TracerProvider(
+            resource=Resource.create({"service.name": settings.TRACING_SERVICE_NAME}),
+            sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO))
+        )
+        provider.add_span_processor(BatchSpanProcessor(_create_exporter()))
+        
+        if settings.TRACING_INSTRUMENT_MONGODB:
+            # Covers motor too, which runs its commands through pymongo
+            from opentelemetry.instrumentation.pymongo import PymongoInstrumentor
+            PymongoInstrumentor().instrument(tracer_provider=provider)
+        
+        _provider = provider
+        _tracer = provider.get_tracer(__name__)
+        logger.info(f"Tracing enabled: exporter={settings.TRACING_EXPORTER}, sample ratio={settings.TRACING_SAMPLE_RATIO}")
+        return True
+
+def shutdown_tracing() -> None:
+    """Export the remaining spans and close the trace file."""
+    global _provider, _tracer, _trace_file
+    
+    with _tracing_lock:
+        if _provider is not None:
+            try:
+                _provider.shutdown()
+            except Exception as e:
+                logger.warning(f"Error shutting down tracing: {str(e)}")
+            _provider = None
+            _tracer = None
+        
+        if _trace_file is not None:
+            _trace_file.close()
+            _trace_file = None
+
+def start_span(name: str, attributes: Optional[Dict[str, Any]] = None) -> ContextManager[Optional[Span]]:
+    """
+    Start a span as a child of the current one.
+    
+    Args:
+        name (str): Name of the span
+        attributes (Dict[str, Any], optional): Attributes of the span
+    
+    Returns:
+        ContextManager[Optional[Span]]: The span, or a no-op context if tracing is disabled
+    """
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+@contextmanager
+def request_span(method: str, path: str, headers: Mapping[str, str]) -> Iterator[Optional[Span]]:
+    """
+    Start the root span of an HTTP request, continuing the trace of a W3C traceparent header.
+    
+    Args:
+        method (str): The HTTP method
+        path (str): The request path
+        headers (Mapping[str, str]): The request headers
+    
+    Yields:
+        Optional[Span]: The span, or None if tracing is disabled
+    """
+    if _tracer is None:
+        yield None
+        return
+    
+    with _tracer.start_as_current_span(
+        f"{method} {path}",
+        context=propagate.extract(headers),
+        kind=SpanKind.SERVER,
+        attributes={"http.request.method": method, "url.path": path}
+    ) as span:
+        yield span
+
+def finish_request_span(span: Span, method: str, route: Optional[str], status_code: int) -> None:
+    """
+    Name a request span after its route and record the response status.
+    
+    Args:
+        span (Span): The span of the request
+        method (str): The HTTP method
+        route (str, optional): The route template, None if no route matched
+        status_code (int): The HTTP status of the response
+    """
+    if route:
+        span.update_name(f"{method} {route}")
+        span.set_attribute("http.route", route)
+    span.set_attribute("http.response.status_code", status_code)
+    if status_code >= 500:
+        span.set_status(Status(StatusCode.ERROR))
+
+def annotate_span(attributes: Dict[str, Any]) -> None:
+    """
+    Add attributes to the current span, skipping None values.
+    
+    Args:
+        attributes (Dict[str, Any]): The attributes to set
+    """
+    span = trace.get_current_span()
+    if not span.is_recording():
+        return
+    for key, value in attributes.items():
+        if value is not None:
+            span.set_attribute(key, value)
+
+def get_trace_id(span: Optional[Span] = None) -> Optional[str]:
+    """
+    Get the hex trace ID of a span.
+    
+    Args:
+        span (Span, optional): The span, defaults to the current one
+    
+    Returns:
+        Optional[str]: The 32-character trace ID, or None outside a trace
+    """
+    context = (span or trace.get_current_span()).get_span_context()
+    if not context.is_valid:
+        return None
+    return trace.format_trace_id(context.trace_id)
@@ -3,6 +3,7 @@ from enum import Enum
 class ModelProvider(Enum):
     OPENAI = "openai"
     GEMINI = "gemini"
+    FAKE = "fake"
     
 class ModelGeminiName(Enum):
     GEMINI_2_0_FLASH = "gemini-2.0-flash"
@@ -14,4 +15,6 @@ class ModelOpenAiName(Enum):
     OPENAI_GPT_4O_MINI = "gpt-4o-mini"
     OPENAI_GPT_4O_MINI_2024_07_18 = "gpt-4o-mini-2024-07-18"
     OPENAI_GPT_4_1_NANO = "gpt-4.1-nano"
-    
\ No newline at end of file
+    
+class ModelFakeName(Enum):
+    FAKE_CHAT = "fake-chat"
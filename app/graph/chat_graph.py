@@ -1,31 +1,52 @@
 from typing import Dict, TypedDict, List, Annotated, Literal
 import time
+import asyncio
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from app.models.llm_models import get_model
-from app.models.memory import get_vector_chat_history, get_mongodb_chat_history
+from app.models.llm_models import get_model, get_run_config
+from app.models.memory import get_mongodb_chat_history
 from app.models.vector_store import get_vector_store
-from app.utils.langsmith import get_langchain_tracer
-from app.config.config import LANGSMITH_TRACING
-from app.enum.model import ModelProvider, ModelGeminiName, ModelOpenAiName
-from app.utils.get_prompt import MiaSystemPromptGenerator
+from app.models.response_cache import get_response_cache_scope, lookup_response, alookup_response, store_response
+from app.config.config import HISTORY_FETCH_TIMEOUT, VECTOR_RETRIEVAL_TIMEOUT, RETRIEVAL_MAX_WORKERS
+from app.enum.model import ModelProvider, ModelGeminiName, ModelOpenAiName, ModelFakeName
+from app.utils.get_prompt import MIA_SYSTEM_PROMPT, get_compiled_prompt, build_context_block
+from app.services.persistence import enqueue_message_writes
+from app.core.metrics import stage_timer
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Bounded pool running the retrieval stages of the synchronous pipeline concurrently
+_retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_MAX_WORKERS, thread_name_prefix="retrieval")
+
+# The system prompt is sent as a message, so every provider uses the same template, built once
+_MESSAGES_PROMPT = ChatPromptTemplate.from_messages([
+    MessagesPlaceholder(variable_name="messages"),
+])
+
 # Define state types
 class AgentState(TypedDict):
     messages: List[BaseMessage]
 
-def create_chat_graph(session_id, model_provider: ModelProvider = ModelProvider.GEMINI, model_name: ModelGeminiName = ModelGeminiName.GEMINI_2_0_FLASH, temperature=0.7, max_tokens=200):
+def _create_graph_components(session_id, model_provider, model_name, temperature, max_tokens, run_name_suffix="graph-chat"):
     """
-    Create a simplified version of a conversation agent.
+    Create the language model, prompt template, run config and response cache scope shared by the graph functions.
     
     Args:
         session_id (str): A unique identifier for the conversation
         model_provider (str): The LLM provider to use ('openai' or 'gemini')
         model_name (str, optional): The specific model name to use
         temperature (float): Controls randomness in responses
-        max_tokens (int): Maximum number of tokens in the response (default: 150)
+        max_tokens (int): Maximum number of tokens in the response
+        run_name_suffix (str): Suffix of the run name used for tracing
         
     Returns:
-        A function that processes messages
+        Tuple[BaseChatModel, ChatPromptTemplate, RunnableConfig, ResponseCacheScope]: The pooled language model,
+            the prompt template, the invoke-time config carrying the tracing run name and session metadata, and the
+            scope of the cached responses
     """
     # Configure model parameters
     model_kwargs = {
@@ -35,6 +56,8 @@ def create_chat_graph(session_id, model_provider: ModelProvider = ModelProvider.
     
     if model_provider == ModelProvider.OPENAI:
         model_name = ModelOpenAiName.OPENAI_GPT_4_1_NANO
+    elif model_provider == ModelProvider.FAKE:
+        model_name = ModelFakeName.FAKE_CHAT
     
     # Convert enum to string value if it's an enum
     model_name_value = model_name.value if hasattr(model_name, 'value') else model_name
@@ -43,50 +66,354 @@ def create_chat_graph(session_id, model_provider: ModelProvider = ModelProvider.
         model_kwargs["model_name"] = model_name_value
     
     # Run name for tracing
-    run_name = f"{model_provider}-graph-chat-{session_id}"
+    run_name = f"{model_provider}-{run_name_suffix}-{session_id}"
+    
+    # Get the pooled language model; tracing data is passed per call through the run config
+    llm = get_model(provider=model_provider, **model_kwargs)
+    config = get_run_config(run_name, session_id=session_id, provider=model_provider, model_name=model_name_value)
+    
+    # Cached responses are only reused with the same model and base system prompt
+    cache_scope = get_response_cache_scope(model_provider, model_name_value, get_compiled_prompt(MIA_SYSTEM_PROMPT).cache_key)
+    
+    # Gemini and OpenAI both take a simple messages placeholder;
+    # the system message is already added in process_user_input
+    return llm, _MESSAGES_PROMPT, config, cache_scope
+
+def _cacheable_query(messages):
+    """
+    Get the text of the user message ending a turn, if its answer can be shared through the response cache.
+    
+    The response cache is shared by every session, so only a turn whose prompt is the
+    base system prompt and the question alone can use it: once the session has history
+    or similar messages were retrieved, the answer depends on that session.
     
-    # Get the language model
-    llm = get_model(provider=model_provider, run_name=run_name, **model_kwargs)
+    Args:
+        messages (List[BaseMessage]): The messages sent to the model
+        
+    Returns:
+        Optional[str]: The user input, or None if the turn must not use the response cache
+    """
+    if len(messages) != 2 or not isinstance(messages[0], SystemMessage) or not isinstance(messages[1], HumanMessage):
+        return None
+    if messages[0].content != get_compiled_prompt(MIA_SYSTEM_PROMPT).text:
+        return None
+    return messages[1].content
+
+def _prepare_messages(model_provider, messages):
+    """
+    Make sure the messages sent to the model carry a system instruction.
     
-    # Create the prompt template - handle differently based on model provider
+    Args:
+        model_provider (str): The LLM provider to use ('openai' or 'gemini')
+        messages (List[BaseMessage]): The conversation messages
+        
+    Returns:
+        List[BaseMessage]: The messages to send to the model
+    """
+    # For Gemini model and empty conversation, add system instruction to first message
     if model_provider == ModelProvider.GEMINI:
-        # For Gemini, we'll use a simple messages placeholder
-        prompt = ChatPromptTemplate.from_messages([
-            MessagesPlaceholder(variable_name="messages"),
-        ])
-    elif model_provider == ModelProvider.OPENAI:
-        # For OpenAI, we'll also use a simple messages placeholder
-        # System message is already added in process_user_input
-        prompt = ChatPromptTemplate.from_messages([
-            MessagesPlaceholder(variable_name="messages"),
-        ])
+        # Kiểm tra xem đã có SystemMessage chưa
+        has_system_message = any(isinstance(msg, SystemMessage) for msg in messages)
+        
+        # Không cần thêm system prompt nữa vì đã được xử lý trong process_user_input
+        # Chỉ giữ lại việc kiểm tra để đảm bảo tương thích ngược
+        if not has_system_message and not messages:
+            # Trường hợp hiếm gặp: không có tin nhắn nào và không có system message
+            messages.append(SystemMessage(content="You are a friendly and helpful HSK chatbot assistant."))
+    
+    return messages
+
+def create_chat_graph(session_id, model_provider: ModelProvider = ModelProvider.GEMINI, model_name: ModelGeminiName = ModelGeminiName.GEMINI_2_0_FLASH, temperature=0.7, max_tokens=200):
+    """
+    Create a simplified version of a conversation agent.
+    
+    Args:
+        session_id (str): A unique identifier for the conversation
+        model_provider (str): The LLM provider to use ('openai' or 'gemini')
+        model_name (str, optional): The specific model name to use
+        temperature (float): Controls randomness in responses
+        max_tokens (int): Maximum number of tokens in the response (default: 150)
+        
+    Returns:
+        A function that processes messages
+    """
+    llm, prompt, config, cache_scope = _create_graph_components(session_id, model_provider, model_name, temperature, max_tokens)
     
     # Define the process function
-    def process_messages(messages):
-        # For Gemini model and empty conversation, add system instruction to first message
-        if model_provider == ModelProvider.GEMINI:
-            # Kiểm tra xem đã có SystemMessage chưa
-            has_system_message = any(isinstance(msg, SystemMessage) for msg in messages)
-            
-            # Không cần thêm system prompt nữa vì đã được xử lý trong process_user_input
-            # Chỉ giữ lại việc kiểm tra để đảm bảo tương thích ngược
-            if not has_system_message and not messages:
-                # Trường hợp hiếm gặp: không có tin nhắn nào và không có system message
-                messages.append(SystemMessage(content="You are a friendly and helpful HSK chatbot assistant."))
+    def process_messages(messages, query_vector=None):
+        messages = _prepare_messages(model_provider, messages)
+        
+        # Serve repeated questions from the response cache without calling the LLM
+        query = _cacheable_query(messages)
+        with stage_timer("response_cache_lookup"):
+            cached = lookup_response(cache_scope, query, query_vector) if query else None
+        if cached and cached.response is not None:
+            return messages + [AIMessage(content=cached.response)]
         
         # Get the response from the LLM
-        response = prompt.invoke({"messages": messages})
-        # Don't pass callbacks here as they're already included in the model
-        chain_response = llm.invoke(response)
+        with stage_timer("llm_generate"):
+            response = prompt.invoke({"messages": messages})
+            chain_response = llm.invoke(response, config=config)
         
         # Create a new AI message
         ai_message = AIMessage(content=chain_response.content)
+        if cached:
+            store_response(cache_scope, query, ai_message.content, cached.query_vector)
         
         # Return the updated messages (không lưu vào message_history nữa vì đã xử lý trong process_user_input)
         return messages + [ai_message]
     
     return process_messages
 
+def create_async_chat_graph(session_id, model_provider: ModelProvider = ModelProvider.GEMINI, model_name: ModelGeminiName = ModelGeminiName.GEMINI_2_0_FLASH, temperature=0.7, max_tokens=200):
+    """
+    Create the asynchronous version of the conversation agent.
+    
+    Args:
+        session_id (str): A unique identifier for the conversation
+        model_provider (str): The LLM provider to use ('openai' or 'gemini')
+        model_name (str, optional): The specific model name to use
+        temperature (float): Controls randomness in responses
+        max_tokens (int): Maximum number of tokens in the response (default: 150)
+        
+    Returns:
+        A coroutine function that processes messages
+    """
+    llm, prompt, config, cache_scope = _create_graph_components(session_id, model_provider, model_name, temperature, max_tokens)
+    
+    # Define the process function
+    async def aprocess_messages(messages, query_vector=None):
+        messages = _prepare_messages(model_provider, messages)
+        
+        # Serve repeated questions from the response cache without calling the LLM
+        query = _cacheable_query(messages)
+        with stage_timer("response_cache_lookup"):
+            cached = await alookup_response(cache_scope, query, query_vector) if query else None
+        if cached and cached.response is not None:
+            return messages + [AIMessage(content=cached.response)]
+        
+        # Get the response from the LLM without blocking the event loop
+        with stage_timer("llm_generate"):
+            response = await prompt.ainvoke({"messages": messages})
+            chain_response = await llm.ainvoke(response, config=config)
+        
+        # Create a new AI message
+        ai_message = AIMessage(content=chain_response.content)
+        if cached:
+            store_response(cache_scope, query, ai_message.content, cached.query_vector)
+        
+        return messages + [ai_message]
+    
+    return aprocess_messages
+
+def _build_system_prompt(similar_human_messages, similar_ai_messages):
+    """
+    Build the system prompt with the context of similar previous messages.
+    
+    The base prompt is compiled once per process; the context block is capped at
+    PROMPT_CONTEXT_MAX_TOKENS tokens.
+    
+    Args:
+        similar_human_messages (List[BaseMessage]): Similar previous user messages
+        similar_ai_messages (List[BaseMessage]): Similar previous AI messages
+        
+    Returns:
+        str: The system prompt
+    """
+    # System prompt đã biên dịch sẵn, cộng thêm các tin nhắn tương tự trong giới hạn token
+    with stage_timer("prompt_build"):
+        return get_compiled_prompt(MIA_SYSTEM_PROMPT).text + build_context_block(similar_human_messages, similar_ai_messages)
+
+def _build_turn_messages(system_prompt, recent_messages, human_message):
+    """
+    Assemble the messages sent to the graph function for one turn.
+    
+    Args:
+        system_prompt (str): The system prompt with context
+        recent_messages (List[BaseMessage]): The most recent messages of the session
+        human_message (HumanMessage): The new user message
+        
+    Returns:
+        List[BaseMessage]: The messages for the graph function
+    """
+    # Tạo messages mới với system message chứa context
+    messages = []
+    
+    # Thêm system message vào đầu
+    messages.append(SystemMessage(content=system_prompt))
+    
+    # Thêm 10 tin nhắn gần nhất từ MongoDB vào bối cảnh
+    if recent_messages:
+        messages.extend(recent_messages)
+    
+    messages.append(human_message)
+    return messages
+
+def create_streaming_chat_graph(session_id, model_provider: ModelProvider = ModelProvider.GEMINI, model_name: ModelGeminiName = ModelGeminiName.GEMINI_2_0_FLASH, temperature=0.7, max_tokens=200):
+    """
+    Create the streaming version of the conversation agent.
+    
+    Args:
+        session_id (str): A unique identifier for the conversation
+        model_provider (str): The LLM provider to use ('openai' or 'gemini')
+        model_name (str, optional): The specific model name to use
+        temperature (float): Controls randomness in responses
+        max_tokens (int): Maximum number of tokens in the response (default: 150)
+        
+    Returns:
+        An async generator function yielding the response text chunk by chunk
+    """
+    llm, prompt, config, cache_scope = _create_graph_components(session_id, model_provider, model_name, temperature, max_tokens, run_name_suffix="graph-stream")
+    
+    # Define the stream function
+    async def astream_messages(messages, query_vector=None):
+        messages = _prepare_messages(model_provider, messages)
+        
+        # Serve repeated questions from the response cache as a single chunk
+        query = _cacheable_query(messages)
+        with stage_timer("response_cache_lookup"):
+            cached = await alookup_response(cache_scope, query, query_vector) if query else None
+        if cached and cached.response is not None:
+            yield cached.response
+            return
+        
+        # Stream the response tokens from the LLM as they are generated
+        chunks = []
+        response = await prompt.ainvoke({"messages": messages})
+        async for chunk in llm.astream(response, config=config):
+            if chunk.content:
+                chunks.append(chunk.content)
+                yield chunk.content
+        
+        if cached and chunks:
+            store_response(cache_scope, query, "".join(chunks), cached.query_vector)
+    
+    return astream_messages
+
+def _fetch_recent_messages(session_id):
+    """
+    Load the most recent messages of a session.
+    
+    Args:
+        session_id (str): The session ID for retrieving history
+        
+    Returns:
+        List[BaseMessage]: The recent messages
+    """
+    with stage_timer("history_fetch"):
+        return get_mongodb_chat_history(session_id, max_messages=4).messages
+
+def _retrieve_similar_messages(vector_store, user_input, session_id, similarity_threshold):
+    """
+    Embed the user input and search similar human and AI messages.
+    
+    Args:
+        vector_store (MessageVectorStore): The vector store to search
+        user_input (str): The user's input message
+        session_id (str): The session ID for filtering
+        similarity_threshold (float): Minimum similarity score (0.0 to 1.0) for vector search
+        
+    Returns:
+        Tuple[List[float], Dict[str, List[BaseMessage]]]: The query vector and the similar messages by type
+    """
+    # Embed tin nhắn của người dùng một lần, dùng lại cho cả tìm kiếm và lưu trữ
+    query_vector = vector_store.embed_text(user_input)
+    
+    # Tìm 5 tin nhắn người dùng (human) và 5 tin nhắn AI tương tự nhất trong một lần truy vấn
+    with stage_timer("vector_search"):
+        similar_messages = vector_store.search_similar_messages_by_type(
+            query=user_input,
+            session_id=session_id,
+            k=5,
+            filter_types=("human", "ai"),
+            score_threshold=similarity_threshold,
+            query_vector=query_vector
+        )
+    return query_vector, similar_messages
+
+async def _afetch_recent_messages(session_id):
+    """
+    Load the most recent messages of a session asynchronously.
+    
+    Args:
+        session_id (str): The session ID for retrieving history
+        
+    Returns:
+        List[BaseMessage]: The recent messages
+    """
+    # Khởi tạo history có thao tác I/O đồng bộ (tạo index lần đầu) nên chạy trong thread
+    with stage_timer("history_fetch"):
+        mongodb_history = await asyncio.to_thread(get_mongodb_chat_history, session_id, max_messages=4)
+        return await mongodb_history.aget_messages()
+
+async def _aretrieve_similar_messages(vector_store, user_input, session_id, similarity_threshold):
+    """
+    Embed the user input and search similar human and AI messages asynchronously.
+    
+    Args:
+        vector_store (MessageVectorStore): The vector store to search
+        user_input (str): The user's input message
+        session_id (str): The session ID for filtering
+        similarity_threshold (float): Minimum similarity score (0.0 to 1.0) for vector search
+        
+    Returns:
+        Tuple[List[float], Dict[str, List[BaseMessage]]]: The query vector and the similar messages by type
+    """
+    # Embed tin nhắn của người dùng một lần, dùng lại cho cả tìm kiếm và lưu trữ
+    query_vector = await vector_store.aembed_text(user_input)
+    
+    # Tìm 5 tin nhắn người dùng (human) và 5 tin nhắn AI tương tự nhất trong một lần truy vấn
+    with stage_timer("vector_search"):
+        similar_messages = await vector_store.asearch_similar_messages_by_type(
+            query=user_input,
+            session_id=session_id,
+            k=5,
+            filter_types=("human", "ai"),
+            score_threshold=similarity_threshold,
+            query_vector=query_vector
+        )
+    return query_vector, similar_messages
+
+def _stage_result(stage, future, deadline):
+    """
+    Wait for a retrieval stage, degrading to None if it is too slow or fails.
+    
+    Args:
+        stage (str): Name of the stage, for logging
+        future (Future): The running stage
+        deadline (float): time.monotonic() value after which the stage is abandoned
+        
+    Returns:
+        Any: The stage result, or None if it timed out or failed
+    """
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        logger.warning(f"Retrieval stage '{stage}' timed out, continuing without it")
+    except Exception as e:
+        logger.warning(f"Retrieval stage '{stage}' failed, continuing without it: {str(e)}")
+    return None
+
+async def _astage_result(stage, coroutine, timeout):
+    """
+    Await a retrieval stage, degrading to None if it is too slow or fails.
+    
+    Args:
+        stage (str): Name of the stage, for logging
+        coroutine (Coroutine): The stage to run
+        timeout (float): Maximum time to wait, in seconds
+        
+    Returns:
+        Any: The stage result, or None if it timed out or failed
+    """
+    try:
+        return await asyncio.wait_for(coroutine, timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Retrieval stage '{stage}' timed out after {timeout}s, continuing without it")
+    except Exception as e:
+        logger.warning(f"Retrieval stage '{stage}' failed, continuing without it: {str(e)}")
+    return None
+
 def process_user_input(graph_function, user_input, session_id, similarity_threshold=0.6):
     """
     Process user input through the graph function.
@@ -100,84 +427,163 @@ def process_user_input(graph_function, user_input, session_id, similarity_thresh
     Returns:
         str: The assistant's response
     """
-    # Lấy 10 tin nhắn gần nhất từ MongoDB
-    mongodb_history = get_mongodb_chat_history(session_id, max_messages=4)
-    
-    recent_messages = mongodb_history.messages
-    
     # Lấy vector store để tìm kiếm các tin nhắn tương tự từ qdrant
     vector_store = get_vector_store(collection_name="chat_messages")
     
-    # Tìm 5 tin nhắn người dùng (human) tương tự nhất
-    similar_human_messages = vector_store.search_similar_messages(
-        query=user_input,
-        session_id=session_id,
-        k=5,
-        filter_type="human",
-        score_threshold=similarity_threshold
+    # Lấy lịch sử MongoDB và tìm kiếm vector song song, mỗi bước có timeout riêng
+    # (mỗi bước chạy trong bản sao context hiện tại để span của nó thuộc cùng trace)
+    started_at = time.monotonic()
+    history_future = _retrieval_executor.submit(contextvars.copy_context().run, _fetch_recent_messages, session_id)
+    vector_future = _retrieval_executor.submit(
+        contextvars.copy_context().run, _retrieve_similar_messages, vector_store, user_input, session_id, similarity_threshold
     )
+    with stage_timer("retrieval"):
+        history_result = _stage_result("history", history_future, started_at + HISTORY_FETCH_TIMEOUT)
+        vector_result = _stage_result("vector retrieval", vector_future, started_at + VECTOR_RETRIEVAL_TIMEOUT)
     
-    # Tìm 5 tin nhắn AI tương tự nhất
-    similar_ai_messages = vector_store.search_similar_messages(
-        query=user_input,
-        session_id=session_id,
-        k=5,
-        filter_type="ai",
-        score_threshold=similarity_threshold
-    )
+    # Nếu MongoDB chậm thì tiếp tục mà không có lịch sử gần nhất
+    recent_messages = history_result or []
+    
+    # Nếu Qdrant chậm thì tiếp tục mà không có context tương tự
+    query_vector, similar_messages = vector_result if vector_result else (None, {})
+    
+    system_prompt = _build_system_prompt(similar_messages.get("human", []), similar_messages.get("ai", []))
+    
+    # Tin nhắn mới của người dùng, được lưu cùng phản hồi sau khi trả kết quả
+    human_message = HumanMessage(content=user_input)
+    
+    # Thêm tin nhắn vào bộ đệm ghi của vector store (ghi theo lô, dùng lại vector đã embed)
+    vector_store.buffer_message(human_message, session_id, {"timestamp": int(time.time())}, vector=query_vector)
+    
+    messages = _build_turn_messages(system_prompt, recent_messages, human_message)
+    
+    # Xử lý tin nhắn qua graph function (dùng lại vector đã embed cho response cache)
+    updated_messages = graph_function(messages, query_vector=query_vector)
     
-    # Tạo system message với thông tin về các tin nhắn tương tự
-    system_prompt = MiaSystemPromptGenerator.generate_system_prompt()
+    # Lấy tin nhắn cuối cùng (phản hồi của assistant)
+    last_message = updated_messages[-1] if updated_messages else None
+    
+    if last_message and hasattr(last_message, 'content'):
+        _persist_turn(session_id, human_message, last_message)
+        return {"output": last_message.content}
+    
+    _persist_turn(session_id, human_message)
+    return {"output": "I'm sorry, I couldn't generate a response."}
 
-    # Thêm thông tin về các tin nhắn tương tự từ người dùng và AI
-    if similar_human_messages or similar_ai_messages:
-        system_prompt += MiaSystemPromptGenerator.generate_context_prompt()
-        
-        # Thêm các tin nhắn người dùng tương tự
-        if similar_human_messages:
-            system_prompt += "\n- Questions:"
-            for msg in similar_human_messages:
-                if hasattr(msg, 'content'):
-                    system_prompt += f"\n+ {msg.content}"
+async def _aprepare_turn(user_input, session_id, similarity_threshold):
+    """
+    Retrieve the context of a turn, index the user message and build the messages for the model.
+    
+    Args:
+        user_input (str): The user's input message
+        session_id (str): The session ID for retrieving history
+        similarity_threshold (float): Minimum similarity score (0.0 to 1.0) for vector search
         
-        # Thêm các tin nhắn AI tương tự
-        if similar_ai_messages:
-            system_prompt += "\n- AI:"
-            for msg in similar_ai_messages:
-                if hasattr(msg, 'content'):
-                    system_prompt += f"\n+ {msg.content}"
+    Returns:
+        Tuple[List[BaseMessage], HumanMessage, Optional[List[float]]]: The messages for the model, the user message
+            and its embedding (None if the vector retrieval did not finish)
+    """
+    # Lấy vector store để tìm kiếm các tin nhắn tương tự từ qdrant
+    vector_store = get_vector_store(collection_name="chat_messages")
     
-    # Tạo messages mới với system message chứa context
-    messages = []
+    # Lấy lịch sử MongoDB và tìm kiếm vector song song, mỗi bước có timeout riêng
+    with stage_timer("retrieval"):
+        history_result, vector_result = await asyncio.gather(
+            _astage_result("history", _afetch_recent_messages(session_id), HISTORY_FETCH_TIMEOUT),
+            _astage_result(
+                "vector retrieval",
+                _aretrieve_similar_messages(vector_store, user_input, session_id, similarity_threshold),
+                VECTOR_RETRIEVAL_TIMEOUT
+            ),
+        )
     
-    # Thêm system message vào đầu
-    messages.append(SystemMessage(content=system_prompt))
+    # Nếu MongoDB chậm thì tiếp tục mà không có lịch sử gần nhất
+    recent_messages = history_result or []
     
-    # Thêm 10 tin nhắn gần nhất từ MongoDB vào bối cảnh
-    if recent_messages:
-        messages.extend(recent_messages)
+    # Nếu Qdrant chậm thì tiếp tục mà không có context tương tự
+    query_vector, similar_messages = vector_result if vector_result else (None, {})
+    
+    system_prompt = _build_system_prompt(similar_messages.get("human", []), similar_messages.get("ai", []))
     
-    # Thêm tin nhắn mới của người dùng
+    # Tin nhắn mới của người dùng, được lưu cùng phản hồi sau khi trả kết quả
     human_message = HumanMessage(content=user_input)
-    mongodb_history.add_message(human_message)
     
-    # Thêm tin nhắn vào vector store
-    vector_store.add_message(human_message, session_id, {"timestamp": int(time.time())})
+    # Thêm tin nhắn vào bộ đệm ghi của vector store (ghi theo lô, không chặn event loop)
+    vector_store.buffer_message(human_message, session_id, {"timestamp": int(time.time())}, vector=query_vector)
     
-    messages.append(human_message)
+    return _build_turn_messages(system_prompt, recent_messages, human_message), human_message, query_vector
+
+def _persist_turn(session_id, human_message, ai_message=None):
+    """
+    Queue the messages of a turn for the chat session store and the vector store.
     
-    # Xử lý tin nhắn qua graph function
-    updated_messages = graph_function(messages)
+    The user and assistant messages are written together in one append, in the
+    background after the response is returned. The user message is already in the
+    vector store write buffer, so only the response is indexed here.
+    
+    Args:
+        session_id (str): The session ID
+        human_message (HumanMessage): The user message
+        ai_message (AIMessage, optional): The assistant response, None if none was generated
+    """
+    # Lưu tin nhắn người dùng và phản hồi của assistant trong một lần ghi sau khi trả kết quả
+    if ai_message is None:
+        enqueue_message_writes(session_id, [human_message], index_messages=[])
+    else:
+        enqueue_message_writes(session_id, [human_message, ai_message], index_messages=[ai_message])
+
+async def aprocess_user_input(graph_function, user_input, session_id, similarity_threshold=0.6):
+    """
+    Process user input through the asynchronous graph function.
+    
+    Args:
+        graph_function: The coroutine function that processes messages
+        user_input (str): The user's input message
+        session_id (str): The session ID for retrieving history
+        similarity_threshold (float): Minimum similarity score (0.0 to 1.0) for vector search
+        
+    Returns:
+        str: The assistant's response
+    """
+    messages, human_message, query_vector = await _aprepare_turn(user_input, session_id, similarity_threshold)
+    
+    # Xử lý tin nhắn qua graph function (dùng lại vector đã embed cho response cache)
+    updated_messages = await graph_function(messages, query_vector=query_vector)
     
     # Lấy tin nhắn cuối cùng (phản hồi của assistant)
     last_message = updated_messages[-1] if updated_messages else None
     
     if last_message and hasattr(last_message, 'content'):
-        # Lưu phản hồi của assistant vào MongoDB history
-        mongodb_history.add_message(last_message)
-        
-        # Lưu phản hồi của assistant vào vector store
-        vector_store.add_message(last_message, session_id, {"timestamp": int(time.time())})
+        _persist_turn(session_id, human_message, last_message)
         return {"output": last_message.content}
     
-    return {"output": "I'm sorry, I couldn't generate a response."} 
\ No newline at end of file
+    _persist_turn(session_id, human_message)
+    return {"output": "I'm sorry, I couldn't generate a response."}
+
+async def astream_user_input(stream_function, user_input, session_id, similarity_threshold=0.6):
+    """
+    Process user input through the streaming graph function.
+    
+    The turn is stored once the stream ends, with the response streamed so far if
+    the client disconnected or generation failed, since the user message is
+    already in the vector store write buffer.
+    
+    Args:
+        stream_function: The async generator function that streams the response
+        user_input (str): The user's input message
+        session_id (str): The session ID for retrieving history
+        similarity_threshold (float): Minimum similarity score (0.0 to 1.0) for vector search
+        
+    Yields:
+        str: The response text, chunk by chunk
+    """
+    messages, human_message, query_vector = await _aprepare_turn(user_input, session_id, similarity_threshold)
+    
+    chunks = []
+    try:
+        async for chunk in stream_function(messages, query_vector=query_vector):
+            chunks.append(chunk)
+            yield chunk
+    finally:
+        # Lưu tin nhắn và phản hồi sau khi stream kết thúc, kể cả khi client ngắt kết nối giữa chừng
+        _persist_turn(session_id, human_message, AIMessage(content="".join(chunks)) if chunks else None)
@@ -2,59 +2,340 @@
 Embedding models for vectorizing text.
 """
 
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
 from langchain_core.embeddings import Embeddings
 from sentence_transformers import SentenceTransformer
 import numpy as np
-from typing import List
+from typing import Dict, List, Optional, Tuple
+from app.core.metrics import EMBEDDING_BATCH_SIZE, stage_timer
+from app.config.config import (
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_MAX_BATCH_SIZE,
+    EMBEDDING_MAX_WAIT_MS,
+    EMBEDDING_QUEUE_SIZE
+)
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Shared model instances, batchers and embeddings keyed by model name
+_models: Dict[str, SentenceTransformer] = {}
+_batchers: Dict[str, "EmbeddingBatcher"] = {}
+_embeddings: Dict[str, "SentenceTransformerEmbeddings"] = {}
+# One lock per registry: building embeddings gets a batcher, so they must not share a lock
+_models_lock = threading.Lock()
+_batchers_lock = threading.Lock()
+_embeddings_lock = threading.Lock()
+
+# Sentinel used to stop a batcher worker
+_STOP = object()
+
+def get_sentence_transformer(model_name: str = EMBEDDING_MODEL_NAME) -> SentenceTransformer:
+    """
+    Get the shared sentence_transformers model, loading it on first use.
+
+    Args:
+        model_name (str): Name of the sentence_transformers model to load
+
+    Returns:
+        SentenceTransformer: The shared model instance
+    """
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+
+    with _models_lock:
+        model = _models.get(model_name)
+        if model is None:
+            model = SentenceTransformer(model_name)
+            _models[model_name] = model
+            logger.info(f"Loaded embedding model: {model_name}")
+
+    return model
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent encode requests into a single model.encode batch.
+
+    Callers submit lists of texts to a bounded queue. A worker thread takes the
+    first pending request, keeps collecting requests until either the batch is
+    full or the wait budget is spent, encodes everything at once and hands each
+    caller back its own slice of the result.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, max_batch_size: int = EMBEDDING_MAX_BATCH_SIZE,
+                 max_wait_ms: float = EMBEDDING_MAX_WAIT_MS, max_queue_size: int = EMBEDDING_QUEUE_SIZE):
+        """
+        Initialize the batcher.
+
+        Args:
+            model_name (str): Name of the sentence_transformers model to use
+            max_batch_size (int): Maximum number of texts encoded in one batch
+            max_wait_ms (float): Maximum time to wait for more requests before encoding
+            max_queue_size (int): Maximum number of pending requests before callers block
+        """
+        self.model_name = model_name
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, max_queue_size))
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self._closed = False
+
+    def submit(self, texts: List[str]) -> Future:
+        """
+        Queue texts for encoding.
+
+        Args:
+            texts (List[str]): Texts to encode
+
+        Returns:
+            Future: Resolves to a float32 array of shape (len(texts), dimension)
+
+        Raises:
+            RuntimeError: If the batcher is closed
+        """
+        future: Future = Future()
+        # Checking and enqueueing under the lock keeps every accepted request ahead of the stop sentinel
+        with self._worker_lock:
+            if self._closed:
+                raise RuntimeError("Embedding batcher is closed.")
+            if self._worker is None:
+                self._start_worker()
+            # Blocks when the queue is full, which applies backpressure to callers
+            self._queue.put((list(texts), future))
+        return future
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode texts through the shared batch and wait for the result.
+
+        Args:
+            texts (List[str]): Texts to encode
+
+        Returns:
+            np.ndarray: Float32 array of shape (len(texts), dimension)
+        """
+        return self.submit(texts).result()
+
+    def close(self) -> None:
+        """Stop the worker thread once the pending requests are encoded."""
+        with self._worker_lock:
+            if self._closed:
+                return
+            self._closed = True
+            worker = self._worker
+            if worker is not None:
+                self._queue.put(_STOP)
+
+        if worker is not None:
+            worker.join()
+
+    def _start_worker(self) -> None:
+        """Start the worker thread, called with the worker lock held."""
+        self._worker = threading.Thread(
+            target=self._run,
+            name=f"embedding-batcher-{self.model_name}",
+            daemon=True
+        )
+        self._worker.start()
+
+    def _run(self) -> None:
+        """Worker loop collecting and encoding batches."""
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            batch: List[Tuple[List[str], Future]] = [item]
+            count = len(item[0])
+            deadline = time.monotonic() + self.max_wait
+
+            # Keep collecting until the batch is full or the wait budget is spent
+            while count < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+                count += len(item[0])
+
+            self._encode_batch(batch)
+
+        self._fail_pending()
+
+    def _fail_pending(self) -> None:
+        """Fail the requests still queued when the worker stops, so no caller waits forever."""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _STOP:
+                item[1].set_exception(RuntimeError("Embedding batcher is closed."))
+
+    def _encode_batch(self, batch: List[Tuple[List[str], Future]]) -> None:
+        """
+        Encode a batch of requests and resolve their futures.
+
+        Args:
+            batch (List[Tuple[List[str], Future]]): Pending requests
+        """
+        texts = [text for request_texts, _ in batch for text in request_texts]
+
+        try:
+            EMBEDDING_BATCH_SIZE.observe(len(texts))
+            model = get_sentence_transformer(self.model_name)
+            with stage_timer("embedding_encode"):
+                embeddings = model.encode(
+                    texts,
+                    batch_size=self.max_batch_size,
+                    convert_to_numpy=True,
+                    show_progress_bar=False
+                )
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+        except Exception as e:
+            logger.error(f"Error encoding embedding batch of {len(texts)} texts: {str(e)}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        # Hand each caller its own rows of the batch result
+        offset = 0
+        for request_texts, future in batch:
+            future.set_result(embeddings[offset:offset + len(request_texts)])
+            offset += len(request_texts)
+
+def get_embedding_batcher(model_name: str = EMBEDDING_MODEL_NAME) -> EmbeddingBatcher:
+    """
+    Get the shared embedding batcher for a model.
+
+    Args:
+        model_name (str): Name of the sentence_transformers model to use
+
+    Returns:
+        EmbeddingBatcher: The shared batcher
+    """
+    batcher = _batchers.get(model_name)
+    if batcher is not None:
+        return batcher
+
+    with _batchers_lock:
+        batcher = _batchers.get(model_name)
+        if batcher is None:
+            batcher = EmbeddingBatcher(model_name=model_name)
+            _batchers[model_name] = batcher
+
+    return batcher
 
 class SentenceTransformerEmbeddings(Embeddings):
     """
     Wrapper for sentence_transformers models to use in LangChain.
+
+    The model is shared across instances and loaded on first use; all encode
+    calls go through the shared micro-batcher.
     """
-    
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME):
         """
         Initialize with a sentence_transformers model.
-        
+
         Args:
             model_name (str): Name of the sentence_transformers model to use
         """
-        self.model = SentenceTransformer(model_name)
-        
+        self.model_name = model_name
+        self.batcher = get_embedding_batcher(model_name)
+
+    @property
+    def model(self) -> SentenceTransformer:
+        """The shared sentence_transformers model."""
+        return get_sentence_transformer(self.model_name)
+
+    @property
+    def dimension(self) -> int:
+        """Dimension of the embeddings produced by the model."""
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed a list of texts as a float32 array.
+
+        Args:
+            texts (List[str]): List of texts to embed
+
+        Returns:
+            np.ndarray: Float32 array of shape (len(texts), dimension)
+        """
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return self.batcher.encode(texts)
+
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """
         Embed a list of texts.
-        
+
         Args:
             texts (List[str]): List of texts to embed
-            
+
         Returns:
             List[List[float]]: List of embeddings
         """
-        embeddings = self.model.encode(texts)
-        return embeddings.tolist()
-    
+        if not texts:
+            return []
+        return self.encode(texts).tolist()
+
     def embed_query(self, text: str) -> List[float]:
         """
         Embed a single text.
-        
+
         Args:
             text (str): Text to embed
-            
+
         Returns:
             List[float]: Embedding for the text
         """
-        embedding = self.model.encode(text)
-        return embedding.tolist()
+        return self.encode([text])[0].tolist()
 
-def get_embeddings(model_name: str = "all-MiniLM-L6-v2") -> Embeddings:
+def get_embeddings(model_name: str = EMBEDDING_MODEL_NAME) -> Embeddings:
     """
-    Get an instance of SentenceTransformerEmbeddings.
-    
+    Get the shared SentenceTransformerEmbeddings instance for a model.
+
     Args:
         model_name (str): Name of the sentence_transformers model to use
-        
+
     Returns:
-        Embeddings: An instance of SentenceTransformerEmbeddings
+        Embeddings: The shared SentenceTransformerEmbeddings instance
     """
-    return SentenceTransformerEmbeddings(model_name=model_name) 
\ No newline at end of file
+    embeddings = _embeddings.get(model_name)
+    if embeddings is not None:
+        return embeddings
+
+    with _embeddings_lock:
+        embeddings = _embeddings.get(model_name)
+        if embeddings is None:
+            embeddings = SentenceTransformerEmbeddings(model_name=model_name)
+            _embeddings[model_name] = embeddings
+
+    return embeddings
+
+def close_embeddings() -> None:
+    """Stop every embedding batcher worker."""
+    with _embeddings_lock:
+        _embeddings.clear()
+    with _batchers_lock:
+        batchers = list(_batchers.values())
+        _batchers.clear()
+
+    for batcher in batchers:
+        batcher.close()
@@ -0,0 +1,180 @@
+"""
+Deterministic fake chat model for load and latency testing.
+
+Responses are derived from the prompt text, so the same conversation always gets
+the same answer, while the time to the first token, the streaming rate and the
+failures follow the configured distributions. No network call is made, so a
+benchmark measures only the overhead of the service itself.
+"""
+
+import math
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from pydantic import PrivateAttr
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.messages.ai import UsageMetadata
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from app.enum.model import ModelFakeName
+from app.config.config import (
+    FAKE_LLM_LATENCY_DISTRIBUTION,
+    FAKE_LLM_LATENCY_MS,
+    FAKE_LLM_LATENCY_JITTER_MS,
+    FAKE_LLM_TOKENS_PER_SECOND,
+    FAKE_LLM_RESPONSE_TOKENS,
+    FAKE_LLM_ERROR_RATE,
+    FAKE_LLM_SEED
+)
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+# Words the responses are built from, picked by the hash of the prompt
+_VOCABULARY = (
+    "你好", "学习", "汉语", "HSK", "老师", "朋友", "今天", "我们", "可以", "练习",
+    "词语", "句子", "语法", "考试", "准备", "意思", "例如", "非常", "觉得", "问题",
+)
+
+class FakeLLMError(RuntimeError):
+    """Error raised by the fake model for the calls selected by the error rate."""
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model returning deterministic responses with simulated latency and failures.
+    
+    The latency and error draws come from a random generator seeded with seed, so
+    a sequence of calls is reproducible.
+    """
+    
+    model_name: str = ModelFakeName.FAKE_CHAT.value
+    temperature: float = 0.7
+    max_tokens: Optional[int] = None
+    latency_distribution: str = FAKE_LLM_LATENCY_DISTRIBUTION
+    latency_ms: float = FAKE_LLM_LATENCY_MS
+    latency_jitter_ms: float = FAKE_LLM_LATENCY_JITTER_MS
+    tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND
+    response_tokens: int = FAKE_LLM_RESPONSE_TOKENS
+    error_rate: float = FAKE_LLM_ERROR_RATE
+    seed: int = FAKE_LLM_SEED
+    
+    model_config = {
+        "protected_namespaces": ()
+    }
+    
+    _rng: random.Random = PrivateAttr()
+    _rng_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        if self.latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unsupported latency distribution: {self.latency_distribution}. Use one of {LATENCY_DISTRIBUTIONS}.")
+        self._rng = random.Random(self.seed)
+    
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+    
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {
+            "model_name": self.model_name,
+            "latency_distribution": self.latency_distribution,
+            "latency_ms": self.latency_ms,
+            "tokens_per_second": self.tokens_per_second,
+            "error_rate": self.error_rate,
+        }
+    
+    def _sample_first_token_delay(self) -> float:
+        """Draw the time to the first token in seconds. The generator lock must be held."""
+        if self.latency_distribution == "uniform":
+            delay = self._rng.uniform(self.latency_ms - self.latency_jitter_ms, self.latency_ms + self.latency_jitter_ms)
+        elif self.latency_distribution == "normal":
+            delay = self._rng.gauss(self.latency_ms, self.latency_jitter_ms)
+        elif self.latency_distribution == "lognormal":
+            # Median latency_ms with a long tail, the jitter setting the spread relative to the median
+            sigma = math.log1p(self.latency_jitter_ms / self.latency_ms) if self.latency_ms > 0 else 0.0
+            delay = self._rng.lognormvariate(math.log(max(self.latency_ms, 1e-3)), sigma)
+        else:
+            delay = self.latency_ms
+        return max(0.0, delay) / 1000
+    
+    def _plan(self, messages: List[BaseMessage]) -> Tuple[List[str], float, float, UsageMetadata]:
+        """
+        Draw the latency and failure of a call and build its response.
+        
+        Args:
+            messages (List[BaseMessage]): The prompt messages
+        
+        Returns:
+            Tuple[List[str], float, float, UsageMetadata]: The response tokens, the delay before the first token,
+                the delay between tokens (both in seconds) and the token usage
+        
+        Raises:
+            FakeLLMError: If the call is selected to fail
+        """
+        with self._rng_lock:
+            failed = self.error_rate > 0 and self._rng.random() < self.error_rate
+            first_token_delay = self._sample_first_token_delay()
+        if failed:
+            raise FakeLLMError("Injected failure of the fake chat model")
+        
+        prompt = "\n".join(str(message.content) for message in messages)
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        count = self.response_tokens if self.max_tokens is None else min(self.response_tokens, self.max_tokens)
+        words = [_VOCABULARY[(digest[i % len(digest)] + i) % len(_VOCABULARY)] for i in range(max(1, count))]
+        tokens = [word + " " for word in words[:-1]] + [words[-1]]
+        
+        token_interval = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        input_tokens = len(prompt.split())
+        usage = UsageMetadata(input_tokens=input_tokens, output_tokens=len(tokens), total_tokens=input_tokens + len(tokens))
+        return tokens, first_token_delay, token_interval, usage
+    
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        tokens, first_token_delay, token_interval, usage = self._plan(messages)
+        time.sleep(first_token_delay + token_interval * (len(tokens) - 1))
+        message = AIMessage(content="".join(tokens), usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+    
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        tokens, first_token_delay, token_interval, usage = self._plan(messages)
+        await asyncio.sleep(first_token_delay + token_interval * (len(tokens) - 1))
+        message = AIMessage(content="".join(tokens), usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+    
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        tokens, first_token_delay, token_interval, usage = self._plan(messages)
+        time.sleep(first_token_delay)
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(token_interval)
+            # The usage is reported with the last token, as the provider integrations do
+            chunk = ChatGenerationChunk(message=AIMessageChunk(
+                content=token,
+                usage_metadata=usage if i == len(tokens) - 1 else None
+            ))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+    
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        tokens, first_token_delay, token_interval, usage = self._plan(messages)
+        await asyncio.sleep(first_token_delay)
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(token_interval)
+            # The usage is reported with the last token, as the provider integrations do
+            chunk = ChatGenerationChunk(message=AIMessageChunk(
+                content=token,
+                usage_metadata=usage if i == len(tokens) - 1 else None
+            ))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
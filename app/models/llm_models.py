@@ -1,22 +1,54 @@
+import threading
+from typing import Any, Dict, Optional, Tuple
 from langchain_openai import ChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.language_models.chat_models import BaseChatModel
-from app.config.config import OPENAI_API_KEY, GOOGLE_API_KEY, LANGSMITH_TRACING
-from app.utils.langsmith import get_langsmith_tracer
-from app.enum.model import ModelProvider, ModelGeminiName, ModelOpenAiName
+from langchain_core.runnables import RunnableConfig
+from app.config.config import OPENAI_API_KEY, GOOGLE_API_KEY, LANGSMITH_TRACING, FAKE_LLM_ENABLED
+from app.utils.langsmith import get_shared_langchain_tracer
+from app.core.metrics import get_llm_metrics_callback
+from app.models.fake_llm import FakeChatModel
+from app.enum.model import ModelProvider, ModelGeminiName, ModelOpenAiName, ModelFakeName
 
-def get_openai_model(model_name: ModelOpenAiName = ModelOpenAiName.OPENAI_GPT_4_1_NANO, temperature=0.7, max_tokens=None, run_name=None) -> BaseChatModel:
+# Pooled chat model clients keyed by (provider, model, temperature, max_tokens).
+# Reusing an instance reuses its HTTP/gRPC client, so connections stay alive across requests.
+_model_pool: Dict[Tuple[str, str, float, Optional[int]], BaseChatModel] = {}
+_model_pool_lock = threading.Lock()
+
+def _get_pooled_model(key: Tuple[str, str, float, Optional[int]], factory) -> BaseChatModel:
+    """
+    Get a pooled model instance, building it with the factory on first use.
+    
+    Args:
+        key (Tuple): The (provider, model, temperature, max_tokens) key of the client
+        factory (Callable): Builds the model when it is not pooled yet
+    
+    Returns:
+        BaseChatModel: The pooled chat model
+    """
+    model = _model_pool.get(key)
+    if model is not None:
+        return model
+    
+    with _model_pool_lock:
+        model = _model_pool.get(key)
+        if model is None:
+            model = factory()
+            _model_pool[key] = model
+    
+    return model
+
+def get_openai_model(model_name: ModelOpenAiName = ModelOpenAiName.OPENAI_GPT_4_1_NANO, temperature=0.7, max_tokens=None) -> BaseChatModel:
     """
-    Initialize and return an OpenAI chat model.
+    Return the pooled OpenAI chat model for a configuration.
     
     Args:
         model_name (str): The name of the OpenAI model to use
         temperature (float): Controls randomness in responses
         max_tokens (int, optional): Maximum number of tokens to generate
-        run_name (str, optional): Name for tracing runs
-        
+    
     Returns:
-        ChatOpenAI: An instance of ChatOpenAI
+        ChatOpenAI: A shared instance of ChatOpenAI
     """
     if not OPENAI_API_KEY:
         raise ValueError("OpenAI API key is not set. Please set the OPENAI_API_KEY environment variable.")
@@ -24,37 +56,32 @@ def get_openai_model(model_name: ModelOpenAiName = ModelOpenAiName.OPENAI_GPT_4_
     # Convert enum to string value if it's an enum
     model_name_value = model_name.value if hasattr(model_name, 'value') else str(model_name)
     
-    callbacks = []
-    if LANGSMITH_TRACING:
-        tracer = get_langsmith_tracer(run_name=run_name or f"openai-{model_name_value}")
-        if tracer:
-            callbacks.append(tracer)
-    
-    model_kwargs = {
-        "model": model_name_value,
-        "temperature": temperature,
-        "api_key": OPENAI_API_KEY,
-        "callbacks": callbacks if callbacks else None
-    }
-    
-    # Add max_tokens if provided
-    if max_tokens is not None:
-        model_kwargs["max_tokens"] = max_tokens
+    def build() -> BaseChatModel:
+        model_kwargs = {
+            "model": model_name_value,
+            "temperature": temperature,
+            "api_key": OPENAI_API_KEY,
+        }
+        
+        # Add max_tokens if provided
+        if max_tokens is not None:
+            model_kwargs["max_tokens"] = max_tokens
+        
+        return ChatOpenAI(**model_kwargs)
     
-    return ChatOpenAI(**model_kwargs)
+    return _get_pooled_model((ModelProvider.OPENAI.value, model_name_value, temperature, max_tokens), build)
 
-def get_gemini_model(model_name: ModelGeminiName = ModelGeminiName.GEMINI_2_0_FLASH, temperature=0.7, max_tokens=None, run_name=None) -> BaseChatModel:
+def get_gemini_model(model_name: ModelGeminiName = ModelGeminiName.GEMINI_2_0_FLASH, temperature=0.7, max_tokens=None) -> BaseChatModel:
     """
-    Initialize and return a Google Gemini chat model.
+    Return the pooled Google Gemini chat model for a configuration.
     
     Args:
         model_name (str): The name of the Gemini model to use
         temperature (float): Controls randomness in responses
         max_tokens (int, optional): Maximum number of tokens to generate
-        run_name (str, optional): Name for tracing runs
-        
+    
     Returns:
-        ChatGoogleGenerativeAI: An instance of ChatGoogleGenerativeAI
+        ChatGoogleGenerativeAI: A shared instance of ChatGoogleGenerativeAI
     """
     if not GOOGLE_API_KEY:
         raise ValueError("Google API key is not set. Please set the GOOGLE_API_KEY environment variable.")
@@ -62,40 +89,102 @@ def get_gemini_model(model_name: ModelGeminiName = ModelGeminiName.GEMINI_2_0_FL
     # Convert enum to string value if it's an enum
     model_name_value = model_name.value if hasattr(model_name, 'value') else str(model_name)
     
-    callbacks = []
-    if LANGSMITH_TRACING:
-        tracer = get_langsmith_tracer(run_name=run_name or f"gemini-{model_name_value}")
-        if tracer:
-            callbacks.append(tracer)
+    def build() -> BaseChatModel:
+        model_kwargs = {
+            "model": model_name_value,
+            "temperature": temperature,
+            "google_api_key": GOOGLE_API_KEY,
+        }
+        
+        # Add max_tokens if provided
+        if max_tokens is not None:
+            model_kwargs["max_output_tokens"] = max_tokens  # Gemini uses max_output_tokens instead of max_tokens
+        
+        return ChatGoogleGenerativeAI(**model_kwargs)
     
-    model_kwargs = {
-        "model": model_name_value,
-        "temperature": temperature,
-        "google_api_key": GOOGLE_API_KEY,
-        "callbacks": callbacks if callbacks else None
-    }
+    return _get_pooled_model((ModelProvider.GEMINI.value, model_name_value, temperature, max_tokens), build)
+
+def get_fake_model(model_name: ModelFakeName = ModelFakeName.FAKE_CHAT, temperature=0.7, max_tokens=None) -> BaseChatModel:
+    """
+    Return the pooled fake chat model for a configuration.
+    
+    The fake model answers offline with deterministic responses and the latency,
+    streaming rate and error rate set by the FAKE_LLM_* settings.
+    
+    Args:
+        model_name (str): The name reported by the fake model
+        temperature (float): Accepted for compatibility, has no effect
+        max_tokens (int, optional): Maximum number of tokens to generate
     
-    # Add max_tokens if provided
-    if max_tokens is not None:
-        model_kwargs["max_output_tokens"] = max_tokens  # Gemini uses max_output_tokens instead of max_tokens
+    Returns:
+        FakeChatModel: A shared instance of FakeChatModel
+    """
+    if not FAKE_LLM_ENABLED:
+        raise ValueError("The fake model provider is disabled. Set FAKE_LLM_ENABLED=true to use it.")
     
-    return ChatGoogleGenerativeAI(**model_kwargs)
+    # Convert enum to string value if it's an enum
+    model_name_value = model_name.value if hasattr(model_name, 'value') else str(model_name)
+    
+    def build() -> BaseChatModel:
+        return FakeChatModel(model_name=model_name_value, temperature=temperature, max_tokens=max_tokens)
+    
+    return _get_pooled_model((ModelProvider.FAKE.value, model_name_value, temperature, max_tokens), build)
 
-def get_model(provider: ModelProvider = ModelProvider.GEMINI, run_name=None, **kwargs) -> BaseChatModel:
+def get_model(provider: ModelProvider = ModelProvider.GEMINI, **kwargs) -> BaseChatModel:
     """
-    Factory function to get the appropriate model based on provider.
+    Factory function to get the pooled model based on provider.
+    
+    Tracing callbacks are not attached to the model; pass the config built by
+    get_run_config to invoke/ainvoke/astream instead.
     
     Args:
-        provider (str): The model provider to use ('openai' or 'gemini')
-        run_name (str, optional): Name for tracing runs
+        provider (str): The model provider to use ('openai', 'gemini' or 'fake')
         **kwargs: Additional arguments to pass to the model initializer
-        
+    
     Returns:
-        BaseChatModel: An instance of a chat model
+        BaseChatModel: A shared instance of a chat model
     """
     if provider == ModelProvider.OPENAI or (hasattr(provider, 'value') and provider.value == ModelProvider.OPENAI.value):
-        return get_openai_model(run_name=run_name, **kwargs)
+        return get_openai_model(**kwargs)
     elif provider == ModelProvider.GEMINI or (hasattr(provider, 'value') and provider.value == ModelProvider.GEMINI.value):
-        return get_gemini_model(run_name=run_name, **kwargs)
+        return get_gemini_model(**kwargs)
+    elif provider == ModelProvider.FAKE or (hasattr(provider, 'value') and provider.value == ModelProvider.FAKE.value):
+        return get_fake_model(**kwargs)
     else:
-        raise ValueError(f"Unsupported model provider: {provider}. Use 'openai' or 'gemini'.") 
\ No newline at end of file
+        raise ValueError(f"Unsupported model provider: {provider}. Use 'openai', 'gemini' or 'fake'.")
+
+def get_run_config(run_name: str, session_id: Optional[str] = None, provider: Optional[ModelProvider] = None,
+                   model_name: Optional[str] = None, **metadata: Any) -> RunnableConfig:
+    """
+    Build the invoke-time config carrying the per-request tracing data.
+    
+    Args:
+        run_name (str): Name for tracing runs
+        session_id (str, optional): The session the run belongs to
+        provider (ModelProvider, optional): The model provider, to label the LLM metrics
+        model_name (str, optional): The model name, to label the LLM metrics
+        **metadata: Additional metadata attached to the run
+    
+    Returns:
+        RunnableConfig: Config to pass to invoke/ainvoke/astream
+    """
+    if session_id is not None:
+        metadata["session_id"] = session_id
+    
+    callbacks = []
+    if provider is not None:
+        callbacks.append(get_llm_metrics_callback(provider, model_name))
+    
+    if LANGSMITH_TRACING:
+        tracer = get_shared_langchain_tracer()
+        if tracer:
+            callbacks.append(tracer)
+    
+    config: RunnableConfig = {
+        "run_name": run_name,
+        "metadata": metadata,
+    }
+    if callbacks:
+        config["callbacks"] = callbacks
+    
+    return config
@@ -1,35 +1,82 @@
-from langchain_mongodb import MongoDBChatMessageHistory
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
-from app.config.config import MONGODB_URI, MONGODB_DB_NAME
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Sequence, Tuple
 import uuid
 import time
 from app.models.vector_store import get_vector_store
+from app.repositories.chat_session import ChatSessionRepository
+from app.core.metrics import stage_timer
 
-class LimitedMongoDBChatMessageHistory(MongoDBChatMessageHistory):
+# Roles used by the chat session store for each LangChain message type
+ROLE_BY_MESSAGE_TYPE = {"human": "user", "ai": "assistant"}
+
+def messages_to_session_records(messages: Sequence[BaseMessage]) -> List[Tuple[str, str]]:
+    """
+    Convert messages to the (role, content) records of the chat session store.
+    
+    Args:
+        messages (Sequence[BaseMessage]): The messages to convert
+    
+    Returns:
+        List[Tuple[str, str]]: The records to save
+    """
+    return [
+        (ROLE_BY_MESSAGE_TYPE.get(message.type, message.type), message.content)
+        for message in messages
+    ]
+
+def session_records_to_messages(records: Sequence[Dict[str, Any]]) -> List[BaseMessage]:
+    """
+    Convert stored chat session messages back to LangChain messages.
+    
+    Args:
+        records (Sequence[Dict[str, Any]]): The stored messages with role and content
+    
+    Returns:
+        List[BaseMessage]: The messages
+    """
+    messages = []
+    for record in records:
+        if record["role"] == "user":
+            messages.append(HumanMessage(content=record["content"]))
+        elif record["role"] == "assistant":
+            messages.append(AIMessage(content=record["content"]))
+    return messages
+
+class LimitedMongoDBChatMessageHistory(BaseChatMessageHistory):
     """
     A MongoDB-backed chat message history that only retrieves the most recent messages.
+    
+    This is a view over the chat session store (ChatSessionRepository), which is the
+    single place messages are written to. Reads fetch only the buckets holding the last
+    max_messages messages, so their cost does not grow with the length of the session.
+    Older messages are available page by page through get_older_messages.
     """
     
-    def __init__(self, connection_string, database_name, collection_name, session_id, max_messages=10):
+    def __init__(self, session_id, max_messages=10):
         """
         Initialize the limited MongoDB chat message history.
         
         Args:
-            connection_string (str): The MongoDB connection string
-            database_name (str): The name of the MongoDB database
-            collection_name (str): The name of the MongoDB collection
             session_id (str): A unique identifier for the conversation
             max_messages (int): Maximum number of messages to retrieve
         """
-        super().__init__(
-            connection_string=connection_string,
-            database_name=database_name,
-            collection_name=collection_name,
-            session_id=session_id,
-        )
+        self.session_id = session_id
         self.max_messages = max_messages
+        self.repository = ChatSessionRepository()
+    
+    def _page(self, records: List[Dict[str, Any]]) -> Tuple[List[BaseMessage], Optional[int]]:
+        """
+        Turn a page of stored messages into messages and the cursor of the next older page.
+        
+        Args:
+            records (List[Dict[str, Any]]): The stored messages, oldest first
+        
+        Returns:
+            Tuple[List[BaseMessage], Optional[int]]: The messages, oldest first, and the cursor of the next older page
+        """
+        next_before = records[0]["seq"] if records and records[0]["seq"] > 0 else None
+        return session_records_to_messages(records), next_before
     
     @property
     def messages(self) -> List[BaseMessage]:
@@ -39,11 +86,87 @@ class LimitedMongoDBChatMessageHistory(MongoDBChatMessageHistory):
         Returns:
             List[BaseMessage]: The most recent messages (limited to max_messages)
         """
-        # Call the parent method to get all messages
-        all_messages = super().messages
+        messages, _ = self.get_older_messages(limit=self.max_messages)
+        return messages
+    
+    def get_older_messages(self, before: Optional[int] = None, limit: Optional[int] = None) -> Tuple[List[BaseMessage], Optional[int]]:
+        """
+        Get a page of messages, walking back from the newest message.
+        
+        Args:
+            before (int, optional): Cursor returned by the previous page; None starts from the newest message
+            limit (int, optional): Page size, defaults to max_messages
+        
+        Returns:
+            Tuple[List[BaseMessage], Optional[int]]: The messages, oldest first, and the cursor of the next older page
+        """
+        if not limit or limit <= 0:
+            limit = self.max_messages
+        
+        with stage_timer("mongo_history_read"):
+            return self._page(self.repository.get_messages(self.session_id, limit=limit, before=before))
+    
+    async def aget_messages(self) -> List[BaseMessage]:
+        """
+        Get the most recent messages from the chat history asynchronously.
+        
+        Returns:
+            List[BaseMessage]: The most recent messages (limited to max_messages)
+        """
+        messages, _ = await self.aget_older_messages(limit=self.max_messages)
+        return messages
+    
+    async def aget_older_messages(self, before: Optional[int] = None, limit: Optional[int] = None) -> Tuple[List[BaseMessage], Optional[int]]:
+        """
+        Get a page of messages asynchronously, walking back from the newest message.
+        
+        Args:
+            before (int, optional): Cursor returned by the previous page; None starts from the newest message
+            limit (int, optional): Page size, defaults to max_messages
+        
+        Returns:
+            Tuple[List[BaseMessage], Optional[int]]: The messages, oldest first, and the cursor of the next older page
+        """
+        if not limit or limit <= 0:
+            limit = self.max_messages
+        
+        with stage_timer("mongo_history_read"):
+            return self._page(await self.repository.aget_messages(self.session_id, limit=limit, before=before))
+    
+    def add_message(self, message: BaseMessage) -> None:
+        """
+        Add a message to the chat history.
+        
+        Args:
+            message (BaseMessage): The message to add
+        """
+        self.add_messages([message])
+    
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """
+        Add messages to the chat history in one write.
         
-        # Return only the most recent messages, limited by max_messages
-        return all_messages[-self.max_messages:] if all_messages else []
+        Args:
+            messages (Sequence[BaseMessage]): The messages to add
+        """
+        self.repository.save_messages(self.session_id, messages_to_session_records(messages))
+    
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """
+        Add messages to the chat history asynchronously, in one write.
+        
+        Args:
+            messages (Sequence[BaseMessage]): The messages to add
+        """
+        await self.repository.asave_messages(self.session_id, messages_to_session_records(messages))
+    
+    def clear(self) -> None:
+        """Clear the chat history."""
+        self.repository.clear_messages(self.session_id)
+    
+    async def aclear(self) -> None:
+        """Clear the chat history asynchronously."""
+        await self.repository.aclear_messages(self.session_id)
 
 class VectorChatMessageHistory(BaseChatMessageHistory):
     """
@@ -64,12 +187,7 @@ class VectorChatMessageHistory(BaseChatMessageHistory):
         self.namespace = namespace
         self.k = k
         self.score_threshold = score_threshold
-        self.mongodb_history = MongoDBChatMessageHistory(
-            connection_string=MONGODB_URI,
-            database_name=MONGODB_DB_NAME,
-            collection_name="chat_history",
-            session_id=session_id,
-        )
+        self.mongodb_history = LimitedMongoDBChatMessageHistory(session_id=session_id, max_messages=5)
         self.vector_store = get_vector_store(collection_name=namespace)
         self._current_query = None
     
@@ -92,19 +210,58 @@ class VectorChatMessageHistory(BaseChatMessageHistory):
         """
         # If we don't have a query, just return the recent messages
         if not self._current_query:
-            return self.mongodb_history.messages[-5:]  # Return the 5 most recent messages for context
+            return self.mongodb_history.messages  # Return the 5 most recent messages for context
+        
+        # Get relevant messages from vector store
+        with stage_timer("memory_vector_search"):
+            relevant_messages = self.vector_store.search_similar_messages(
+                query=self._current_query,
+                session_id=self.session_id,
+                k=self.k,
+                score_threshold=self.score_threshold
+            )
+        
+        # Add the 3 most recent messages for conversational continuity
+        recent_messages = self.mongodb_history.messages[-3:]
+        
+        return self._merge_messages(recent_messages, relevant_messages)
+    
+    async def aget_messages(self) -> List[BaseMessage]:
+        """
+        Get the relevant messages from the chat history asynchronously.
+        
+        Returns:
+            List[BaseMessage]: The relevant messages based on the current query
+        """
+        # If we don't have a query, just return the recent messages
+        if not self._current_query:
+            return await self.mongodb_history.aget_messages()
         
         # Get relevant messages from vector store
-        relevant_messages = self.vector_store.search_similar_messages(
-            query=self._current_query,
-            session_id=self.session_id,
-            k=self.k,
-            score_threshold=self.score_threshold
-        )
+        with stage_timer("memory_vector_search"):
+            relevant_messages = await self.vector_store.asearch_similar_messages(
+                query=self._current_query,
+                session_id=self.session_id,
+                k=self.k,
+                score_threshold=self.score_threshold
+            )
         
         # Add the 3 most recent messages for conversational continuity
-        recent_messages = self.mongodb_history.messages[-3:] if self.mongodb_history.messages else []
+        recent_messages = (await self.mongodb_history.aget_messages())[-3:]
+        
+        return self._merge_messages(recent_messages, relevant_messages)
+    
+    def _merge_messages(self, recent_messages: List[BaseMessage], relevant_messages: List[BaseMessage]) -> List[BaseMessage]:
+        """
+        Combine recent and relevant messages without duplicates.
         
+        Args:
+            recent_messages (List[BaseMessage]): The most recent messages
+            relevant_messages (List[BaseMessage]): The messages found by vector search
+        
+        Returns:
+            List[BaseMessage]: The combined messages
+        """
         # Combine and deduplicate messages (we prefer recent messages if there's a duplicate)
         seen_contents = {msg.content for msg in recent_messages}
         deduplicated_messages = list(recent_messages)
@@ -123,26 +280,57 @@ class VectorChatMessageHistory(BaseChatMessageHistory):
         Args:
             message (BaseMessage): The message to add
         """
+        self.add_messages([message])
+    
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """
+        Add messages to the chat history with one write to the chat session store.
+        
+        Args:
+            messages (Sequence[BaseMessage]): The messages to add
+        """
         # Add to MongoDB
-        self.mongodb_history.add_message(message)
+        self.mongodb_history.add_messages(messages)
         
-        # Add to vector store with metadata
-        metadata = {
-            "timestamp": int(time.time()),
-            "message_id": str(uuid.uuid4())
-        }
-        self.vector_store.add_message(message, self.session_id, metadata)
+        # Add to the vector store write buffer with metadata
+        self._buffer_vectors(messages)
+    
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """
+        Add messages to the chat history asynchronously, with one write to the chat session store.
+        
+        Args:
+            messages (Sequence[BaseMessage]): The messages to add
+        """
+        # Add to MongoDB
+        await self.mongodb_history.aadd_messages(messages)
+        
+        # Add to the vector store write buffer with metadata
+        self._buffer_vectors(messages)
+    
+    def _buffer_vectors(self, messages: Sequence[BaseMessage]) -> None:
+        """
+        Queue messages for indexing in the vector store.
+        
+        Args:
+            messages (Sequence[BaseMessage]): The messages to index
+        """
+        for message in messages:
+            metadata = {
+                "timestamp": int(time.time()),
+                "message_id": str(uuid.uuid4())
+            }
+            self.vector_store.buffer_message(message, self.session_id, metadata)
     
     def clear(self) -> None:
         """
-        Clear the conversation history.
-        Note: This only clears MongoDB history, not the vector store.
-        To clear the vector store, a new collection/namespace should be created.
+        Clear the conversation history, in MongoDB and in the vector store.
+        
+        The session's points are deleted from Qdrant and its local index is dropped,
+        so the cleared messages are no longer returned as similar messages.
         """
-        # We can't easily clear specific documents from Pinecone based on session ID
-        # So we only clear MongoDB history
-        if hasattr(self.mongodb_history, "clear"):
-            self.mongodb_history.clear()
+        self.mongodb_history.clear()
+        self.vector_store.delete_session(self.session_id)
 
 def get_mongodb_chat_history(session_id, max_messages=10):
     """
@@ -155,13 +343,7 @@ def get_mongodb_chat_history(session_id, max_messages=10):
     Returns:
         LimitedMongoDBChatMessageHistory: A chat history stored in MongoDB with limited retrieval
     """
-    return LimitedMongoDBChatMessageHistory(
-        connection_string=MONGODB_URI,
-        database_name=MONGODB_DB_NAME,
-        collection_name="chat_history",
-        session_id=session_id,
-        max_messages=max_messages,
-    )
+    return LimitedMongoDBChatMessageHistory(session_id=session_id, max_messages=max_messages)
 
 def get_vector_chat_history(session_id: str, k: int = 10, score_threshold: float = 0.6) -> VectorChatMessageHistory:
     """
@@ -0,0 +1,445 @@
+"""
+Cache of LLM responses for repeated questions.
+
+Learners often ask the same questions, so answers are kept in memory and reused
+when a new question matches a cached one exactly (after normalization) or is a
+near-duplicate by embedding similarity. Entries are scoped by provider, model
+and system-prompt version, so changing any of them never serves a stale answer.
+
+The cache is shared by every session, so callers only use it for turns whose
+prompt holds nothing but the base system prompt and the question: an answer that
+depends on a session's history or retrieved messages must never reach another
+session.
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.models.embedding import get_embeddings
+from app.utils.cache import LRUTTLCache
+from app.core.metrics import register_stats_source
+from app.config.config import (
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_TTL_SECONDS,
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD
+)
+
+# Approximate per-entry bookkeeping size added to the query and response lengths
+ENTRY_OVERHEAD_BYTES = 200
+
+_WHITESPACE = re.compile(r"\s+")
+_NUMBER = re.compile(r"\d+")
+_TRAILING_PUNCTUATION = " ?!.,;:~…。？！，；："
+
+# Shared response cache, None until first use
+_response_cache: Optional["ResponseCache"] = None
+_response_cache_lock = threading.Lock()
+
+class ResponseCacheScope(NamedTuple):
+    """Configuration a cached response is valid for."""
+    
+    provider: str
+    model: str
+    prompt_version: str
+
+class ResponseCacheLookup(NamedTuple):
+    """Result of a response cache lookup."""
+    
+    response: Optional[str]
+    # "exact", "semantic" or "miss"
+    match: str
+    # Embedding of the query if one was computed, to be reused when storing the response
+    query_vector: Optional[List[float]] = None
+
+class CachedResponse(NamedTuple):
+    """A cached answer."""
+    
+    query: str
+    response: str
+    created_at: float
+
+def normalize_query(text: str) -> str:
+    """
+    Normalize a question for exact matching.
+    
+    Unicode compatibility forms are folded, case is ignored, whitespace is collapsed
+    and trailing punctuation is dropped, so "HSK1 có bao nhiêu từ?" and
+    "hsk1 có bao nhiêu từ" match.
+    
+    Args:
+        text (str): The question
+    
+    Returns:
+        str: The normalized question
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _WHITESPACE.sub(" ", text).strip().rstrip(_TRAILING_PUNCTUATION)
+
+def query_numbers(text: str) -> Tuple[str, ...]:
+    """
+    Get the numbers of a question, in order.
+    
+    Questions differing only by a number ("HSK1 có bao nhiêu từ?" and "HSK2 có bao
+    nhiêu từ?") embed almost identically, so a semantic match also requires the
+    same numbers.
+    
+    Args:
+        text (str): The question
+    
+    Returns:
+        Tuple[str, ...]: The numbers found in the question
+    """
+    return tuple(_NUMBER.findall(unicodedata.normalize("NFKC", text)))
+
+def get_response_cache_scope(provider: Any, model_name: Any, prompt_version: str) -> ResponseCacheScope:
+    """
+    Build the cache scope of a chat configuration.
+    
+    Args:
+        provider (ModelProvider): The model provider
+        model_name (str): The model name
+        prompt_version (str): Cache key of the compiled system prompt
+    
+    Returns:
+        ResponseCacheScope: The scope
+    """
+    provider_value = provider.value if hasattr(provider, 'value') else str(provider)
+    model_value = model_name.value if hasattr(model_name, 'value') else str(model_name)
+    return ResponseCacheScope(provider_value, model_value, prompt_version)
+
+class _ScopeIndex:
+    """Normalized query embeddings of the cached entries of one scope."""
+    
+    def __init__(self, dimension: int, capacity: int = 64):
+        self._vectors = np.zeros((capacity, dimension), dtype=np.float32)
+        self._keys: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+    
+    def add(self, key: str, vector: List[float]) -> None:
+        """Add or replace the embedding of an entry."""
+        row = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(row)
+        if norm > 0:
+            row = row / norm
+        
+        if key in self._rows:
+            self._vectors[self._rows[key]] = row
+            return
+        
+        # Drop removed rows before growing the matrix
+        if len(self._keys) == self._vectors.shape[0]:
+            self._compact()
+        if len(self._keys) == self._vectors.shape[0]:
+            grown = np.zeros((len(self._keys) * 2, self._vectors.shape[1]), dtype=np.float32)
+            grown[:len(self._keys)] = self._vectors
+            self._vectors = grown
+        
+        self._rows[key] = len(self._keys)
+        self._vectors[len(self._keys)] = row
+        self._keys.append(key)
+    
+    def remove(self, key: str) -> None:
+        """Remove the embedding of an entry."""
+        row = self._rows.pop(key, None)
+        if row is not None:
+            self._keys[row] = None
+            self._vectors[row] = 0
+    
+    def best_match(self, vector: List[float]) -> Optional[Tuple[str, float]]:
+        """Get the key and cosine similarity of the closest entry."""
+        if not self._rows:
+            return None
+        
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        
+        # Removed rows are zero vectors and score 0
+        scores = self._vectors[:len(self._keys)] @ query
+        row = int(np.argmax(scores))
+        key = self._keys[row]
+        return (key, float(scores[row])) if key is not None else None
+    
+    def __len__(self) -> int:
+        return len(self._rows)
+    
+    def _compact(self) -> None:
+        """Move the live rows to the front of the matrix."""
+        live = [(key, row) for row, key in enumerate(self._keys) if key is not None]
+        if len(live) == len(self._keys):
+            return
+        
+        rows = [row for _, row in live]
+        self._vectors[:len(rows)] = self._vectors[rows]
+        self._vectors[len(rows):] = 0
+        self._keys = [key for key, _ in live]
+        self._rows = {key: row for row, key in enumerate(self._keys)}
+
+class ResponseCache:
+    """
+    LRU cache of responses with exact and semantic lookup.
+    
+    Entries expire TTL seconds after they were stored, even if they keep being
+    used, so answers are eventually regenerated.
+    """
+    
+    def __init__(self, embeddings: Optional[Embeddings] = None, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 max_bytes: int = RESPONSE_CACHE_MAX_BYTES, ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+                 similarity_threshold: float = RESPONSE_CACHE_SIMILARITY_THRESHOLD):
+        """
+        Initialize the cache.
+        
+        Args:
+            embeddings (Embeddings, optional): Embedding model for the semantic match
+            max_entries (int): Maximum number of cached responses
+            max_bytes (int): Maximum total size of the cached responses
+            ttl_seconds (float): Time after which a response expires
+            similarity_threshold (float): Minimum cosine similarity of a near-duplicate question, 0 to disable
+        """
+        self._embeddings = embeddings
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        # Eviction callbacks run under the entry cache lock, which is only ever taken with self._lock held
+        self._lock = threading.RLock()
+        self._entries: LRUTTLCache[CachedResponse] = LRUTTLCache(
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            ttl_seconds=ttl_seconds,
+            on_evict=self._on_evict
+        )
+        self._indexes: Dict[ResponseCacheScope, _ScopeIndex] = {}
+        self.metrics = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "stores": 0,
+        }
+    
+    @property
+    def embeddings(self) -> Embeddings:
+        """Embedding model used for the semantic match, loaded on first use."""
+        if self._embeddings is None:
+            self._embeddings = get_embeddings()
+        return self._embeddings
+    
+    @property
+    def semantic_enabled(self) -> bool:
+        """Whether near-duplicate questions are matched by embedding similarity."""
+        return self.similarity_threshold > 0
+    
+    def lookup(self, scope: ResponseCacheScope, query: str, query_vector: Optional[List[float]] = None) -> ResponseCacheLookup:
+        """
+        Find a cached response for a question.
+        
+        Args:
+            scope (ResponseCacheScope): Configuration the response must be valid for
+            query (str): The question
+            query_vector (List[float], optional): Precomputed embedding of the question
+        
+        Returns:
+            ResponseCacheLookup: The response and how it was matched
+        """
+        response = self._get_exact(scope, query)
+        if response is not None:
+            return ResponseCacheLookup(response, "exact", query_vector)
+        
+        if self.semantic_enabled and query_vector is None:
+            query_vector = self.embeddings.embed_query(query)
+        return self._get_similar(scope, query, query_vector)
+    
+    async def alookup(self, scope: ResponseCacheScope, query: str, query_vector: Optional[List[float]] = None) -> ResponseCacheLookup:
+        """
+        Find a cached response for a question, embedding it without blocking the event loop.
+        
+        Args:
+            scope (ResponseCacheScope): Configuration the response must be valid for
+            query (str): The question
+            query_vector (List[float], optional): Precomputed embedding of the question
+        
+        Returns:
+            ResponseCacheLookup: The response and how it was matched
+        """
+        response = self._get_exact(scope, query)
+        if response is not None:
+            return ResponseCacheLookup(response, "exact", query_vector)
+        
+        if self.semantic_enabled and query_vector is None:
+            query_vector = await self.embeddings.aembed_query(query)
+        return self._get_similar(scope, query, query_vector)
+    
+    def store(self, scope: ResponseCacheScope, query: str, response: str, query_vector: Optional[List[float]] = None) -> None:
+        """
+        Cache the response to a question.
+        
+        Args:
+            scope (ResponseCacheScope): Configuration the response was generated with
+            query (str): The question
+            response (str): The response
+            query_vector (List[float], optional): Embedding of the question, required for the semantic match
+        """
+        normalized = normalize_query(query)
+        if not normalized or not response:
+            return
+        
+        entry = CachedResponse(query, response, time.monotonic())
+        size = len(query.encode("utf-8")) + len(response.encode("utf-8")) + ENTRY_OVERHEAD_BYTES
+        with self._lock:
+            self._entries.set((scope, normalized), entry, size)
+            if self.semantic_enabled and query_vector is not None and (scope, normalized) in self._entries:
+                index = self._indexes.get(scope)
+                if index is None:
+                    index = self._indexes[scope] = _ScopeIndex(len(query_vector))
+                index.add(normalized, query_vector)
+            self.metrics["stores"] += 1
+    
+    def clear(self) -> None:
+        """Remove every cached response."""
+        with self._lock:
+            self._entries.clear()
+            self._indexes.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the cache counters, hit rate and current usage.
+        
+        Returns:
+            Dict[str, Any]: Hit, miss and store counters, hit rate, entry count and size in bytes
+        """
+        with self._lock:
+            entry_stats = self._entries.stats()
+            lookups = self.metrics["exact_hits"] + self.metrics["semantic_hits"] + self.metrics["misses"]
+            hits = self.metrics["exact_hits"] + self.metrics["semantic_hits"]
+            return {
+                **self.metrics,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": entry_stats["entries"],
+                "bytes": entry_stats["bytes"],
+                "evictions": entry_stats["evictions"],
+                "expirations": entry_stats["expirations"],
+            }
+    
+    def _get_exact(self, scope: ResponseCacheScope, query: str) -> Optional[str]:
+        """Get the response cached for the normalized question, counting an exact hit."""
+        with self._lock:
+            entry = self._get_entry((scope, normalize_query(query)))
+            if entry is None:
+                return None
+            self.metrics["exact_hits"] += 1
+            return entry.response
+    
+    def _get_similar(self, scope: ResponseCacheScope, query: str, query_vector: Optional[List[float]]) -> ResponseCacheLookup:
+        """Get the response of the most similar cached question above the threshold, counting a semantic hit or a miss."""
+        with self._lock:
+            index = self._indexes.get(scope)
+            match = index.best_match(query_vector) if index is not None and query_vector is not None else None
+            if match is not None and match[1] >= self.similarity_threshold:
+                entry = self._get_entry((scope, match[0]))
+                if entry is not None and query_numbers(entry.query) == query_numbers(query):
+                    self.metrics["semantic_hits"] += 1
+                    return ResponseCacheLookup(entry.response, "semantic", query_vector)
+            
+            self.metrics["misses"] += 1
+            return ResponseCacheLookup(None, "miss", query_vector)
+    
+    def _get_entry(self, key: Tuple[ResponseCacheScope, str]) -> Optional[CachedResponse]:
+        """Get an entry, dropping it if it is older than the TTL. Lock must be held."""
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl_seconds and time.monotonic() - entry.created_at > self.ttl_seconds:
+            self._entries.invalidate(key)
+            return None
+        return entry
+    
+    def _on_evict(self, key: Tuple[ResponseCacheScope, str], entry: CachedResponse) -> None:
+        """Keep the semantic indexes in sync with the entries. Lock must be held."""
+        scope, normalized = key
+        index = self._indexes.get(scope)
+        if index is not None:
+            index.remove(normalized)
+            if not len(index):
+                del self._indexes[scope]
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Get the shared response cache.
+    
+    Returns:
+        Optional[ResponseCache]: The cache, or None if RESPONSE_CACHE_ENABLED is off
+    """
+    global _response_cache
+    
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache()
+    
+    return _response_cache
+
+def lookup_response(scope: ResponseCacheScope, query: str, query_vector: Optional[List[float]] = None) -> ResponseCacheLookup:
+    """
+    Find a cached response for a question in the shared cache.
+    
+    Args:
+        scope (ResponseCacheScope): Configuration the response must be valid for
+        query (str): The question
+        query_vector (List[float], optional): Precomputed embedding of the question
+    
+    Returns:
+        ResponseCacheLookup: The response and how it was matched; always a miss if the cache is disabled
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return ResponseCacheLookup(None, "miss", query_vector)
+    return cache.lookup(scope, query, query_vector)
+
+async def alookup_response(scope: ResponseCacheScope, query: str, query_vector: Optional[List[float]] = None) -> ResponseCacheLookup:
+    """
+    Find a cached response for a question in the shared cache asynchronously.
+    
+    Args:
+        scope (ResponseCacheScope): Configuration the response must be valid for
+        query (str): The question
+        query_vector (List[float], optional): Precomputed embedding of the question
+    
+    Returns:
+        ResponseCacheLookup: The response and how it was matched; always a miss if the cache is disabled
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return ResponseCacheLookup(None, "miss", query_vector)
+    return await cache.alookup(scope, query, query_vector)
+
+def store_response(scope: ResponseCacheScope, query: str, response: str, query_vector: Optional[List[float]] = None) -> None:
+    """
+    Cache the response to a question in the shared cache.
+    
+    Args:
+        scope (ResponseCacheScope): Configuration the response was generated with
+        query (str): The question
+        response (str): The response
+        query_vector (List[float], optional): Embedding of the question, required for the semantic match
+    """
+    cache = get_response_cache()
+    if cache is not None:
+        cache.store(scope, query, response, query_vector)
+
+def get_response_cache_stats() -> Dict[str, Any]:
+    """
+    Get the shared response cache metrics.
+    
+    Returns:
+        Dict[str, Any]: Hit, miss and store counters, hit rate and usage, or an empty dict if the cache is disabled
+    """
+    cache = get_response_cache()
+    return cache.stats() if cache is not None else {}
+
+register_stats_source("response", get_response_cache_stats)
@@ -0,0 +1,285 @@
+"""
+In-process vector index of the messages of recently active sessions.
+
+Retrieval is always scoped to one session, and a session holds only a few
+hundred messages, so a cosine top-k over that session's embedding matrix is
+cheaper than a Qdrant round-trip. Sessions are loaded from Qdrant on first
+access and kept in sync by appending the points written through the store.
+"""
+
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from app.utils.cache import LRUTTLCache
+from app.config.config import (
+    SESSION_VECTOR_CACHE_MAX_SESSIONS,
+    SESSION_VECTOR_CACHE_MAX_BYTES,
+    SESSION_VECTOR_CACHE_TTL_SECONDS,
+    SESSION_VECTOR_CACHE_MAX_POINTS
+)
+
+# Approximate per-point bookkeeping size (ids, payload dicts) added to the content length
+POINT_OVERHEAD_BYTES = 200
+
+# A point as stored in the index: (point ID, vector, payload)
+CachedPoint = Tuple[str, List[float], Dict[str, Any]]
+
+class SessionVectorIndex:
+    """
+    Normalized embedding matrix of one session's messages, with their payloads.
+    
+    Rows are stored in a pre-allocated array that doubles when full, so appending
+    a message does not copy the matrix on every write.
+    """
+    
+    def __init__(self, dimension: int, type_key: Tuple[str, str], capacity: int = 16):
+        """
+        Initialize an empty index.
+        
+        Args:
+            dimension (int): Size of the embedding vectors
+            type_key (Tuple[str, str]): Payload path (metadata key, field) of the message type
+            capacity (int): Number of rows allocated up front
+        """
+        self.dimension = dimension
+        self.type_key = type_key
+        self._vectors = np.zeros((max(1, capacity), dimension), dtype=np.float32)
+        self._ids: List[str] = []
+        self._id_set: Set[str] = set()
+        self._payloads: List[Dict[str, Any]] = []
+        self._types: List[str] = []
+        self._payload_bytes = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used by the index in bytes."""
+        return self._vectors.nbytes + self._payload_bytes
+    
+    def __len__(self) -> int:
+        return len(self._ids)
+    
+    def add(self, points: Iterable[CachedPoint]) -> int:
+        """
+        Append points to the index, skipping those already present.
+        
+        Args:
+            points (Iterable[CachedPoint]): The (point ID, vector, payload) triples to add
+        
+        Returns:
+            int: Change of the index size in bytes
+        """
+        with self._lock:
+            size_before = self.nbytes
+            for point_id, vector, payload in points:
+                point_id = str(point_id)
+                if point_id in self._id_set:
+                    continue
+                
+                row = np.asarray(vector, dtype=np.float32)
+                norm = np.linalg.norm(row)
+                if norm > 0:
+                    row = row / norm
+                
+                count = len(self._ids)
+                if count == self._vectors.shape[0]:
+                    grown = np.zeros((count * 2, self.dimension), dtype=np.float32)
+                    grown[:count] = self._vectors
+                    self._vectors = grown
+                self._vectors[count] = row
+                
+                metadata_key, type_field = self.type_key
+                self._ids.append(point_id)
+                self._id_set.add(point_id)
+                self._payloads.append(payload)
+                self._types.append((payload.get(metadata_key) or {}).get(type_field, ""))
+                self._payload_bytes += len(str(payload)) + POINT_OVERHEAD_BYTES
+            return self.nbytes - size_before
+    
+    def search(self, query_vector: List[float], k: int, filter_type: Optional[str] = None) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """
+        Find the k most similar points by cosine similarity.
+        
+        Args:
+            query_vector (List[float]): Embedding of the query
+            k (int): Number of results to return
+            filter_type (str, optional): If provided, only consider messages of this type
+        
+        Returns:
+            List[Tuple[str, float, Dict[str, Any]]]: (point ID, score, payload), best first
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        
+        with self._lock:
+            count = len(self._ids)
+            if count == 0 or k <= 0:
+                return []
+            
+            scores = self._vectors[:count] @ query
+            if filter_type:
+                mask = np.fromiter((t == filter_type for t in self._types), dtype=bool, count=count)
+                scores = np.where(mask, scores, -np.inf)
+            
+            # Partial sort: only the top k rows are ordered
+            top = min(k, count)
+            candidates = np.argpartition(-scores, top - 1)[:top]
+            candidates = candidates[np.argsort(-scores[candidates])]
+            
+            return [
+                (self._ids[row], float(scores[row]), self._payloads[row])
+                for row in candidates
+                if np.isfinite(scores[row])
+            ]
+
+class SessionVectorCache:
+    """
+    LRU cache of per-session vector indexes.
+    
+    Appends that arrive while a session is being loaded are kept aside and merged
+    when the load completes, so a point written during the load is not lost.
+    """
+    
+    def __init__(self, dimension: int, type_key: Tuple[str, str],
+                 max_sessions: int = SESSION_VECTOR_CACHE_MAX_SESSIONS,
+                 max_bytes: int = SESSION_VECTOR_CACHE_MAX_BYTES,
+                 ttl_seconds: float = SESSION_VECTOR_CACHE_TTL_SECONDS,
+                 max_points: int = SESSION_VECTOR_CACHE_MAX_POINTS):
+        """
+        Initialize the cache.
+        
+        Args:
+            dimension (int): Size of the embedding vectors
+            type_key (Tuple[str, str]): Payload path (metadata key, field) of the message type
+            max_sessions (int): Maximum number of cached sessions
+            max_bytes (int): Maximum total size of the cached indexes
+            ttl_seconds (float): Idle time after which a session is dropped
+            max_points (int): Sessions with more points are not cached
+        """
+        self.dimension = dimension
+        self.type_key = type_key
+        self.max_points = max_points
+        self._indexes: LRUTTLCache[SessionVectorIndex] = LRUTTLCache(
+            max_entries=max_sessions,
+            max_bytes=max_bytes,
+            ttl_seconds=ttl_seconds
+        )
+        # Sessions known to be too large to cache, so they are not scrolled on every query
+        self._oversized: LRUTTLCache[bool] = LRUTTLCache(max_entries=max_sessions, ttl_seconds=ttl_seconds)
+        self._pending: Dict[str, List[CachedPoint]] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, session_id: str) -> Optional[SessionVectorIndex]:
+        """
+        Get the index of a session.
+        
+        Args:
+            session_id (str): The session ID
+        
+        Returns:
+            Optional[SessionVectorIndex]: The index, or None if the session is not cached
+        """
+        return self._indexes.get(session_id)
+    
+    def is_oversized(self, session_id: str) -> bool:
+        """Whether the session was found too large to cache."""
+        return self._oversized.peek(session_id) is not None
+    
+    def begin_load(self, session_id: str) -> None:
+        """
+        Start collecting the appends of a session that is about to be loaded.
+        
+        Args:
+            session_id (str): The session ID
+        """
+        with self._lock:
+            self._pending.setdefault(session_id, [])
+    
+    def abort_load(self, session_id: str) -> None:
+        """
+        Drop the appends collected for a load that failed.
+        
+        Args:
+            session_id (str): The session ID
+        """
+        with self._lock:
+            self._pending.pop(session_id, None)
+    
+    def finish_load(self, session_id: str, points: List[CachedPoint]) -> Optional[SessionVectorIndex]:
+        """
+        Build and cache the index of a session from the points read from Qdrant.
+        
+        Args:
+            session_id (str): The session ID
+            points (List[CachedPoint]): Every point of the session
+        
+        Returns:
+            Optional[SessionVectorIndex]: The index, or None if the session has more than max_points points
+        """
+        with self._lock:
+            # Without a pending entry, a concurrent load finished first or the session was invalidated
+            # while loading, in which case the points read may already be deleted
+            if session_id not in self._pending:
+                return self._indexes.peek(session_id)
+            pending = self._pending.pop(session_id)
+            
+            # A concurrent load finished first and has been kept up to date since
+            existing = self._indexes.peek(session_id)
+            if existing is not None:
+                return existing
+            
+            if len(points) > self.max_points:
+                self._oversized.set(session_id, True)
+                return None
+            
+            index = SessionVectorIndex(self.dimension, self.type_key, capacity=len(points) + len(pending) + 16)
+            index.add(points)
+            index.add(pending)
+            self._indexes.set(session_id, index, index.nbytes)
+            return index
+    
+    def append(self, session_id: str, points: List[CachedPoint]) -> None:
+        """
+        Add newly written points to the session's index if it is cached or loading.
+        
+        Args:
+            session_id (str): The session ID
+            points (List[CachedPoint]): The written points
+        """
+        with self._lock:
+            if session_id in self._pending:
+                self._pending[session_id].extend(points)
+            
+            index = self._indexes.peek(session_id)
+            if index is None:
+                return
+            
+            if len(index) + len(points) > self.max_points:
+                self._indexes.invalidate(session_id)
+                self._oversized.set(session_id, True)
+                return
+            
+            self._indexes.resize(session_id, index.add(points))
+    
+    def invalidate(self, session_id: str) -> None:
+        """
+        Drop the cached index of a session and abandon any load in progress.
+        
+        Args:
+            session_id (str): The session ID
+        """
+        with self._lock:
+            self._pending.pop(session_id, None)
+            self._indexes.invalidate(session_id)
+            self._oversized.invalidate(session_id)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the cache counters and current usage.
+        
+        Returns:
+            Dict[str, Any]: Counters of the index cache plus the number of oversized sessions
+        """
+        return {**self._indexes.stats(), "oversized_sessions": len(self._oversized)}
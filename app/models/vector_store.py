@@ -3,15 +3,109 @@ Vector store for message retrieval using Qdrant.
 """
 
 import os
-from typing import List, Dict, Any, Optional
+import uuid
+import time
+import asyncio
+import logging
+import contextvars
+import threading
+from typing import List, Dict, Any, Optional, Iterable, NamedTuple, Sequence
 from langchain_qdrant import QdrantVectorStore
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
-from qdrant_client import QdrantClient
+from qdrant_client import QdrantClient, AsyncQdrantClient
 from qdrant_client.http import models
 from app.models.embedding import get_embeddings
-from app.config.config import QDRANT_URL, QDRANT_API_KEY, QDRANT_COLLECTION_NAME
+from app.core.metrics import stage_timer, register_stats_source
+from app.models.session_vector_cache import SessionVectorCache, SessionVectorIndex, CachedPoint
+from app.config.config import (
+    QDRANT_URL,
+    QDRANT_API_KEY,
+    QDRANT_COLLECTION_NAME,
+    QDRANT_TENANT_INDEX,
+    QDRANT_ON_DISK_PAYLOAD,
+    QDRANT_HNSW_M,
+    QDRANT_HNSW_EF_CONSTRUCT,
+    QDRANT_HNSW_PAYLOAD_M,
+    QDRANT_HNSW_ON_DISK,
+    QDRANT_QUANTIZATION,
+    QDRANT_QUANTIZATION_ALWAYS_RAM,
+    QDRANT_SCALAR_QUANTILE,
+    QDRANT_SEARCH_RESCORE,
+    QDRANT_SEARCH_OVERSAMPLING,
+    VECTOR_WRITE_BATCH_SIZE,
+    VECTOR_WRITE_FLUSH_INTERVAL_MS,
+    VECTOR_WRITE_MAX_BUFFER,
+    SESSION_VECTOR_CACHE_ENABLED
+)
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Process-wide registry of vector stores keyed by namespace
+_vector_store_registry: Dict[str, "MessageVectorStore"] = {}
+_vector_store_registry_lock = threading.Lock()
+
+# Payload keys used by QdrantVectorStore for documents
+CONTENT_PAYLOAD_KEY = "page_content"
+METADATA_PAYLOAD_KEY = "metadata"
+
+# Payload fields used in search filters, indexed when the collection is set up
+SESSION_ID_FIELD = f"{METADATA_PAYLOAD_KEY}.session_id"
+TYPE_FIELD = f"{METADATA_PAYLOAD_KEY}.type"
+TIMESTAMP_FIELD = f"{METADATA_PAYLOAD_KEY}.timestamp"
+
+def get_quantization_config(mode: str = QDRANT_QUANTIZATION) -> Optional[models.QuantizationConfig]:
+    """
+    Build the Qdrant quantization config for a quantization mode.
+    
+    Args:
+        mode (str): "none", "scalar" (int8) or "binary"
+    
+    Returns:
+        Optional[models.QuantizationConfig]: The quantization config, or None for full float32 vectors
+    
+    Raises:
+        ValueError: If the mode is unknown
+    """
+    if mode in ("", "none"):
+        return None
+    if mode == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=QDRANT_SCALAR_QUANTILE,
+                always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM
+            )
+        )
+    if mode == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM)
+        )
+    raise ValueError(f"Unsupported QDRANT_QUANTIZATION: {mode}. Use 'none', 'scalar' or 'binary'.")
+
+def get_search_params(mode: str = QDRANT_QUANTIZATION) -> Optional[models.SearchParams]:
+    """
+    Build the search params matching a quantization mode.
+    
+    Quantized searches oversample candidates and re-score them with the original
+    vectors, which keeps recall close to an unquantized search.
+    
+    Args:
+        mode (str): "none", "scalar" (int8) or "binary"
+    
+    Returns:
+        Optional[models.SearchParams]: The search params, or None for unquantized collections
+    """
+    if mode in ("", "none"):
+        return None
+    return models.SearchParams(
+        quantization=models.QuantizationSearchParams(
+            rescore=QDRANT_SEARCH_RESCORE,
+            oversampling=QDRANT_SEARCH_OVERSAMPLING
+        )
+    )
 
 def message_to_document(message: BaseMessage, metadata: Optional[Dict[str, Any]] = None) -> Document:
     """
@@ -63,9 +157,40 @@ def document_to_message(doc: Document) -> BaseMessage:
         # Default to human message if type is unknown
         return HumanMessage(content=content)
 
+def point_to_document(point: models.ScoredPoint) -> Document:
+    """
+    Convert a Qdrant point back to a document.
+    
+    Args:
+        point (models.ScoredPoint): The point returned by a Qdrant query
+    
+    Returns:
+        Document: The document stored in the point payload
+    """
+    payload = point.payload or {}
+    return Document(
+        page_content=payload.get(CONTENT_PAYLOAD_KEY, ""),
+        metadata=payload.get(METADATA_PAYLOAD_KEY) or {}
+    )
+
+class PendingVectorWrite(NamedTuple):
+    """A message waiting in the write buffer of a MessageVectorStore."""
+    
+    message: BaseMessage
+    session_id: str
+    metadata: Optional[Dict[str, Any]]
+    vector: Optional[List[float]]
+
 class MessageVectorStore:
     """
     Vector store for chat messages using Qdrant.
+    
+    Writes can go through a buffer that accumulates messages across requests and
+    upserts them in batches, flushed when the batch is full or on a timer.
+    
+    Searches scoped to a session are answered from an in-process copy of that
+    session's vectors once it has been loaded; Qdrant is queried for unscoped
+    searches and for sessions too large to cache.
     """
     
     def __init__(self, embeddings: Optional[Embeddings] = None, namespace: str = "chat_messages"):
@@ -79,71 +204,615 @@ class MessageVectorStore:
         self.embeddings = embeddings or get_embeddings()
         self.namespace = namespace
         self.collection_name = f"{QDRANT_COLLECTION_NAME}_{namespace}"
+        self.quantization_config = get_quantization_config()
+        self.search_params = get_search_params()
+        
+        # Get embedding dimension from model
+        if hasattr(self.embeddings, "dimension"):
+            self.dimension = self.embeddings.dimension
+        else:
+            self.dimension = len(self.embeddings.embed_query("Sample text"))
         
         # Initialize Qdrant
         self._init_qdrant()
         
-        # Get embedding dimension from model
-        sample_embedding = self.embeddings.embed_query("Sample text")
-        self.dimension = len(sample_embedding)
+        # Local per-session index in front of Qdrant
+        self.session_cache = (
+            SessionVectorCache(self.dimension, type_key=(METADATA_PAYLOAD_KEY, "type"))
+            if SESSION_VECTOR_CACHE_ENABLED else None
+        )
         
         # Create the vector store
         self.vector_store = QdrantVectorStore(
             client=self.client,
             collection_name=self.collection_name,
             embedding=self.embeddings,
+            content_payload_key=CONTENT_PAYLOAD_KEY,
+            metadata_payload_key=METADATA_PAYLOAD_KEY,
         )
+        
+        # Buffered writer state
+        self._buffer: List[PendingVectorWrite] = []
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = False
+        self.write_metrics = {
+            "buffered": 0,
+            "dropped": 0,
+            "flushes": 0,
+            "flushed_points": 0,
+            "flush_errors": 0,
+            "last_flush_size": 0,
+            "last_flush_ms": 0.0,
+        }
     
     def _init_qdrant(self):
         """Initialize Qdrant client and create collection if it doesn't exist."""
-        # Initialize Qdrant client
+        # Initialize Qdrant clients (the async one serves the async chat pipeline)
         self.client = QdrantClient(
             url=QDRANT_URL,
             api_key=QDRANT_API_KEY if QDRANT_API_KEY else None
         )
+        self.async_client = AsyncQdrantClient(
+            url=QDRANT_URL,
+            api_key=QDRANT_API_KEY if QDRANT_API_KEY else None
+        )
         
         # Check if collection exists, if not create it
-        collections = self.client.get_collections().collections
-        collection_names = [collection.name for collection in collections]
+        if not self.client.collection_exists(self.collection_name):
+            self._create_collection()
+        
+        collection_info = self.client.get_collection(self.collection_name)
+        self._validate_collection(collection_info)
+        self._ensure_payload_indexes(collection_info)
+        self._check_quantization(collection_info)
+    
+    def _create_collection(self):
+        """Create the collection sized for the embedding model, with the configured storage, HNSW and quantization settings."""
+        self.client.create_collection(
+            collection_name=self.collection_name,
+            vectors_config=models.VectorParams(
+                size=self.dimension,
+                distance=models.Distance.COSINE
+            ),
+            on_disk_payload=QDRANT_ON_DISK_PAYLOAD,
+            hnsw_config=models.HnswConfigDiff(
+                m=QDRANT_HNSW_M,
+                ef_construct=QDRANT_HNSW_EF_CONSTRUCT,
+                payload_m=QDRANT_HNSW_PAYLOAD_M,
+                on_disk=QDRANT_HNSW_ON_DISK
+            ),
+            quantization_config=self.quantization_config
+        )
+        logger.info(f"Created Qdrant collection {self.collection_name} with vector size {self.dimension}")
+    
+    def _validate_collection(self, collection_info: models.CollectionInfo):
+        """
+        Check that the collection vectors match the embedding model.
+        
+        Args:
+            collection_info (models.CollectionInfo): The collection description
+        
+        Raises:
+            ValueError: If the collection vector size differs from the model dimension
+        """
+        vectors_config = collection_info.config.params.vectors
+        size = vectors_config.size if isinstance(vectors_config, models.VectorParams) else None
+        if size is not None and size != self.dimension:
+            raise ValueError(
+                f"Qdrant collection {self.collection_name} stores vectors of size {size}, "
+                f"but the embedding model produces vectors of size {self.dimension}. "
+                f"Use a different QDRANT_COLLECTION_NAME or re-create the collection."
+            )
+    
+    def _check_quantization(self, collection_info: models.CollectionInfo):
+        """
+        Warn when an existing collection is not quantized as configured.
+        
+        Changing the quantization of a collection rebuilds its index, so it is not
+        done at startup; run app.scripts.migrate_vector_quantization instead.
+        
+        Args:
+            collection_info (models.CollectionInfo): The collection description
+        """
+        current = collection_info.config.quantization_config
+        if type(current) is not type(self.quantization_config):
+            logger.warning(
+                f"Qdrant collection {self.collection_name} quantization is {type(current).__name__}, "
+                f"but QDRANT_QUANTIZATION is '{QDRANT_QUANTIZATION}'. "
+                f"Run python -m app.scripts.migrate_vector_quantization to apply it."
+            )
+    
+    def apply_quantization(self, mode: str = QDRANT_QUANTIZATION) -> None:
+        """
+        Change the quantization of the existing collection in place.
+        
+        Qdrant keeps the original vectors and rebuilds the quantized ones in the
+        background, so the collection stays searchable during the migration.
+        
+        Args:
+            mode (str): "none", "scalar" (int8) or "binary"
+        """
+        quantization_config = get_quantization_config(mode)
+        self.client.update_collection(
+            collection_name=self.collection_name,
+            quantization_config=quantization_config if quantization_config is not None else models.Disabled.DISABLED
+        )
+        self.quantization_config = quantization_config
+        self.search_params = get_search_params(mode)
+        logger.info(f"Set quantization of Qdrant collection {self.collection_name} to '{mode}'")
+    
+    def _ensure_payload_indexes(self, collection_info: models.CollectionInfo):
+        """
+        Create the payload indexes used by search filters, if missing.
+        
+        session_id and type are keyword indexes; session_id is also the tenant key
+        when QDRANT_TENANT_INDEX is set. timestamp is an integer index.
         
-        if self.collection_name not in collection_names:
-            # Create a new collection
-            self.client.create_collection(
+        Args:
+            collection_info (models.CollectionInfo): The collection description
+        """
+        existing = set((collection_info.payload_schema or {}).keys())
+        indexes = {
+            SESSION_ID_FIELD: models.KeywordIndexParams(
+                type=models.KeywordIndexType.KEYWORD,
+                is_tenant=QDRANT_TENANT_INDEX
+            ),
+            TYPE_FIELD: models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD),
+            TIMESTAMP_FIELD: models.IntegerIndexParams(
+                type=models.IntegerIndexType.INTEGER,
+                lookup=False,
+                range=True
+            ),
+        }
+        
+        for field_name, field_schema in indexes.items():
+            if field_name in existing:
+                continue
+            self.client.create_payload_index(
                 collection_name=self.collection_name,
-                vectors_config=models.VectorParams(
-                    size=384,  # default dimension for all-MiniLM-L6-v2
-                    distance=models.Distance.COSINE
-                )
+                field_name=field_name,
+                field_schema=field_schema,
+                wait=True
             )
+            logger.info(f"Created payload index on {field_name} in {self.collection_name}")
     
-    def add_message(self, message: BaseMessage, session_id: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+    def embed_text(self, text: str) -> List[float]:
         """
-        Add a message to the vector store.
+        Embed a text with the store's embedding model.
+        
+        The result can be passed to search_similar_messages and add_message so a
+        turn embeds the user input only once.
+        
+        Args:
+            text (str): The text to embed
+        
+        Returns:
+            List[float]: The embedding vector
+        """
+        with stage_timer("query_embedding"):
+            return self.embeddings.embed_query(text)
+    
+    async def aembed_text(self, text: str) -> List[float]:
+        """
+        Embed a text without blocking the event loop.
+        
+        The CPU-bound encoding runs in the default executor, in a copy of the
+        current context so its span stays in the trace of the request.
+        
+        Args:
+            text (str): The text to embed
+        
+        Returns:
+            List[float]: The embedding vector
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, contextvars.copy_context().run, self.embed_text, text)
+    
+    def _message_to_point(self, message: BaseMessage, session_id: str, metadata: Optional[Dict[str, Any]],
+                          vector: List[float]) -> models.PointStruct:
+        """
+        Build the Qdrant point for a message using the QdrantVectorStore payload layout.
         
         Args:
             message (BaseMessage): The message to add
             session_id (str): The session ID
             metadata (Dict[str, Any], optional): Additional metadata
+            vector (List[float]): Embedding of the message content
         
         Returns:
-            str: The document ID
+            models.PointStruct: The point to upsert
         """
         # Create metadata dict
         meta = metadata or {}
         meta["session_id"] = session_id
         
-        
         # Convert message to document
         doc = message_to_document(message, meta)
         
-        # Add to vector store
-        ids = self.vector_store.add_documents([doc])
+        return models.PointStruct(
+            id=str(uuid.uuid4()),
+            vector=vector,
+            payload={
+                CONTENT_PAYLOAD_KEY: doc.page_content,
+                METADATA_PAYLOAD_KEY: doc.metadata,
+            }
+        )
+    
+    def add_message(self, message: BaseMessage, session_id: str, metadata: Optional[Dict[str, Any]] = None,
+                    vector: Optional[List[float]] = None) -> str:
+        """
+        Add a message to the vector store.
+        
+        Args:
+            message (BaseMessage): The message to add
+            session_id (str): The session ID
+            metadata (Dict[str, Any], optional): Additional metadata
+            vector (List[float], optional): Precomputed embedding of the message content
+        
+        Returns:
+            str: The document ID
+        """
+        # Embed only if the caller did not already do it
+        if vector is None:
+            vector = self.embed_text(message.content)
+        
+        point = self._message_to_point(message, session_id, metadata, vector)
+        self.client.upsert(collection_name=self.collection_name, points=[point])
+        self._cache_points([point])
+        
+        return point.id
+    
+    async def aadd_message(self, message: BaseMessage, session_id: str, metadata: Optional[Dict[str, Any]] = None,
+                           vector: Optional[List[float]] = None) -> str:
+        """
+        Add a message to the vector store asynchronously.
+        
+        Args:
+            message (BaseMessage): The message to add
+            session_id (str): The session ID
+            metadata (Dict[str, Any], optional): Additional metadata
+            vector (List[float], optional): Precomputed embedding of the message content
+        
+        Returns:
+            str: The document ID
+        """
+        # Embed only if the caller did not already do it
+        if vector is None:
+            vector = await self.aembed_text(message.content)
+        
+        point = self._message_to_point(message, session_id, metadata, vector)
+        await self.async_client.upsert(collection_name=self.collection_name, points=[point])
+        self._cache_points([point])
+        
+        return point.id
+    
+    def add_messages(self, writes: Sequence[PendingVectorWrite]) -> List[str]:
+        """
+        Add several messages with one batched embedding call and one upsert.
         
-        return ids[0] if ids else ""
+        Args:
+            writes (Sequence[PendingVectorWrite]): The messages to add, with optional precomputed vectors
+        
+        Returns:
+            List[str]: The document IDs, in the order of writes
+        """
+        if not writes:
+            return []
+        
+        # Embed the messages without a precomputed vector in a single batch
+        vectors = [write.vector for write in writes]
+        missing = [index for index, vector in enumerate(vectors) if vector is None]
+        if missing:
+            embedded = self.embeddings.embed_documents([writes[index].message.content for index in missing])
+            for index, vector in zip(missing, embedded):
+                vectors[index] = vector
+        
+        points = [
+            self._message_to_point(write.message, write.session_id, write.metadata, vector)
+            for write, vector in zip(writes, vectors)
+        ]
+        self.client.upsert(collection_name=self.collection_name, points=points)
+        self._cache_points(points)
+        
+        return [point.id for point in points]
+    
+    def buffer_message(self, message: BaseMessage, session_id: str, metadata: Optional[Dict[str, Any]] = None,
+                       vector: Optional[List[float]] = None) -> None:
+        """
+        Queue a message for the next batched upsert.
+        
+        This never blocks on Qdrant: the buffer is flushed by a background thread
+        when it reaches VECTOR_WRITE_BATCH_SIZE messages or every
+        VECTOR_WRITE_FLUSH_INTERVAL_MS milliseconds.
+        
+        Args:
+            message (BaseMessage): The message to add
+            session_id (str): The session ID
+            metadata (Dict[str, Any], optional): Additional metadata
+            vector (List[float], optional): Precomputed embedding of the message content
+        """
+        with self._buffer_lock:
+            if len(self._buffer) >= VECTOR_WRITE_MAX_BUFFER:
+                self.write_metrics["dropped"] += 1
+                logger.warning(f"Vector write buffer for {self.collection_name} is full, dropping message")
+                return
+            
+            self._buffer.append(PendingVectorWrite(message, session_id, metadata, vector))
+            self.write_metrics["buffered"] += 1
+            is_full = len(self._buffer) >= VECTOR_WRITE_BATCH_SIZE
+            self._ensure_flusher()
+        
+        # Wake the flusher early when a full batch is ready
+        if is_full:
+            self._flush_event.set()
+    
+    def flush(self) -> int:
+        """
+        Upsert every buffered message, in batches of VECTOR_WRITE_BATCH_SIZE.
+        
+        Messages of a failed batch are put back at the front of the buffer and
+        retried on the next flush.
+        
+        Returns:
+            int: Number of messages written
+        """
+        written = 0
+        
+        # Serialize flushes so buffered messages are written in order
+        with self._flush_lock:
+            while True:
+                with self._buffer_lock:
+                    batch = self._buffer[:VECTOR_WRITE_BATCH_SIZE]
+                    del self._buffer[:VECTOR_WRITE_BATCH_SIZE]
+                
+                if not batch:
+                    break
+                
+                started = time.perf_counter()
+                try:
+                    with stage_timer("vector_flush"):
+                        self.add_messages(batch)
+                except Exception as e:
+                    with self._buffer_lock:
+                        self._buffer[:0] = batch
+                        self.write_metrics["flush_errors"] += 1
+                    logger.warning(f"Error flushing {len(batch)} messages to {self.collection_name}: {str(e)}")
+                    break
+                
+                with self._buffer_lock:
+                    self.write_metrics["flushes"] += 1
+                    self.write_metrics["flushed_points"] += len(batch)
+                    self.write_metrics["last_flush_size"] = len(batch)
+                    self.write_metrics["last_flush_ms"] = (time.perf_counter() - started) * 1000
+                written += len(batch)
+        
+        return written
+    
+    def delete_session(self, session_id: str) -> None:
+        """
+        Delete every point of a session, including its buffered writes, and drop its local index.
+        
+        Args:
+            session_id (str): The session ID
+        """
+        # Hold the flush lock so no batch already taken from the buffer is written after the delete
+        with self._flush_lock:
+            with self._buffer_lock:
+                self._buffer = [write for write in self._buffer if write.session_id != session_id]
+            
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=models.FilterSelector(filter=self._build_filter(session_id=session_id))
+            )
+            self.invalidate_session(session_id)
+    
+    def invalidate_session(self, session_id: str) -> None:
+        """
+        Drop the local index of a session, so its next search reads Qdrant again.
+        
+        Args:
+            session_id (str): The session ID
+        """
+        if self.session_cache is not None:
+            self.session_cache.invalidate(session_id)
+    
+    def get_write_metrics(self) -> Dict[str, Any]:
+        """
+        Get the buffered writer metrics.
+        
+        Returns:
+            Dict[str, Any]: Counters of buffered, flushed, dropped and failed writes, plus the current buffer size
+        """
+        with self._buffer_lock:
+            return {**self.write_metrics, "pending": len(self._buffer)}
+    
+    def _ensure_flusher(self) -> None:
+        """Start the flusher thread on first use. Must be called with the buffer lock held."""
+        if self._flusher is None and not self._closed:
+            self._flusher = threading.Thread(
+                target=self._run_flusher,
+                name=f"vector-flusher-{self.namespace}",
+                daemon=True
+            )
+            self._flusher.start()
+    
+    def _run_flusher(self) -> None:
+        """Flusher loop writing the buffer when it is full or on a timer."""
+        interval = max(0.001, VECTOR_WRITE_FLUSH_INTERVAL_MS / 1000.0)
+        while not self._closed:
+            self._flush_event.wait(timeout=interval)
+            self._flush_event.clear()
+            self.flush()
+    
+    def _cache_points(self, points: Sequence[models.PointStruct]) -> None:
+        """
+        Append written points to the local indexes of their sessions.
+        
+        Args:
+            points (Sequence[models.PointStruct]): Points just upserted to Qdrant
+        """
+        if self.session_cache is None:
+            return
+        
+        by_session: Dict[str, List[CachedPoint]] = {}
+        for point in points:
+            session_id = point.payload[METADATA_PAYLOAD_KEY].get("session_id")
+            if session_id:
+                by_session.setdefault(session_id, []).append((point.id, point.vector, point.payload))
+        
+        for session_id, session_points in by_session.items():
+            self.session_cache.append(session_id, session_points)
+    
+    def _use_session_cache(self, session_id: Optional[str]) -> bool:
+        """Whether a search scoped to this session can be answered locally."""
+        return (
+            self.session_cache is not None
+            and bool(session_id)
+            and not self.session_cache.is_oversized(session_id)
+        )
+    
+    def _load_session_index(self, session_id: str, records: List[models.Record]) -> Optional[SessionVectorIndex]:
+        """Build the local index of a session from its scrolled points."""
+        points = [(record.id, record.vector, record.payload or {}) for record in records]
+        index = self.session_cache.finish_load(session_id, points)
+        logger.debug(f"Loaded {len(points)} points of session {session_id} from {self.collection_name}")
+        return index
+    
+    def _get_session_index(self, session_id: Optional[str]) -> Optional[SessionVectorIndex]:
+        """
+        Get the local index of a session, loading it from Qdrant on a cold miss.
+        
+        Args:
+            session_id (str, optional): The session ID
+        
+        Returns:
+            Optional[SessionVectorIndex]: The index, or None if the search must go to Qdrant
+        """
+        if not self._use_session_cache(session_id):
+            return None
+        
+        index = self.session_cache.get(session_id)
+        if index is not None:
+            return index
+        
+        self.session_cache.begin_load(session_id)
+        try:
+            with stage_timer("session_index_load"):
+                records, _ = self.client.scroll(
+                    collection_name=self.collection_name,
+                    scroll_filter=self._build_filter(session_id),
+                    limit=self.session_cache.max_points + 1,
+                    with_payload=True,
+                    with_vectors=True
+                )
+        except Exception as e:
+            self.session_cache.abort_load(session_id)
+            logger.warning(f"Error loading session {session_id} from {self.collection_name}: {str(e)}")
+            return None
+        
+        return self._load_session_index(session_id, records)
+    
+    async def _aget_session_index(self, session_id: Optional[str]) -> Optional[SessionVectorIndex]:
+        """
+        Get the local index of a session, loading it from Qdrant asynchronously on a cold miss.
+        
+        Args:
+            session_id (str, optional): The session ID
+        
+        Returns:
+            Optional[SessionVectorIndex]: The index, or None if the search must go to Qdrant
+        """
+        if not self._use_session_cache(session_id):
+            return None
+        
+        index = self.session_cache.get(session_id)
+        if index is not None:
+            return index
+        
+        self.session_cache.begin_load(session_id)
+        try:
+            with stage_timer("session_index_load"):
+                records, _ = await self.async_client.scroll(
+                    collection_name=self.collection_name,
+                    scroll_filter=self._build_filter(session_id),
+                    limit=self.session_cache.max_points + 1,
+                    with_payload=True,
+                    with_vectors=True
+                )
+        except Exception as e:
+            self.session_cache.abort_load(session_id)
+            logger.warning(f"Error loading session {session_id} from {self.collection_name}: {str(e)}")
+            return None
+        except BaseException:
+            # A cancelled search must not leave the session marked as loading
+            self.session_cache.abort_load(session_id)
+            raise
+        
+        return self._load_session_index(session_id, records)
+    
+    def _search_session_index(self, index: SessionVectorIndex, query_vector: List[float], k: int,
+                              filter_type: Optional[str] = None) -> List[models.ScoredPoint]:
+        """
+        Search a local session index, returning the results as Qdrant points.
+        
+        Args:
+            index (SessionVectorIndex): The session's local index
+            query_vector (List[float]): Embedding of the query
+            k (int): Number of results to return
+            filter_type (str, optional): If provided, filter by message type
+        
+        Returns:
+            List[models.ScoredPoint]: The most similar points, best first
+        """
+        with stage_timer("vector_search_local"):
+            return [
+                models.ScoredPoint(id=point_id, version=0, score=score, payload=payload)
+                for point_id, score, payload in index.search(query_vector, k, filter_type)
+            ]
+    
+    def get_session_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get the local session index cache metrics.
+        
+        Returns:
+            Dict[str, Any]: Hits, misses, evictions and current usage, or an empty dict if the cache is disabled
+        """
+        return self.session_cache.stats() if self.session_cache is not None else {}
+    
+    def _build_filter(self, session_id: Optional[str] = None, filter_type: Optional[str] = None) -> Optional[models.Filter]:
+        """
+        Build a Qdrant filter on session ID and message type.
+        
+        Args:
+            session_id (str, optional): If provided, filter by session ID
+            filter_type (str, optional): If provided, filter by message type
+        
+        Returns:
+            Optional[models.Filter]: The filter, or None if no condition applies
+        """
+        must_conditions = []
+        
+        if session_id:
+            must_conditions.append(models.FieldCondition(
+                key=SESSION_ID_FIELD,
+                match=models.MatchValue(value=session_id)
+            ))
+        
+        if filter_type:
+            must_conditions.append(models.FieldCondition(
+                key=TYPE_FIELD,
+                match=models.MatchValue(value=filter_type)
+            ))
+        
+        return models.Filter(must=must_conditions) if must_conditions else None
     
     def search_similar_messages(self, query: str, session_id: Optional[str] = None, 
                                k: int = 10, filter_type: Optional[str] = None,
-                               score_threshold: float = 0.6) -> List[BaseMessage]:
+                               score_threshold: float = 0.6,
+                               query_vector: Optional[List[float]] = None) -> List[BaseMessage]:
         """
         Search for messages similar to the query.
         
@@ -153,66 +822,325 @@ class MessageVectorStore:
             k (int): Number of results to return
             filter_type (str, optional): If provided, filter by message type (e.g., "human", "ai")
             score_threshold (float): Minimum similarity score (0.0 to 1.0) to include in results
+            query_vector (List[float], optional): Precomputed embedding of the query
             
         Returns:
             List[BaseMessage]: List of similar messages
         """
-        # Build filter if session_id is provided
-        filter_dict = None
+        query_filter = self._build_filter(session_id, filter_type)
+        
+        logger.debug(f"Vector search query: '{query}', filter: {query_filter}, score threshold: {score_threshold}")
         
-        if session_id or filter_type:
-            must_conditions = []
+        try:
+            # Embed only if the caller did not already do it
+            if query_vector is None:
+                query_vector = self.embed_text(query)
             
-            if session_id:
-                must_conditions.append({
-                    "key": "metadata.session_id",
-                    "match": {"value": session_id}
-                })
+            # Answer from the local session index when possible
+            index = self._get_session_index(session_id)
+            if index is not None:
+                return self._points_to_messages(self._search_session_index(index, query_vector, k, filter_type), score_threshold)
             
-            if filter_type:
-                must_conditions.append({
-                    "key": "metadata.type",
-                    "match": {"value": filter_type}
-                })
+            # Search for similar points with scores
+            with stage_timer("vector_search_qdrant"):
+                points = self.client.query_points(
+                    collection_name=self.collection_name,
+                    query=query_vector,
+                    query_filter=query_filter,
+                    search_params=self.search_params,
+                    limit=k,
+                    with_payload=True
+                ).points
             
-            filter_dict = {"must": must_conditions}
+            return self._points_to_messages(points, score_threshold)
+        except Exception as e:
+            logger.warning(f"Error in vector search: {str(e)}")
+            return []
+    
+    def search_similar_messages_by_type(self, query: str, session_id: Optional[str] = None,
+                                        k: int = 10, filter_types: Iterable[str] = ("human", "ai"),
+                                        score_threshold: float = 0.6,
+                                        query_vector: Optional[List[float]] = None) -> Dict[str, List[BaseMessage]]:
+        """
+        Search for the top-k similar messages of each message type in one round-trip.
+        
+        The per-type searches are sent to Qdrant as a single batch query and use the
+        same score threshold semantics as search_similar_messages.
+        
+        Args:
+            query (str): The query text
+            session_id (str, optional): If provided, filter by session ID
+            k (int): Number of results to return for each message type
+            filter_types (Iterable[str]): Message types to search (e.g., "human", "ai")
+            score_threshold (float): Minimum similarity score (0.0 to 1.0) to include in results
+            query_vector (List[float], optional): Precomputed embedding of the query
+            
+        Returns:
+            Dict[str, List[BaseMessage]]: Similar messages keyed by message type
+        """
+        filter_types = list(filter_types)
         
-        # Debug information
-        print(f"Vector search query: '{query}'")
-        print(f"Filter: {filter_dict}")
-        print(f"Score threshold: {score_threshold}")
+        logger.debug(f"Vector batch search query: '{query}', types: {filter_types}, session: {session_id}, score threshold: {score_threshold}")
         
         try:
-            # Search for similar documents with scores
-            docs_with_scores = self.vector_store.similarity_search_with_score(
-                query=query,
-                k=k,
-                filter=filter_dict
-            )
+            # Embed only if the caller did not already do it
+            if query_vector is None:
+                query_vector = self.embed_text(query)
+            
+            # Answer from the local session index when possible
+            index = self._get_session_index(session_id)
+            if index is not None:
+                return {
+                    filter_type: self._points_to_messages(
+                        self._search_session_index(index, query_vector, k, filter_type), score_threshold
+                    )
+                    for filter_type in filter_types
+                }
             
-            # Filter by similarity score (Qdrant uses cosine similarity where 1.0 is perfect match)
-            # Convert to percentage for easier understanding
-            filtered_docs = [(doc, score) for doc, score in docs_with_scores if score >= score_threshold]
+            # One request per message type, sent together
+            with stage_timer("vector_search_qdrant"):
+                responses = self.client.query_batch_points(
+                    collection_name=self.collection_name,
+                    requests=self._build_type_requests(query_vector, session_id, k, filter_types)
+                )
             
-            # Debug information
-            print(f"Found {len(filtered_docs)} documents with score >= {score_threshold}")
-            for doc, score in filtered_docs:
-                print(f"Score: {score:.2f} - Content: {doc.page_content[:50]}...")
+            return {
+                filter_type: self._points_to_messages(response.points, score_threshold)
+                for filter_type, response in zip(filter_types, responses)
+            }
+        except Exception as e:
+            logger.warning(f"Error in vector batch search: {str(e)}")
+            return {filter_type: [] for filter_type in filter_types}
+    
+    async def asearch_similar_messages(self, query: str, session_id: Optional[str] = None,
+                                       k: int = 10, filter_type: Optional[str] = None,
+                                       score_threshold: float = 0.6,
+                                       query_vector: Optional[List[float]] = None) -> List[BaseMessage]:
+        """
+        Search for messages similar to the query asynchronously.
+        
+        Args:
+            query (str): The query text
+            session_id (str, optional): If provided, filter by session ID
+            k (int): Number of results to return
+            filter_type (str, optional): If provided, filter by message type (e.g., "human", "ai")
+            score_threshold (float): Minimum similarity score (0.0 to 1.0) to include in results
+            query_vector (List[float], optional): Precomputed embedding of the query
+            
+        Returns:
+            List[BaseMessage]: List of similar messages
+        """
+        try:
+            # Embed only if the caller did not already do it
+            if query_vector is None:
+                query_vector = await self.aembed_text(query)
+            
+            # Answer from the local session index when possible
+            index = await self._aget_session_index(session_id)
+            if index is not None:
+                return self._points_to_messages(self._search_session_index(index, query_vector, k, filter_type), score_threshold)
+            
+            with stage_timer("vector_search_qdrant"):
+                response = await self.async_client.query_points(
+                    collection_name=self.collection_name,
+                    query=query_vector,
+                    query_filter=self._build_filter(session_id, filter_type),
+                    search_params=self.search_params,
+                    limit=k,
+                    with_payload=True
+                )
             
-            # Convert documents back to messages
-            return [document_to_message(doc) for doc, _ in filtered_docs]
+            return self._points_to_messages(response.points, score_threshold)
         except Exception as e:
-            print(f"Error in vector search: {str(e)}")
+            logger.warning(f"Error in vector search: {str(e)}")
             return []
     
+    async def asearch_similar_messages_by_type(self, query: str, session_id: Optional[str] = None,
+                                               k: int = 10, filter_types: Iterable[str] = ("human", "ai"),
+                                               score_threshold: float = 0.6,
+                                               query_vector: Optional[List[float]] = None) -> Dict[str, List[BaseMessage]]:
+        """
+        Search for the top-k similar messages of each message type in one round-trip, asynchronously.
+        
+        Args:
+            query (str): The query text
+            session_id (str, optional): If provided, filter by session ID
+            k (int): Number of results to return for each message type
+            filter_types (Iterable[str]): Message types to search (e.g., "human", "ai")
+            score_threshold (float): Minimum similarity score (0.0 to 1.0) to include in results
+            query_vector (List[float], optional): Precomputed embedding of the query
+            
+        Returns:
+            Dict[str, List[BaseMessage]]: Similar messages keyed by message type
+        """
+        filter_types = list(filter_types)
+        
+        try:
+            # Embed only if the caller did not already do it
+            if query_vector is None:
+                query_vector = await self.aembed_text(query)
+            
+            # Answer from the local session index when possible
+            index = await self._aget_session_index(session_id)
+            if index is not None:
+                return {
+                    filter_type: self._points_to_messages(
+                        self._search_session_index(index, query_vector, k, filter_type), score_threshold
+                    )
+                    for filter_type in filter_types
+                }
+            
+            with stage_timer("vector_search_qdrant"):
+                responses = await self.async_client.query_batch_points(
+                    collection_name=self.collection_name,
+                    requests=self._build_type_requests(query_vector, session_id, k, filter_types)
+                )
+            
+            return {
+                filter_type: self._points_to_messages(response.points, score_threshold)
+                for filter_type, response in zip(filter_types, responses)
+            }
+        except Exception as e:
+            logger.warning(f"Error in vector batch search: {str(e)}")
+            return {filter_type: [] for filter_type in filter_types}
+    
+    def _build_type_requests(self, query_vector: List[float], session_id: Optional[str], k: int,
+                             filter_types: List[str]) -> List[models.QueryRequest]:
+        """
+        Build one query request per message type for a batch search.
+        
+        Args:
+            query_vector (List[float]): Embedding of the query
+            session_id (str, optional): If provided, filter by session ID
+            k (int): Number of results to return for each message type
+            filter_types (List[str]): Message types to search
+        
+        Returns:
+            List[models.QueryRequest]: The batch requests, in the order of filter_types
+        """
+        return [
+            models.QueryRequest(
+                query=query_vector,
+                filter=self._build_filter(session_id, filter_type),
+                params=self.search_params,
+                limit=k,
+                with_payload=True
+            )
+            for filter_type in filter_types
+        ]
+    
+    def _points_to_messages(self, points: List[models.ScoredPoint], score_threshold: float) -> List[BaseMessage]:
+        """
+        Keep the points above the score threshold and convert them to messages.
+        
+        Args:
+            points (List[models.ScoredPoint]): Points returned by a Qdrant query
+            score_threshold (float): Minimum similarity score (0.0 to 1.0) to include in results
+        
+        Returns:
+            List[BaseMessage]: List of similar messages
+        """
+        # Filter by similarity score (Qdrant uses cosine similarity where 1.0 is perfect match)
+        filtered_points = [point for point in points if point.score >= score_threshold]
+        
+        docs = [point_to_document(point) for point in filtered_points]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Found {len(filtered_points)} documents with score >= {score_threshold}")
+            for doc, point in zip(docs, filtered_points):
+                logger.debug(f"Score: {point.score:.2f} - Content: {doc.page_content[:50]}...")
+        
+        # Convert documents back to messages
+        return [document_to_message(doc) for doc in docs]
+    
+    def close(self) -> None:
+        """Flush the write buffer and close the underlying Qdrant client."""
+        with self._buffer_lock:
+            self._closed = True
+            flusher = self._flusher
+        
+        # Stop the flusher, then write whatever is left
+        if flusher is not None:
+            self._flush_event.set()
+            flusher.join()
+        self.flush()
+        
+        try:
+            self.client.close()
+        except Exception as e:
+            logger.warning(f"Error closing Qdrant client for {self.collection_name}: {str(e)}")
+    
+    async def aclose(self) -> None:
+        """Close the underlying asynchronous Qdrant client."""
+        try:
+            await self.async_client.close()
+        except Exception as e:
+            logger.warning(f"Error closing async Qdrant client for {self.collection_name}: {str(e)}")
+
 def get_vector_store(collection_name: str = "chat_messages") -> MessageVectorStore:
     """
-    Get an instance of the message vector store.
+    Get the shared message vector store for a namespace.
+    
+    The store (embedding model, Qdrant client and collection check) is built once
+    per process and namespace, then reused by every request.
     
     Args:
         collection_name (str): Name of the collection/namespace in Qdrant
     
     Returns:
-        MessageVectorStore: An instance of the message vector store
+        MessageVectorStore: The shared message vector store
+    """
+    vector_store = _vector_store_registry.get(collection_name)
+    if vector_store is not None:
+        return vector_store
+    
+    with _vector_store_registry_lock:
+        # Another thread may have built it while we were waiting for the lock
+        vector_store = _vector_store_registry.get(collection_name)
+        if vector_store is None:
+            vector_store = MessageVectorStore(namespace=collection_name)
+            _vector_store_registry[collection_name] = vector_store
+            register_stats_source(f"session_vectors.{collection_name}", vector_store.get_session_cache_stats)
+            register_stats_source(f"vector_write_buffer.{collection_name}", vector_store.get_write_metrics)
+            logger.info(f"Initialized vector store for namespace: {collection_name}")
+    
+    return vector_store
+
+def invalidate_session_vectors(session_id: str) -> None:
+    """
+    Drop the local index of a session in every registered vector store.
+    
+    Args:
+        session_id (str): The session ID
     """
-    return MessageVectorStore(namespace=collection_name) 
\ No newline at end of file
+    with _vector_store_registry_lock:
+        vector_stores = list(_vector_store_registry.values())
+    
+    for vector_store in vector_stores:
+        vector_store.invalidate_session(session_id)
+
+def warm_up_vector_stores(namespaces: Iterable[str] = ("chat_messages",)) -> None:
+    """
+    Build the vector stores for the given namespaces ahead of the first request.
+    
+    Args:
+        namespaces (Iterable[str]): Namespaces to initialize
+    """
+    for namespace in namespaces:
+        get_vector_store(collection_name=namespace)
+
+def close_vector_stores() -> None:
+    """Close every registered vector store and empty the registry."""
+    with _vector_store_registry_lock:
+        vector_stores = list(_vector_store_registry.values())
+        _vector_store_registry.clear()
+    
+    for vector_store in vector_stores:
+        vector_store.close()
+
+async def aclose_vector_stores() -> None:
+    """Close the asynchronous clients of every registered vector store."""
+    with _vector_store_registry_lock:
+        vector_stores = list(_vector_store_registry.values())
+    
+    for vector_store in vector_stores:
+        await vector_store.aclose()
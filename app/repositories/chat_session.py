@@ -1,54 +1,448 @@
 """
 Chat session repository module.
+
+Sessions are stored as small metadata documents in chat_sessions, and their
+messages in chat_session_messages as bucket documents holding up to
+CHAT_SESSION_BUCKET_SIZE messages each. A message gets its sequence number from
+the session's message_count counter, which also tells which bucket it goes to,
+so appending never reads or rewrites the earlier messages.
+
+The bucket size is recorded on each session when it is created, so changing
+CHAT_SESSION_BUCKET_SIZE only affects new sessions. Sessions still holding the
+legacy messages array are not appended to until migrate_chat_sessions has
+moved their messages to buckets.
 """
 
+import threading
 import uuid
-from typing import Dict, Any, Optional, List
-from app.repositories.mongodb import MongoRepository
+from typing import Dict, Any, Optional, List, Sequence, Tuple
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.core.config import settings
+from app.repositories.mongodb import MongoRepository, get_database
 from app.enum.model import ModelProvider
+from app.utils.cache import LRUTTLCache
+
+# Collection holding the message buckets of the chat sessions
+CHAT_SESSION_MESSAGES_COLLECTION = "chat_session_messages"
+
+# Bucket sizes of recently used sessions; a session's bucket size never changes, so reads skip the session lookup
+_bucket_sizes: LRUTTLCache[int] = LRUTTLCache(max_entries=10000)
+
+# Whether the indexes of the chat session collections have been ensured by this process
+_indexes_ready = False
+_indexes_lock = threading.Lock()
+
+def ensure_chat_session_indexes() -> None:
+    """Create the indexes of the chat session collections, once per process."""
+    global _indexes_ready
+    
+    if _indexes_ready:
+        return
+    
+    with _indexes_lock:
+        if not _indexes_ready:
+            db = get_database()
+            db["chat_sessions"].create_index("session_id", unique=True)
+            db[CHAT_SESSION_MESSAGES_COLLECTION].create_index(
+                [("session_id", ASCENDING), ("bucket", ASCENDING)],
+                unique=True
+            )
+            _indexes_ready = True
 
 class ChatSessionRepository(MongoRepository):
     """Repository for chat sessions."""
     
-    def __init__(self):
-        """Initialize the chat session repository."""
+    def __init__(self, bucket_size: int = settings.CHAT_SESSION_BUCKET_SIZE):
+        """
+        Initialize the chat session repository.
+        
+        Args:
+            bucket_size (int): Maximum number of messages in one bucket document of new sessions,
+                and of existing sessions created before the size was recorded
+        """
         super().__init__("chat_sessions")
+        self.bucket_size = max(1, bucket_size)
+        self.messages_collection = self.db[CHAT_SESSION_MESSAGES_COLLECTION]
+        ensure_chat_session_indexes()
     
-    def create_session(self, model_provider: ModelProvider = ModelProvider.GEMINI) -> str:
+    @property
+    def async_messages_collection(self):
         """
-        Create a new chat session.
+        The message bucket collection through the asynchronous MongoDB client.
+        
+        Returns:
+            AsyncIOMotorCollection: A Motor collection
+        """
+        return self.async_collection.database[CHAT_SESSION_MESSAGES_COLLECTION]
+    
+    def _new_session_document(self, model_provider: ModelProvider) -> Dict[str, Any]:
+        """
+        Build the document for a new chat session.
         
         Args:
             model_provider (ModelProvider): The LLM provider to use
-            
+        
         Returns:
-            str: The session ID
+            Dict[str, Any]: The chat session document
         """
-        session_id = str(uuid.uuid4())
-        
         # Store the string value of the enum in MongoDB
         provider_value = model_provider.value if isinstance(model_provider, ModelProvider) else str(model_provider)
         
-        self.collection.insert_one({
-            "session_id": session_id,
+        return {
+            "session_id": str(uuid.uuid4()),
             "model_provider": provider_value,
             "created_at": uuid.uuid1().time,
-            "messages": []
-        })
+            "message_count": 0,
+            "bucket_size": self.bucket_size
+        }
+    
+    def _session_bucket_size(self, session: Dict[str, Any]) -> int:
+        """
+        Get the bucket size recorded on a session document and remember it.
+        
+        Args:
+            session (Dict[str, Any]): The session document, projected with bucket_size
+        
+        Returns:
+            int: The bucket size of the session
+        """
+        bucket_size = session.get("bucket_size") or self.bucket_size
+        _bucket_sizes.set(session["session_id"], bucket_size)
+        return bucket_size
+    
+    def get_bucket_size(self, session_id: str) -> int:
+        """
+        Get the bucket size of a session.
+        
+        Args:
+            session_id (str): The session ID
+        
+        Returns:
+            int: The bucket size the session's messages are stored with
+        """
+        bucket_size = _bucket_sizes.get(session_id)
+        if bucket_size is not None:
+            return bucket_size
+        
+        session = self.collection.find_one({"session_id": session_id}, {"session_id": 1, "bucket_size": 1})
+        return self._session_bucket_size(session) if session else self.bucket_size
+    
+    async def aget_bucket_size(self, session_id: str) -> int:
+        """
+        Get the bucket size of a session asynchronously.
+        
+        Args:
+            session_id (str): The session ID
+        
+        Returns:
+            int: The bucket size the session's messages are stored with
+        """
+        bucket_size = _bucket_sizes.get(session_id)
+        if bucket_size is not None:
+            return bucket_size
+        
+        session = await self.async_collection.find_one({"session_id": session_id}, {"session_id": 1, "bucket_size": 1})
+        return self._session_bucket_size(session) if session else self.bucket_size
+    
+    def _reserve_filter(self, session_id: str) -> Dict[str, Any]:
+        """
+        Build the filter of the sessions new messages can be appended to.
+        
+        Args:
+            session_id (str): The session ID
+        
+        Returns:
+            Dict[str, Any]: The MongoDB filter, excluding sessions not migrated to buckets yet
+        """
+        # Appending to a legacy session would write bucket 0 before the migration does
+        return {"session_id": session_id, "messages": {"$exists": False}}
+    
+    def _reserve_update(self, count: int) -> Dict[str, Any]:
+        """
+        Build the update reserving sequence numbers for new messages of a session.
+        
+        Args:
+            count (int): Number of messages to reserve
+        
+        Returns:
+            Dict[str, Any]: The MongoDB update document
+        """
+        return {
+            "$inc": {"message_count": count},
+            "$set": {"updated_at": uuid.uuid1().time}
+        }
+    
+    def _bucket_updates(self, session_id: str, first_seq: int, messages: Sequence[Tuple[str, str]],
+                        bucket_size: int) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Build the bucket updates appending messages from a reserved sequence number.
+        
+        Args:
+            session_id (str): The session ID
+            first_seq (int): Sequence number of the first message
+            messages (Sequence[Tuple[str, str]]): The (role, content) pairs to append
+            bucket_size (int): Bucket size of the session
+        
+        Returns:
+            List[Tuple[Dict[str, Any], Dict[str, Any]]]: (filter, update) pairs, one per bucket
+        """
+        timestamp = uuid.uuid1().time
+        buckets: Dict[int, List[Dict[str, Any]]] = {}
+        for offset, (role, content) in enumerate(messages):
+            seq = first_seq + offset
+            buckets.setdefault(seq // bucket_size, []).append({
+                "seq": seq,
+                "role": role,
+                "content": content,
+                "timestamp": timestamp
+            })
+        
+        # A bucket already holding the first message of its group has all of them, since they are pushed together
+        return [
+            (
+                {"session_id": session_id, "bucket": bucket, "messages.seq": {"$ne": bucket_messages[0]["seq"]}},
+                {
+                    "$push": {"messages": {"$each": bucket_messages}},
+                    "$inc": {"count": len(bucket_messages)},
+                    "$setOnInsert": {"created_at": timestamp}
+                }
+            )
+            for bucket, bucket_messages in buckets.items()
+        ]
+    
+    def _flatten_buckets(self, buckets: List[Dict[str, Any]], limit: Optional[int], before: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Flatten bucket documents, newest bucket first, into messages in chronological order.
+        
+        Args:
+            buckets (List[Dict[str, Any]]): The bucket documents, newest first
+            limit (int, optional): Keep only the most recent messages
+            before (int, optional): Keep only messages with a lower sequence number
+        
+        Returns:
+            List[Dict[str, Any]]: The messages, oldest first
+        """
+        messages = [
+            message
+            for bucket in reversed(buckets)
+            for message in sorted(bucket.get("messages", []), key=lambda message: message["seq"])
+            if before is None or message["seq"] < before
+        ]
+        return messages[-limit:] if limit else messages
+    
+    def _bucket_window(self, limit: Optional[int], bucket_size: int) -> int:
+        """
+        Number of buckets holding at least the most recent limit messages.
+        
+        Args:
+            limit (int, optional): Number of recent messages wanted, None for all
+            bucket_size (int): Bucket size of the session
+        
+        Returns:
+            int: Number of buckets to read, 0 for all
+        """
+        if not limit:
+            return 0
+        # The newest bucket may be almost empty, so read one more
+        return -(-limit // bucket_size) + 1
+    
+    def _push_to_bucket(self, bucket_filter: Dict[str, Any], bucket_update: Dict[str, Any]) -> None:
+        """
+        Apply a bucket update, creating the bucket if needed.
+        
+        Args:
+            bucket_filter (Dict[str, Any]): Filter selecting the bucket
+            bucket_update (Dict[str, Any]): The update appending the messages
+        """
+        try:
+            self.messages_collection.update_one(bucket_filter, bucket_update, upsert=True)
+        except DuplicateKeyError:
+            # The bucket exists: a concurrent append created it first, or it already holds these messages.
+            # Without upsert the update appends in the first case and matches nothing in the second
+            self.messages_collection.update_one(bucket_filter, bucket_update)
+    
+    async def _apush_to_bucket(self, bucket_filter: Dict[str, Any], bucket_update: Dict[str, Any]) -> None:
+        """
+        Apply a bucket update asynchronously, creating the bucket if needed.
+        
+        Args:
+            bucket_filter (Dict[str, Any]): Filter selecting the bucket
+            bucket_update (Dict[str, Any]): The update appending the messages
+        """
+        try:
+            await self.async_messages_collection.update_one(bucket_filter, bucket_update, upsert=True)
+        except DuplicateKeyError:
+            # The bucket exists: a concurrent append created it first, or it already holds these messages.
+            # Without upsert the update appends in the first case and matches nothing in the second
+            await self.async_messages_collection.update_one(bucket_filter, bucket_update)
+    
+    def create_session(self, model_provider: ModelProvider = ModelProvider.GEMINI) -> str:
+        """
+        Create a new chat session.
+        
+        Args:
+            model_provider (ModelProvider): The LLM provider to use
+        
+        Returns:
+            str: The session ID
+        """
+        session = self._new_session_document(model_provider)
+        self.collection.insert_one(session)
+        
+        return session["session_id"]
+    
+    async def acreate_session(self, model_provider: ModelProvider = ModelProvider.GEMINI) -> str:
+        """
+        Create a new chat session asynchronously.
+        
+        Args:
+            model_provider (ModelProvider): The LLM provider to use
+        
+        Returns:
+            str: The session ID
+        """
+        session = self._new_session_document(model_provider)
+        await self.async_collection.insert_one(session)
         
-        return session_id
+        return session["session_id"]
     
     def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """
-        Get a chat session by ID.
+        Get the metadata of a chat session by ID.
         
         Args:
             session_id (str): The session ID
-            
+        
         Returns:
             Optional[Dict[str, Any]]: The chat session document or None if not found
         """
-        return self.collection.find_one({"session_id": session_id})
+        return self.collection.find_one({"session_id": session_id}, {"messages": 0})
+    
+    async def aget_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the metadata of a chat session by ID asynchronously.
+        
+        Args:
+            session_id (str): The session ID
+        
+        Returns:
+            Optional[Dict[str, Any]]: The chat session document or None if not found
+        """
+        return await self.async_collection.find_one({"session_id": session_id}, {"messages": 0})
+    
+    def session_exists(self, session_id: str) -> bool:
+        """
+        Check whether a chat session exists, reading only its _id.
+        
+        Args:
+            session_id (str): The session ID
+        
+        Returns:
+            bool: True if the session exists
+        """
+        return self.collection.find_one({"session_id": session_id}, {"_id": 1}) is not None
+    
+    async def asession_exists(self, session_id: str) -> bool:
+        """
+        Check whether a chat session exists asynchronously, reading only its _id.
+        
+        Args:
+            session_id (str): The session ID
+        
+        Returns:
+            bool: True if the session exists
+        """
+        return await self.async_collection.find_one({"session_id": session_id}, {"_id": 1}) is not None
+    
+    def reserve_messages(self, session_id: str, count: int) -> Optional[Tuple[int, int]]:
+        """
+        Reserve sequence numbers for new messages of a chat session.
+        
+        Args:
+            session_id (str): The session ID
+            count (int): Number of messages to reserve
+        
+        Returns:
+            Optional[Tuple[int, int]]: The first reserved sequence number and the session's bucket size,
+                or None if the session does not exist or is not migrated yet
+        """
+        session = self.collection.find_one_and_update(
+            self._reserve_filter(session_id),
+            self._reserve_update(count),
+            projection={"session_id": 1, "message_count": 1, "bucket_size": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not session:
+            return None
+        return session["message_count"] - count, self._session_bucket_size(session)
+    
+    def append_messages(self, session_id: str, first_seq: int, bucket_size: int, messages: Sequence[Tuple[str, str]]) -> None:
+        """
+        Write messages at sequence numbers reserved with reserve_messages.
+        
+        Writing the same messages again is a no-op, so a failed append can be retried
+        with the same reservation without duplicating messages.
+        
+        Args:
+            session_id (str): The session ID
+            first_seq (int): First reserved sequence number
+            bucket_size (int): Bucket size of the session
+            messages (Sequence[Tuple[str, str]]): The (role, content) pairs to write
+        """
+        for bucket_filter, bucket_update in self._bucket_updates(session_id, first_seq, messages, bucket_size):
+            self._push_to_bucket(bucket_filter, bucket_update)
+    
+    def save_messages(self, session_id: str, messages: Sequence[Tuple[str, str]]) -> bool:
+        """
+        Append messages to a chat session.
+        
+        Args:
+            session_id (str): The session ID
+            messages (Sequence[Tuple[str, str]]): The (role, content) pairs to append, role being user or assistant
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        if not messages:
+            return True
+        
+        reservation = self.reserve_messages(session_id, len(messages))
+        if reservation is None:
+            return False
+        
+        self.append_messages(session_id, *reservation, messages)
+        return True
+    
+    async def asave_messages(self, session_id: str, messages: Sequence[Tuple[str, str]]) -> bool:
+        """
+        Append messages to a chat session asynchronously.
+        
+        Args:
+            session_id (str): The session ID
+            messages (Sequence[Tuple[str, str]]): The (role, content) pairs to append, role being user or assistant
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        if not messages:
+            return True
+        
+        session = await self.async_collection.find_one_and_update(
+            self._reserve_filter(session_id),
+            self._reserve_update(len(messages)),
+            projection={"session_id": 1, "message_count": 1, "bucket_size": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not session:
+            return False
+        
+        first_seq = session["message_count"] - len(messages)
+        bucket_size = self._session_bucket_size(session)
+        for bucket_filter, bucket_update in self._bucket_updates(session_id, first_seq, messages, bucket_size):
+            await self._apush_to_bucket(bucket_filter, bucket_update)
+        
+        return True
     
     def save_message(self, session_id: str, role: str, content: str) -> bool:
         """
@@ -58,37 +452,105 @@ class ChatSessionRepository(MongoRepository):
             session_id (str): The session ID
             role (str): The message role (user or assistant)
             content (str): The message content
-            
+        
         Returns:
             bool: True if successful, False otherwise
         """
-        result = self.collection.update_one(
-            {"session_id": session_id},
-            {
-                "$push": {
-                    "messages": {
-                        "role": role,
-                        "content": content,
-                        "timestamp": uuid.uuid1().time
-                    }
-                }
-            }
-        )
+        return self.save_messages(session_id, [(role, content)])
+    
+    async def asave_message(self, session_id: str, role: str, content: str) -> bool:
+        """
+        Save a message to a chat session asynchronously.
         
-        return result.modified_count > 0
+        Args:
+            session_id (str): The session ID
+            role (str): The message role (user or assistant)
+            content (str): The message content
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        return await self.asave_messages(session_id, [(role, content)])
     
-    def get_messages(self, session_id: str) -> List[Dict[str, Any]]:
+    def _messages_query(self, session_id: str, before: Optional[int], bucket_size: int) -> Dict[str, Any]:
         """
-        Get all messages for a chat session.
+        Build the filter selecting the buckets of a session, optionally only those with messages older than a sequence number.
         
         Args:
             session_id (str): The session ID
-            
+            before (int, optional): Only buckets holding messages with a lower sequence number match
+            bucket_size (int): Bucket size of the session
+        
         Returns:
-            List[Dict[str, Any]]: The list of messages
+            Dict[str, Any]: The MongoDB filter
         """
-        session = self.get_session(session_id)
-        if not session:
+        query: Dict[str, Any] = {"session_id": session_id}
+        if before is not None:
+            query["bucket"] = {"$lte": max(0, before - 1) // bucket_size}
+        return query
+    
+    def get_messages(self, session_id: str, limit: Optional[int] = None, before: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Get the messages of a chat session.
+        
+        Args:
+            session_id (str): The session ID
+            limit (int, optional): Return only the most recent messages
+            before (int, optional): Return only messages with a lower sequence number, for paging back
+        
+        Returns:
+            List[Dict[str, Any]]: The list of messages, oldest first
+        """
+        if before is not None and before <= 0:
             return []
         
-        return session.get("messages", []) 
\ No newline at end of file
+        bucket_size = self.get_bucket_size(session_id)
+        cursor = self.messages_collection.find(
+            self._messages_query(session_id, before, bucket_size),
+            {"messages": 1, "_id": 0}
+        ).sort("bucket", DESCENDING).limit(self._bucket_window(limit, bucket_size))
+        
+        return self._flatten_buckets(list(cursor), limit, before)
+    
+    async def aget_messages(self, session_id: str, limit: Optional[int] = None, before: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Get the messages of a chat session asynchronously.
+        
+        Args:
+            session_id (str): The session ID
+            limit (int, optional): Return only the most recent messages
+            before (int, optional): Return only messages with a lower sequence number, for paging back
+        
+        Returns:
+            List[Dict[str, Any]]: The list of messages, oldest first
+        """
+        if before is not None and before <= 0:
+            return []
+        
+        bucket_size = await self.aget_bucket_size(session_id)
+        cursor = self.async_messages_collection.find(
+            self._messages_query(session_id, before, bucket_size),
+            {"messages": 1, "_id": 0}
+        ).sort("bucket", DESCENDING).limit(self._bucket_window(limit, bucket_size))
+        
+        return self._flatten_buckets(await cursor.to_list(length=None), limit, before)
+    
+    def clear_messages(self, session_id: str) -> None:
+        """
+        Delete the messages of a chat session, keeping the session.
+        
+        Args:
+            session_id (str): The session ID
+        """
+        self.messages_collection.delete_many({"session_id": session_id})
+        self.collection.update_one({"session_id": session_id}, {"$set": {"message_count": 0}, "$unset": {"messages": ""}})
+    
+    async def aclear_messages(self, session_id: str) -> None:
+        """
+        Delete the messages of a chat session asynchronously, keeping the session.
+        
+        Args:
+            session_id (str): The session ID
+        """
+        await self.async_messages_collection.delete_many({"session_id": session_id})
+        await self.async_collection.update_one({"session_id": session_id}, {"$set": {"message_count": 0}, "$unset": {"messages": ""}})
@@ -2,11 +2,133 @@
 MongoDB client and repository module.
 """
 
+import logging
+import threading
+from typing import Any, Dict, Optional
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from pymongo import MongoClient
 from pymongo.database import Database
 from app.core.config import settings
 
-_mongo_client = None
+# Set up logging
+logger = logging.getLogger(__name__)
+
+class MongoConnectionManager:
+    """
+    Process-wide owner of the MongoDB clients.
+    
+    One synchronous and one asynchronous client are created lazily with the pool,
+    timeout and write concern settings, and shared by every repository and chat
+    history, so requests never open their own connection pools.
+    """
+    
+    def __init__(self, uri: str = settings.MONGODB_URI, db_name: str = settings.MONGODB_DB_NAME):
+        """
+        Initialize the connection manager.
+        
+        Args:
+            uri (str): The MongoDB connection string
+            db_name (str): The name of the MongoDB database
+        """
+        self.uri = uri
+        self.db_name = db_name
+        self._client: Optional[MongoClient] = None
+        self._async_client: Optional[AsyncIOMotorClient] = None
+        self._lock = threading.Lock()
+    
+    def client_options(self) -> Dict[str, Any]:
+        """
+        Build the options shared by the synchronous and asynchronous clients.
+        
+        Returns:
+            Dict[str, Any]: Keyword arguments for MongoClient and AsyncIOMotorClient
+        """
+        write_concern = settings.MONGODB_WRITE_CONCERN
+        options = {
+            "appname": settings.APP_NAME,
+            "maxPoolSize": settings.MONGODB_MAX_POOL_SIZE,
+            "minPoolSize": settings.MONGODB_MIN_POOL_SIZE,
+            "maxIdleTimeMS": settings.MONGODB_MAX_IDLE_TIME_MS,
+            "waitQueueTimeoutMS": settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+            "connectTimeoutMS": settings.MONGODB_CONNECT_TIMEOUT_MS,
+            "serverSelectionTimeoutMS": settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            "socketTimeoutMS": settings.MONGODB_SOCKET_TIMEOUT_MS,
+            "retryWrites": settings.MONGODB_RETRY_WRITES,
+            # w is either a number of nodes or a tag such as "majority"
+            "w": int(write_concern) if write_concern.isdigit() else write_concern,
+        }
+        if settings.MONGODB_WRITE_CONCERN_JOURNAL is not None:
+            options["journal"] = settings.MONGODB_WRITE_CONCERN_JOURNAL
+        return options
+    
+    @property
+    def client(self) -> MongoClient:
+        """The shared synchronous client, connected and verified on first use."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    try:
+                        client = MongoClient(self.uri, **self.client_options())
+                        # Ping the database to verify the connection
+                        client.admin.command('ping')
+                        logger.info(f"Connected to MongoDB: {self.uri}")
+                    except Exception as e:
+                        logger.error(f"Failed to connect to MongoDB: {e}")
+                        raise
+                    self._client = client
+        
+        return self._client
+    
+    @property
+    def async_client(self) -> AsyncIOMotorClient:
+        """The shared asynchronous client, created on first use."""
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    self._async_client = AsyncIOMotorClient(self.uri, **self.client_options())
+        
+        return self._async_client
+    
+    @property
+    def database(self) -> Database:
+        """The application database through the synchronous client."""
+        return self.client[self.db_name]
+    
+    @property
+    def async_database(self) -> AsyncIOMotorDatabase:
+        """The application database through the asynchronous client."""
+        return self.async_client[self.db_name]
+    
+    def close(self) -> None:
+        """Close both clients and their connection pools."""
+        with self._lock:
+            client, async_client = self._client, self._async_client
+            self._client = None
+            self._async_client = None
+        
+        if client is not None:
+            client.close()
+        if async_client is not None:
+            async_client.close()
+
+_connection_manager: Optional[MongoConnectionManager] = None
+_connection_manager_lock = threading.Lock()
+
+def get_connection_manager() -> MongoConnectionManager:
+    """
+    Get the process-wide MongoDB connection manager.
+    
+    Returns:
+        MongoConnectionManager: The shared connection manager
+    """
+    global _connection_manager
+    
+    if _connection_manager is None:
+        with _connection_manager_lock:
+            if _connection_manager is None:
+                _connection_manager = MongoConnectionManager()
+    
+    return _connection_manager
 
 def get_mongodb_client() -> MongoClient:
     """
@@ -15,19 +137,7 @@ def get_mongodb_client() -> MongoClient:
     Returns:
         MongoClient: A MongoDB client instance
     """
-    global _mongo_client
-    
-    if _mongo_client is None:
-        try:
-            _mongo_client = MongoClient(settings.MONGODB_URI)
-            # Ping the database to verify the connection
-            _mongo_client.admin.command('ping')
-            print(f"Connected to MongoDB: {settings.MONGODB_URI}")
-        except Exception as e:
-            print(f"Failed to connect to MongoDB: {e}")
-            raise
-    
-    return _mongo_client
+    return get_connection_manager().client
 
 def get_database() -> Database:
     """
@@ -36,8 +146,36 @@ def get_database() -> Database:
     Returns:
         Database: A MongoDB database instance
     """
-    client = get_mongodb_client()
-    return client[settings.MONGODB_DB_NAME]
+    return get_connection_manager().database
+
+def get_async_mongodb_client() -> AsyncIOMotorClient:
+    """
+    Get an asynchronous MongoDB client instance (singleton).
+    
+    Returns:
+        AsyncIOMotorClient: A Motor client instance
+    """
+    return get_connection_manager().async_client
+
+def get_async_database() -> AsyncIOMotorDatabase:
+    """
+    Get the asynchronous MongoDB database instance.
+    
+    Returns:
+        AsyncIOMotorDatabase: A Motor database instance
+    """
+    return get_connection_manager().async_database
+
+def close_mongodb_clients() -> None:
+    """Close the shared MongoDB clients, for application shutdown."""
+    global _connection_manager
+    
+    with _connection_manager_lock:
+        manager = _connection_manager
+        _connection_manager = None
+    
+    if manager is not None:
+        manager.close()
 
 class MongoRepository:
     """Base MongoDB repository class."""
@@ -49,5 +187,16 @@ class MongoRepository:
         Args:
             collection_name (str): The name of the MongoDB collection
         """
+        self.collection_name = collection_name
         self.db = get_database()
-        self.collection = self.db[collection_name] 
\ No newline at end of file
+        self.collection = self.db[collection_name]
+    
+    @property
+    def async_collection(self):
+        """
+        The same collection through the asynchronous MongoDB client.
+        
+        Returns:
+            AsyncIOMotorCollection: A Motor collection
+        """
+        return get_async_database()[self.collection_name] 
\ No newline at end of file
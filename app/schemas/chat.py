@@ -11,8 +11,9 @@ class ChatRequest(BaseModel):
     
     user_input: str = Field(..., description="User's message")
     session_id: Optional[str] = Field(None, description="Session ID (optional)")
-    model_provider: ModelProvider = Field(ModelProvider.GEMINI, description="LLM provider (openai or gemini)")
+    model_provider: ModelProvider = Field(ModelProvider.GEMINI, description="LLM provider (openai, gemini or fake)")
     use_graph: bool = Field(True, description="Use graph-based approach")
+    include_timings: bool = Field(False, description="Return the duration of each stage in the response")
     
     model_config = {
         "protected_namespaces": (),
@@ -28,6 +29,10 @@ class ChatRequest(BaseModel):
                     "type": "boolean",
                     "default": True
                 },
+                "include_timings": {
+                    "type": "boolean",
+                    "default": False
+                },
                 "session_id": {
                     "type": "string",
                     "default": None
@@ -59,8 +64,16 @@ class ChatSession(BaseModel):
         "protected_namespaces": ()
     }
 
+class MessagePage(BaseModel):
+    """Page of session messages schema."""
+    
+    session_id: str = Field(..., description="Session ID")
+    messages: List[Message] = Field(default_factory=list, description="Session messages, oldest first")
+    next_before: Optional[int] = Field(None, description="Cursor of the next older page, None on the first message")
+
 class ChatResponse(BaseModel):
     """Chat response schema."""
     
     response: Dict[str, Any] = Field(..., description="Response data")
-    session_id: str = Field(..., description="Session ID") 
\ No newline at end of file
+    session_id: str = Field(..., description="Session ID")
+    timings: Optional[Dict[str, float]] = Field(None, description="Duration of each stage in milliseconds, if requested") 
\ No newline at end of file
@@ -0,0 +1,159 @@
+"""
+Migrate chat sessions from the embedded messages array to message buckets.
+
+Older chat_sessions documents keep every message in a messages array. This
+command moves those messages to chat_session_messages buckets, sets the
+session's message_count and bucket_size and removes the array. Sessions already
+using buckets but created before the bucket size was recorded get it set too.
+Run it before starting the new version of the application:
+
+    python -m app.scripts.migrate_chat_sessions [--dry-run] [--limit N]
+
+It is idempotent: buckets are replaced rather than appended to, and a session
+is only marked as migrated once all of its buckets are written. The application
+does not append to a session until it is migrated, so it can keep running while
+the command runs or after a partial run with --limit. Sessions that got
+bucketed messages from an older version before being migrated are merged, the
+embedded messages first. The bucket size is always CHAT_SESSION_BUCKET_SIZE,
+the size the application appends with.
+"""
+
+import argparse
+import logging
+from typing import Any, Dict, List, Optional
+from pymongo import ReplaceOne
+from app.repositories.chat_session import CHAT_SESSION_MESSAGES_COLLECTION, ensure_chat_session_indexes
+from app.repositories.mongodb import get_database
+from app.core.config import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+def build_buckets(session_id: str, messages: List[Dict[str, Any]], bucket_size: int) -> List[Dict[str, Any]]:
+    """
+    Split the embedded messages of a session into bucket documents.
+    
+    Args:
+        session_id (str): The session ID
+        messages (List[Dict[str, Any]]): The embedded messages, oldest first
+        bucket_size (int): Maximum number of messages in one bucket document
+    
+    Returns:
+        List[Dict[str, Any]]: The bucket documents
+    """
+    buckets = []
+    for start in range(0, len(messages), bucket_size):
+        bucket_messages = [
+            {
+                "seq": start + offset,
+                "role": message.get("role"),
+                "content": message.get("content"),
+                "timestamp": message.get("timestamp")
+            }
+            for offset, message in enumerate(messages[start:start + bucket_size])
+        ]
+        buckets.append({
+            "session_id": session_id,
+            "bucket": start // bucket_size,
+            "messages": bucket_messages,
+            "count": len(bucket_messages),
+            "created_at": bucket_messages[0]["timestamp"]
+        })
+    return buckets
+
+def bucketed_messages(buckets_collection: Any, session_id: str) -> List[Dict[str, Any]]:
+    """
+    Read the messages already written to the buckets of a session.
+    
+    Args:
+        buckets_collection (Any): The chat_session_messages collection
+        session_id (str): The session ID
+    
+    Returns:
+        List[Dict[str, Any]]: The bucketed messages, oldest first
+    """
+    buckets = buckets_collection.find({"session_id": session_id}, {"messages": 1, "_id": 0})
+    messages = [message for bucket in buckets for message in bucket.get("messages", [])]
+    return sorted(messages, key=lambda message: message["seq"])
+
+def migrate_chat_sessions(dry_run: bool = False, limit: Optional[int] = None) -> Dict[str, int]:
+    """
+    Move the embedded messages of every legacy chat session to message buckets.
+    
+    Args:
+        dry_run (bool): Only count what would be migrated
+        limit (int, optional): Maximum number of sessions to migrate
+    
+    Returns:
+        Dict[str, int]: Number of sessions, messages and buckets migrated, of sessions merged with
+            their bucketed messages, and of bucketed sessions given their bucket size
+    """
+    # Sessions without a recorded size are read and appended with the configured one, so only that one is safe
+    bucket_size = max(1, settings.CHAT_SESSION_BUCKET_SIZE)
+    db = get_database()
+    sessions = db["chat_sessions"]
+    buckets_collection = db[CHAT_SESSION_MESSAGES_COLLECTION]
+    stats = {"sessions": 0, "messages": 0, "buckets": 0, "merged_sessions": 0, "sized_sessions": 0}
+    
+    if not dry_run:
+        ensure_chat_session_indexes()
+    
+    cursor = sessions.find({"messages": {"$exists": True}}, {"session_id": 1, "messages": 1, "message_count": 1})
+    if limit:
+        cursor = cursor.limit(limit)
+    
+    for session in cursor:
+        session_id = session["session_id"]
+        messages = session.get("messages") or []
+        # An older version may have appended to the session before it was migrated
+        if session.get("message_count"):
+            messages = messages + bucketed_messages(buckets_collection, session_id)
+            stats["merged_sessions"] += 1
+            if not dry_run:
+                # Fold them into the array first, so a rerun after a failure does not merge them twice
+                sessions.update_one(
+                    {"_id": session["_id"]},
+                    {"$set": {"messages": messages}, "$unset": {"message_count": ""}}
+                )
+        buckets = build_buckets(session_id, messages, bucket_size)
+        
+        if not dry_run:
+            if buckets:
+                buckets_collection.bulk_write([
+                    ReplaceOne({"session_id": session_id, "bucket": bucket["bucket"]}, bucket, upsert=True)
+                    for bucket in buckets
+                ], ordered=True)
+            sessions.update_one(
+                {"_id": session["_id"]},
+                {"$set": {"message_count": len(messages), "bucket_size": bucket_size}, "$unset": {"messages": ""}}
+            )
+        
+        stats["sessions"] += 1
+        stats["messages"] += len(messages)
+        stats["buckets"] += len(buckets)
+    
+    # Record the size of the bucketed sessions created before it was stored on the session
+    unsized = {"messages": {"$exists": False}, "bucket_size": {"$exists": False}}
+    if dry_run:
+        stats["sized_sessions"] = sessions.count_documents(unsized)
+    else:
+        stats["sized_sessions"] = sessions.update_many(unsized, {"$set": {"bucket_size": bucket_size}}).modified_count
+    
+    return stats
+
+def main() -> None:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Migrate chat sessions to bucketed message storage.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be migrated")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of sessions to migrate")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    stats = migrate_chat_sessions(dry_run=args.dry_run, limit=args.limit)
+    prefix = "Would migrate" if args.dry_run else "Migrated"
+    logger.info(f"{prefix} {stats['sessions']} sessions, {stats['messages']} messages into {stats['buckets']} buckets")
+    logger.info(f"{prefix} merge {stats['merged_sessions']} sessions with the messages already in their buckets")
+    logger.info(f"{prefix} record the bucket size of {stats['sized_sessions']} bucketed sessions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Apply the configured quantization to an existing Qdrant collection.
+
+New collections are created with QDRANT_QUANTIZATION already applied. Existing
+collections keep their settings until this command is run:
+
+    python -m app.scripts.migrate_vector_quantization [--mode scalar|binary|none] [--namespace chat_messages] [--wait]
+
+Qdrant keeps the original float32 vectors (on disk) and builds the quantized copy
+in the background, so the collection remains searchable during the migration and
+can be switched back with --mode none.
+"""
+
+import argparse
+import logging
+import time
+from qdrant_client.http import models
+from app.config.config import QDRANT_QUANTIZATION
+from app.models.vector_store import get_vector_store, close_vector_stores
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+def migrate_vector_quantization(mode: str = QDRANT_QUANTIZATION, namespace: str = "chat_messages",
+                                wait: bool = False, poll_interval: float = 5.0) -> models.CollectionStatus:
+    """
+    Change the quantization of a vector store collection.
+    
+    Args:
+        mode (str): "none", "scalar" (int8) or "binary"
+        namespace (str): Namespace of the vector store
+        wait (bool): Wait until Qdrant has finished rebuilding the collection
+        poll_interval (float): Seconds between status checks while waiting
+    
+    Returns:
+        models.CollectionStatus: The collection status after the change
+    """
+    vector_store = get_vector_store(collection_name=namespace)
+    vector_store.apply_quantization(mode)
+    
+    status = vector_store.client.get_collection(vector_store.collection_name).status
+    while wait and status != models.CollectionStatus.GREEN:
+        logger.info(f"Collection {vector_store.collection_name} is {status.value}, waiting for optimization")
+        time.sleep(poll_interval)
+        status = vector_store.client.get_collection(vector_store.collection_name).status
+    
+    return status
+
+def main() -> None:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Apply vector quantization to an existing Qdrant collection.")
+    parser.add_argument("--mode", choices=["none", "scalar", "binary"], default=QDRANT_QUANTIZATION,
+                        help="Quantization to apply (defaults to QDRANT_QUANTIZATION)")
+    parser.add_argument("--namespace", default="chat_messages", help="Namespace of the vector store")
+    parser.add_argument("--wait", action="store_true", help="Wait until the collection is rebuilt")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    try:
+        status = migrate_vector_quantization(mode=args.mode, namespace=args.namespace, wait=args.wait)
+        logger.info(f"Quantization set to '{args.mode}', collection status: {status.value}")
+    finally:
+        close_vector_stores()
+
+if __name__ == "__main__":
+    main()
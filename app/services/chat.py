@@ -2,15 +2,45 @@
 Chat service module.
 """
 
-from typing import Dict, Any, Tuple, Optional
+from typing import Dict, Any, List, Tuple, Optional, AsyncIterator
 import uuid
 
 from app.services.llm import get_model
-from app.services.memory import get_memory, save_message_to_memory
+from app.services.memory import get_memory
+from app.services.persistence import wait_for_session_writes, await_session_writes
+from app.core.metrics import stage_timer
+from app.core.tracing import annotate_span
 from app.repositories.chat_session import ChatSessionRepository
+from app.models.memory import ROLE_BY_MESSAGE_TYPE, get_mongodb_chat_history
 from app.enum.model import ModelProvider
-from app.chains.simple_chat_chain import create_simple_chat_chain
-from app.graph.chat_graph import create_chat_graph, process_user_input
+from app.chains.simple_chat_chain import (
+    create_simple_chat_chain,
+    create_async_simple_chat_chain,
+    create_streaming_simple_chat_chain
+)
+from app.graph.chat_graph import (
+    create_chat_graph,
+    process_user_input,
+    create_async_chat_graph,
+    aprocess_user_input,
+    create_streaming_chat_graph,
+    astream_user_input
+)
+
+def _annotate_turn(session_id: str, model_provider: ModelProvider, pattern: str) -> None:
+    """
+    Label the current trace span with the session and the chat pattern of the turn.
+    
+    Args:
+        session_id (str): The session ID
+        model_provider (ModelProvider): The LLM provider
+        pattern (str): "simple" or "graph"
+    """
+    annotate_span({
+        "chat.session_id": session_id,
+        "chat.model_provider": model_provider.value if hasattr(model_provider, 'value') else str(model_provider),
+        "chat.pattern": pattern,
+    })
 
 def get_or_create_session(session_id: Optional[str] = None, model_provider: ModelProvider = ModelProvider.GEMINI) -> str:
     """
@@ -26,14 +56,34 @@ def get_or_create_session(session_id: Optional[str] = None, model_provider: Mode
     repo = ChatSessionRepository()
     
     if session_id:
-        # Check if the session exists
-        session = repo.get_session(session_id)
-        if session:
+        # Check if the session exists without loading the document
+        if repo.session_exists(session_id):
             return session_id
     
     # Create a new session
     return repo.create_session(model_provider=model_provider)
 
+async def aget_or_create_session(session_id: Optional[str] = None, model_provider: ModelProvider = ModelProvider.GEMINI) -> str:
+    """
+    Get an existing session or create a new one asynchronously.
+    
+    Args:
+        session_id (str, optional): An existing session ID
+        model_provider (str): The LLM provider to use
+        
+    Returns:
+        str: The session ID
+    """
+    repo = ChatSessionRepository()
+    
+    if session_id:
+        # Check if the session exists without loading the document
+        if await repo.asession_exists(session_id):
+            return session_id
+    
+    # Create a new session
+    return await repo.acreate_session(model_provider=model_provider)
+
 def chat_with_simple_chain(
     user_input: str, 
     session_id: Optional[str] = None, 
@@ -53,19 +103,20 @@ def chat_with_simple_chain(
         Tuple[Dict[str, Any], str]: (response, session_id)
     """
     # Get or create a session
-    session_id = get_or_create_session(session_id, model_provider)
+    with stage_timer("session_lookup"):
+        session_id = get_or_create_session(session_id, model_provider)
+    _annotate_turn(session_id, model_provider, "simple")
     
-    # Save user message
-    save_message_to_memory(session_id, "user", user_input)
+    # Make sure the previous turn of this session has been written
+    with stage_timer("session_writes_wait"):
+        wait_for_session_writes(session_id)
     
     # Create the chain
     chain = create_simple_chat_chain(session_id, model_provider=model_provider, max_tokens=max_tokens)
     
     # Call the chain
-    result = chain({"input": user_input})
-    
-    # Save assistant response
-    save_message_to_memory(session_id, "assistant", result["output"])
+    with stage_timer("turn.simple"):
+        result = chain({"input": user_input})
     
     return result, session_id
 
@@ -90,19 +141,192 @@ def chat_with_graph(
         Tuple[Dict[str, Any], str]: (response, session_id)
     """
     # Get or create a session
-    session_id = get_or_create_session(session_id, model_provider)
+    with stage_timer("session_lookup"):
+        session_id = get_or_create_session(session_id, model_provider)
+    _annotate_turn(session_id, model_provider, "graph")
     
-    # Save user message
-    save_message_to_memory(session_id, "user", user_input)
+    # Make sure the previous turn of this session has been written
+    with stage_timer("session_writes_wait"):
+        wait_for_session_writes(session_id)
     
     # Create the graph
     graph = create_chat_graph(session_id, model_provider=model_provider, max_tokens=max_tokens)
     
     # Process user input
-    result = process_user_input(graph, user_input, session_id, similarity_threshold=similarity_threshold)
+    with stage_timer("turn.graph"):
+        result = process_user_input(graph, user_input, session_id, similarity_threshold=similarity_threshold)
+    
+    return result, session_id 
+
+async def achat_with_simple_chain(
+    user_input: str, 
+    session_id: Optional[str] = None, 
+    model_provider: ModelProvider = ModelProvider.GEMINI,
+    max_tokens: int = 200
+) -> Tuple[Dict[str, Any], str]:
+    """
+    Chat with the user using the simple chain approach, without blocking the event loop.
+    
+    Args:
+        user_input (str): The user's input message
+        session_id (str, optional): An existing session ID
+        model_provider (str): The LLM provider to use
+        max_tokens (int): Maximum number of tokens in the response (default: 200)
+        
+    Returns:
+        Tuple[Dict[str, Any], str]: (response, session_id)
+    """
+    # Get or create a session
+    with stage_timer("session_lookup"):
+        session_id = await aget_or_create_session(session_id, model_provider)
+    _annotate_turn(session_id, model_provider, "simple")
+    
+    # Make sure the previous turn of this session has been written
+    with stage_timer("session_writes_wait"):
+        await await_session_writes(session_id)
+    
+    # Create the chain
+    chain = create_async_simple_chat_chain(session_id, model_provider=model_provider, max_tokens=max_tokens)
+    
+    # Call the chain
+    with stage_timer("turn.simple"):
+        result = await chain({"input": user_input})
+    
+    return result, session_id
+
+async def achat_with_graph(
+    user_input: str, 
+    session_id: Optional[str] = None, 
+    model_provider: ModelProvider = ModelProvider.GEMINI,
+    max_tokens: int = 200,
+    similarity_threshold: float = 0.6
+) -> Tuple[Dict[str, Any], str]:
+    """
+    Chat with the user using the graph-based approach, without blocking the event loop.
+    
+    Args:
+        user_input (str): The user's input message
+        session_id (str, optional): An existing session ID
+        model_provider (str): The LLM provider to use
+        max_tokens (int): Maximum number of tokens in the response (default: 200)
+        similarity_threshold (float): Minimum similarity score (0.0 to 1.0) for vector search
+        
+    Returns:
+        Tuple[Dict[str, Any], str]: (response, session_id)
+    """
+    # Get or create a session
+    with stage_timer("session_lookup"):
+        session_id = await aget_or_create_session(session_id, model_provider)
+    _annotate_turn(session_id, model_provider, "graph")
+    
+    # Make sure the previous turn of this session has been written
+    with stage_timer("session_writes_wait"):
+        await await_session_writes(session_id)
+    
+    # Create the graph
+    graph = create_async_chat_graph(session_id, model_provider=model_provider, max_tokens=max_tokens)
+    
+    # Process user input
+    with stage_timer("turn.graph"):
+        result = await aprocess_user_input(graph, user_input, session_id, similarity_threshold=similarity_threshold)
+    
+    return result, session_id
+
+async def astream_chat_with_simple_chain(
+    user_input: str, 
+    session_id: Optional[str] = None, 
+    model_provider: ModelProvider = ModelProvider.GEMINI,
+    max_tokens: int = 200
+) -> Tuple[AsyncIterator[str], str]:
+    """
+    Chat with the user using the simple chain approach, streaming the response.
+    
+    Args:
+        user_input (str): The user's input message
+        session_id (str, optional): An existing session ID
+        model_provider (str): The LLM provider to use
+        max_tokens (int): Maximum number of tokens in the response (default: 200)
+        
+    Returns:
+        Tuple[AsyncIterator[str], str]: (response chunks, session_id)
+    """
+    # Get or create a session
+    with stage_timer("session_lookup"):
+        session_id = await aget_or_create_session(session_id, model_provider)
+    _annotate_turn(session_id, model_provider, "simple")
+    
+    # Make sure the previous turn of this session has been written
+    with stage_timer("session_writes_wait"):
+        await await_session_writes(session_id)
+    
+    # Create the chain
+    chain = create_streaming_simple_chat_chain(session_id, model_provider=model_provider, max_tokens=max_tokens)
+    
+    # The chain saves the turn once the stream has finished
+    return chain({"input": user_input}), session_id
+
+async def astream_chat_with_graph(
+    user_input: str, 
+    session_id: Optional[str] = None, 
+    model_provider: ModelProvider = ModelProvider.GEMINI,
+    max_tokens: int = 200,
+    similarity_threshold: float = 0.6
+) -> Tuple[AsyncIterator[str], str]:
+    """
+    Chat with the user using the graph-based approach, streaming the response.
+    
+    Args:
+        user_input (str): The user's input message
+        session_id (str, optional): An existing session ID
+        model_provider (str): The LLM provider to use
+        max_tokens (int): Maximum number of tokens in the response (default: 200)
+        similarity_threshold (float): Minimum similarity score (0.0 to 1.0) for vector search
+        
+    Returns:
+        Tuple[AsyncIterator[str], str]: (response chunks, session_id)
+    """
+    # Get or create a session
+    with stage_timer("session_lookup"):
+        session_id = await aget_or_create_session(session_id, model_provider)
+    _annotate_turn(session_id, model_provider, "graph")
+    
+    # Make sure the previous turn of this session has been written
+    with stage_timer("session_writes_wait"):
+        await await_session_writes(session_id)
+    
+    # Create the graph
+    graph = create_streaming_chat_graph(session_id, model_provider=model_provider, max_tokens=max_tokens)
+    
+    # The graph saves the turn once the stream has finished
+    return astream_user_input(graph, user_input, session_id, similarity_threshold=similarity_threshold), session_id
+
+async def aget_session_messages(
+    session_id: str,
+    before: Optional[int] = None,
+    limit: int = 20
+) -> Optional[Tuple[List[Dict[str, str]], Optional[int]]]:
+    """
+    Get a page of the messages of a session, walking back from the newest message.
+    
+    Args:
+        session_id (str): The session ID
+        before (int, optional): Cursor returned by the previous page; None starts from the newest message
+        limit (int): Page size (default: 20)
+        
+    Returns:
+        Optional[Tuple[List[Dict[str, str]], Optional[int]]]: (messages oldest first, cursor of the next
+        older page), or None if the session does not exist
+    """
+    repo = ChatSessionRepository()
+    if not await repo.asession_exists(session_id):
+        return None
     
-    # Save assistant response
-    if "output" in result:
-        save_message_to_memory(session_id, "assistant", result["output"])
+    # Include the turns still queued for writing
+    await await_session_writes(session_id)
     
-    return result, session_id 
\ No newline at end of file
+    history = get_mongodb_chat_history(session_id, max_messages=limit)
+    messages, next_before = await history.aget_older_messages(before=before, limit=limit)
+    return [
+        {"role": ROLE_BY_MESSAGE_TYPE.get(message.type, message.type), "content": message.content}
+        for message in messages
+    ], next_before
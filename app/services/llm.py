@@ -7,7 +7,9 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.language_models.chat_models import BaseChatModel
 from app.core.config import settings
 from app.core.langsmith import get_langsmith_tracer
-from app.enum.model import ModelProvider, ModelGeminiName, ModelOpenAiName
+from app.config.config import FAKE_LLM_ENABLED
+from app.models.fake_llm import FakeChatModel
+from app.enum.model import ModelProvider, ModelGeminiName, ModelOpenAiName, ModelFakeName
 
 def get_openai_model(model_name: ModelOpenAiName = ModelOpenAiName.OPENAI_GPT_4_1_NANO, temperature=0.7, run_name=None) -> BaseChatModel:
     """
@@ -65,12 +67,39 @@ def get_gemini_model(model_name: ModelGeminiName = ModelGeminiName.GEMINI_2_0_FL
         callbacks=callbacks if callbacks else None
     )
 
+def get_fake_model(model_name: ModelFakeName = ModelFakeName.FAKE_CHAT, temperature=0.7, run_name=None) -> BaseChatModel:
+    """
+    Initialize and return a fake chat model answering offline with deterministic responses.
+    
+    Args:
+        model_name (str): The name reported by the fake model
+        temperature (float): Accepted for compatibility, has no effect
+        run_name (str, optional): Name for tracing runs
+        
+    Returns:
+        FakeChatModel: An instance of FakeChatModel
+    """
+    if not FAKE_LLM_ENABLED:
+        raise ValueError("The fake model provider is disabled. Set FAKE_LLM_ENABLED=true to use it.")
+    
+    callbacks = []
+    if settings.LANGSMITH_TRACING:
+        tracer = get_langsmith_tracer(run_name=run_name or f"fake-{model_name.value}")
+        if tracer:
+            callbacks.append(tracer)
+    
+    return FakeChatModel(
+        model_name=model_name.value,
+        temperature=temperature,
+        callbacks=callbacks if callbacks else None
+    )
+
 def get_model(provider: ModelProvider = ModelProvider.GEMINI, run_name=None, **kwargs) -> BaseChatModel:
     """
     Factory function to get the appropriate model based on provider.
     
     Args:
-        provider (ModelProvider): The model provider to use (ModelProvider.OPENAI or ModelProvider.GEMINI)
+        provider (ModelProvider): The model provider to use (ModelProvider.OPENAI, ModelProvider.GEMINI or ModelProvider.FAKE)
         run_name (str, optional): Name for tracing runs
         **kwargs: Additional arguments to pass to the model initializer
         
@@ -81,5 +110,7 @@ def get_model(provider: ModelProvider = ModelProvider.GEMINI, run_name=None, **k
         return get_openai_model(run_name=run_name, **kwargs)
     elif provider == ModelProvider.GEMINI or provider.value == ModelProvider.GEMINI.value:
         return get_gemini_model(run_name=run_name, **kwargs)
+    elif provider == ModelProvider.FAKE or provider.value == ModelProvider.FAKE.value:
+        return get_fake_model(run_name=run_name, **kwargs)
     else:
-        raise ValueError(f"Unsupported model provider: {provider}. Use 'openai' or 'gemini'.") 
\ No newline at end of file
+        raise ValueError(f"Unsupported model provider: {provider}. Use 'openai', 'gemini' or 'fake'.") 
\ No newline at end of file
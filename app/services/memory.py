@@ -2,39 +2,99 @@
 Memory management service.
 """
 
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Sequence
 from langchain.memory import ConversationBufferMemory
-from langchain.schema import HumanMessage, AIMessage
+from langchain.schema import BaseMessage, HumanMessage, AIMessage
+from app.core.config import settings
+from app.models.memory import ROLE_BY_MESSAGE_TYPE
+from app.models.vector_store import invalidate_session_vectors
 from app.repositories.chat_session import ChatSessionRepository
+from app.utils.cache import LRUTTLCache
+from app.core.metrics import register_stats_source
 
-# In-memory cache for conversation memories
-_memory_cache: Dict[str, ConversationBufferMemory] = {}
+# Approximate per-message overhead of a cached message object, in bytes
+MESSAGE_OVERHEAD_BYTES = 200
+
+# Bounded in-memory cache for conversation memories
+_memory_cache: LRUTTLCache[ConversationBufferMemory] = LRUTTLCache(
+    max_entries=settings.MEMORY_CACHE_MAX_ENTRIES,
+    max_bytes=settings.MEMORY_CACHE_MAX_BYTES,
+    ttl_seconds=settings.MEMORY_CACHE_TTL_SECONDS,
+)
+
+def _message_size(content: str) -> int:
+    """
+    Approximate the memory taken by a cached message.
+    
+    Args:
+        content (str): The message content
+        
+    Returns:
+        int: The approximate size in bytes
+    """
+    return len(content.encode("utf-8")) + MESSAGE_OVERHEAD_BYTES
 
 def get_memory(session_id: str) -> ConversationBufferMemory:
     """
     Get or create a conversation memory for a session.
     
+    The memory holds the most recent MEMORY_CACHE_MAX_MESSAGES messages of the session.
+    
+    Args:
+        session_id (str): The session ID
+        
+    Returns:
+        ConversationBufferMemory: A conversation memory instance
+    """
+    memory = _memory_cache.get(session_id)
+    if memory is not None:
+        return memory
+    
+    # Load the recent window of messages from the database
+    repo = ChatSessionRepository()
+    messages = repo.get_messages(session_id, limit=settings.MEMORY_CACHE_MAX_MESSAGES)
+    
+    return _cache_memory(session_id, messages)
+
+async def aget_memory(session_id: str) -> ConversationBufferMemory:
+    """
+    Get or create a conversation memory for a session asynchronously.
+    
+    The memory holds the most recent MEMORY_CACHE_MAX_MESSAGES messages of the session.
+    
     Args:
         session_id (str): The session ID
         
     Returns:
         ConversationBufferMemory: A conversation memory instance
     """
-    global _memory_cache
+    memory = _memory_cache.get(session_id)
+    if memory is not None:
+        return memory
     
-    if session_id in _memory_cache:
-        return _memory_cache[session_id]
+    # Load the recent window of messages from the database
+    repo = ChatSessionRepository()
+    messages = await repo.aget_messages(session_id, limit=settings.MEMORY_CACHE_MAX_MESSAGES)
+    
+    return _cache_memory(session_id, messages)
+
+def _cache_memory(session_id: str, messages: List[Dict[str, Any]]) -> ConversationBufferMemory:
+    """
+    Build a conversation memory from stored messages and cache it.
     
+    Args:
+        session_id (str): The session ID
+        messages (List[Dict[str, Any]]): The stored session messages
+        
+    Returns:
+        ConversationBufferMemory: A conversation memory instance
+    """
     # Create a new memory
     memory = ConversationBufferMemory(
         memory_key="chat_history",
         return_messages=True
     )
     
-    # Load previous messages from the database
-    repo = ChatSessionRepository()
-    messages = repo.get_messages(session_id)
-    
     # Populate memory with previous messages
     for msg in messages:
         if msg["role"] == "user":
@@ -42,39 +102,71 @@ def get_memory(session_id: str) -> ConversationBufferMemory:
         elif msg["role"] == "assistant":
             memory.chat_memory.add_message(AIMessage(content=msg["content"]))
     
-    _memory_cache[session_id] = memory
+    size = sum(_message_size(msg["content"]) for msg in messages if msg["role"] in ("user", "assistant"))
+    _memory_cache.set(session_id, memory, size=size)
     return memory
 
-def save_message_to_memory(session_id: str, role: str, content: str) -> None:
+def remember_messages(session_id: str, messages: Sequence[BaseMessage]) -> None:
     """
-    Save a message to both the memory and the database.
+    Append messages already saved to the chat session store to the cached memory of a session.
+    
+    The memory is a view of the store, so a session that is not cached is left alone
+    and will load the messages from the database on first use. The oldest messages are
+    dropped once the memory holds more than MEMORY_CACHE_MAX_MESSAGES.
     
     Args:
         session_id (str): The session ID
+        messages (Sequence[BaseMessage]): The saved messages
+    """
+    memory = _memory_cache.get(session_id)
+    if memory is None:
+        return
+    
+    for message in messages:
+        _add_to_memory(memory, ROLE_BY_MESSAGE_TYPE.get(message.type, message.type), message.content)
+    delta = sum(_message_size(message.content) for message in messages if message.type in ("human", "ai"))
+    
+    # Keep the memory to its window
+    window = settings.MEMORY_CACHE_MAX_MESSAGES
+    if window and len(memory.chat_memory.messages) > window:
+        dropped = memory.chat_memory.messages[:-window]
+        memory.chat_memory.messages = memory.chat_memory.messages[-window:]
+        delta -= sum(_message_size(message.content) for message in dropped)
+    
+    # Keep the byte accounting in step with the changed memory
+    _memory_cache.resize(session_id, delta)
+
+def _add_to_memory(memory: ConversationBufferMemory, role: str, content: str) -> None:
+    """
+    Add a message to a conversation memory.
+    
+    Args:
+        memory (ConversationBufferMemory): The conversation memory
         role (str): The message role (user or assistant)
         content (str): The message content
     """
-    # Get the memory for this session
-    memory = get_memory(session_id)
-    
-    # Add message to memory
     if role == "user":
         memory.chat_memory.add_message(HumanMessage(content=content))
     elif role == "assistant":
         memory.chat_memory.add_message(AIMessage(content=content))
-    
-    # Save to database
-    repo = ChatSessionRepository()
-    repo.save_message(session_id, role, content)
 
 def clear_memory(session_id: str) -> None:
     """
-    Clear the memory for a session.
+    Clear the in-process memory for a session: its conversation memory and its local vector index.
     
     Args:
         session_id (str): The session ID
     """
-    global _memory_cache
+    _memory_cache.invalidate(session_id)
+    invalidate_session_vectors(session_id)
+
+def get_memory_cache_stats() -> Dict[str, Any]:
+    """
+    Get the counters and usage of the conversation memory cache.
     
-    if session_id in _memory_cache:
-        del _memory_cache[session_id] 
\ No newline at end of file
+    Returns:
+        Dict[str, Any]: Hits, misses, evictions, expirations, invalidations, rejections, entries and bytes
+    """
+    return _memory_cache.stats()
+
+register_stats_source("conversation_memory", get_memory_cache_stats) 
\ No newline at end of file
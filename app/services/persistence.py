@@ -0,0 +1,579 @@
+"""
+Write-behind persistence service.
+
+The user and assistant messages of a turn are queued here once the LLM has
+answered and written by a background worker, off the request critical path:
+once to the chat session store, which every MongoDB history view reads from,
+and to the Qdrant index.
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+from langchain_core.messages import BaseMessage
+from app.core.config import settings
+from app.models.memory import messages_to_session_records
+from app.models.vector_store import get_vector_store
+from app.repositories.chat_session import ChatSessionRepository
+from app.services.memory import remember_messages
+from app.core.metrics import stage_timer, register_stats_source
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Sentinel used to stop the worker
+_STOP = object()
+
+@dataclass
+class PersistenceJob:
+    """Messages of one session waiting to be written."""
+
+    session_id: str
+    # Messages for the chat session store, written together in one append
+    messages: List[BaseMessage] = field(default_factory=list)
+    # Messages to index in the vector store
+    index_messages: List[BaseMessage] = field(default_factory=list)
+    # First sequence number and bucket size reserved in the chat session store, kept so retries reuse them
+    reservation: Optional[Tuple[int, int]] = None
+    # Submission order, set by the queue, used to replay the failed writes of a session in order
+    order: int = 0
+
+@dataclass
+class FailedWrite:
+    """A job that some sinks could not write, kept to be replayed."""
+
+    job: PersistenceJob
+    # Sinks still to run on the job
+    sinks: List[Callable[[PersistenceJob], None]]
+    error: str
+
+class WriteBehindQueue:
+    """
+    In-process write-behind queue with batching, retries and per-session ordering.
+
+    A single worker thread takes jobs in submission order, groups them into
+    batches and runs every sink on each job, retrying a failed sink with
+    exponential backoff. Sinks are retried per job, so a failure never rewrites
+    the jobs already written. Because jobs are processed in order by one worker,
+    writes of a session are applied in the order they were submitted, and
+    wait_for_session lets the next turn of a session wait for its pending writes.
+
+    Jobs a sink gave up on, and jobs submitted while the queue is full, are kept
+    as failed writes and replayed every replay_interval seconds, so an outage of
+    a store delays writes instead of losing them. A session stays pending while
+    it has a failed write: its later jobs are held behind it and replayed after
+    it, in submission order. The ordering covers the sinks writing synchronously,
+    such as the chat session store; the vector store sink only buffers points,
+    which its own writer flushes in any order.
+    """
+
+    def __init__(self, sinks: Sequence[Callable[[PersistenceJob], None]],
+                 max_batch_size: int = settings.WRITE_BEHIND_MAX_BATCH_SIZE,
+                 max_wait_ms: float = settings.WRITE_BEHIND_MAX_WAIT_MS,
+                 max_retries: int = settings.WRITE_BEHIND_MAX_RETRIES,
+                 retry_backoff_ms: float = settings.WRITE_BEHIND_RETRY_BACKOFF_MS,
+                 max_queue_size: int = settings.WRITE_BEHIND_QUEUE_SIZE,
+                 max_failed_writes: int = settings.WRITE_BEHIND_FAILED_QUEUE_SIZE,
+                 replay_interval: float = settings.WRITE_BEHIND_REPLAY_INTERVAL):
+        """
+        Initialize the queue.
+
+        Args:
+            sinks (Sequence[Callable]): Functions writing one job, run in order
+            max_batch_size (int): Maximum number of jobs written in one batch
+            max_wait_ms (float): Maximum time to wait for more jobs before writing
+            max_retries (int): Number of retries of a failed sink before giving up
+            retry_backoff_ms (float): Initial backoff between retries, doubled each time
+            max_queue_size (int): Maximum number of pending jobs before submissions are kept as failed writes
+            max_failed_writes (int): Maximum number of failed writes kept, the oldest are dropped beyond it
+            replay_interval (float): Time between replays of the failed writes, in seconds
+        """
+        self.sinks = list(sinks)
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = max(0.0, retry_backoff_ms) / 1000.0
+        self.replay_interval = max(0.1, replay_interval)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, max_queue_size))
+        self._pending: Dict[str, int] = {}
+        self._failed: Deque[FailedWrite] = deque()
+        # Oldest failed write of each session, later jobs of the session are held behind it
+        self._held_from: Dict[str, int] = {}
+        # Orders of the jobs in the queue, oldest first
+        self._queued: Deque[int] = deque()
+        self.max_failed_writes = max(1, max_failed_writes)
+        self._next_replay = 0.0
+        self._condition = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._closed = False
+        self.metrics = {
+            "jobs_submitted": 0,
+            "jobs_written": 0,
+            "jobs_failed": 0,
+            "jobs_held": 0,
+            "jobs_rejected": 0,
+            "jobs_replayed": 0,
+            "jobs_dropped": 0,
+            "batches": 0,
+            "retries": 0,
+        }
+
+    def submit(self, job: PersistenceJob) -> None:
+        """
+        Queue a job for writing, without blocking.
+
+        If the queue is full the job is kept as a failed write and replayed later,
+        after the jobs of its session already queued.
+
+        Args:
+            job (PersistenceJob): The job to write
+        """
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Write-behind queue is closed.")
+            self._ensure_worker()
+            self._pending[job.session_id] = self._pending.get(job.session_id, 0) + 1
+            self.metrics["jobs_submitted"] += 1
+            job.order = self.metrics["jobs_submitted"]
+
+            # Never block: submit is called from the event loop on the async path
+            try:
+                self._queue.put_nowait(job)
+                self._queued.append(job.order)
+            except queue.Full:
+                self.metrics["jobs_rejected"] += 1
+                self._keep_failed(FailedWrite(job, list(self.sinks), "write-behind queue full"))
+                logger.warning(f"Write-behind queue full, keeping the writes of session {job.session_id} for replay")
+
+    def wait_for_session(self, session_id: str, timeout: Optional[float] = settings.WRITE_BEHIND_SESSION_WAIT_TIMEOUT) -> bool:
+        """
+        Wait until every pending write of a session has been applied.
+
+        Returns early if the session has a failed write, which only lands on a later replay.
+
+        Args:
+            session_id (str): The session ID
+            timeout (float, optional): Maximum time to wait, in seconds
+
+        Returns:
+            bool: True if the session has no pending writes, False on timeout or failed writes
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: not self._pending.get(session_id) or session_id in self._held_from,
+                timeout=timeout,
+            )
+            return not self._pending.get(session_id)
+
+    async def await_session(self, session_id: str, timeout: Optional[float] = settings.WRITE_BEHIND_SESSION_WAIT_TIMEOUT) -> bool:
+        """
+        Wait until every pending write of a session has been applied, without blocking the event loop.
+
+        Args:
+            session_id (str): The session ID
+            timeout (float, optional): Maximum time to wait, in seconds
+
+        Returns:
+            bool: True if the session has no pending writes, False on timeout
+        """
+        # Nothing to wait for in the common case
+        if not self._pending.get(session_id):
+            return True
+        return await asyncio.to_thread(self.wait_for_session, session_id, timeout)
+
+    def drain(self, timeout: Optional[float] = settings.WRITE_BEHIND_DRAIN_TIMEOUT) -> bool:
+        """
+        Write every pending job and stop the worker.
+
+        Args:
+            timeout (float, optional): Maximum time to wait, in seconds
+
+        Returns:
+            bool: True if every job was processed before the timeout
+        """
+        with self._condition:
+            if self._closed:
+                return True
+            self._closed = True
+            worker = self._worker
+
+        if worker is None:
+            return True
+
+        # The worker replays the failed writes a last time once the queue is empty
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.error(f"Write-behind queue did not drain within {timeout}s: the queue stayed full")
+            return False
+        worker.join(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+        if worker.is_alive():
+            logger.error(f"Write-behind queue did not drain within {timeout}s")
+            return False
+        return True
+
+    def failed_writes(self) -> List[FailedWrite]:
+        """
+        Get the writes waiting to be replayed.
+
+        Returns:
+            List[FailedWrite]: The failed writes, oldest first
+        """
+        with self._condition:
+            return list(self._failed)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the queue counters and current backlog.
+
+        Returns:
+            Dict[str, int]: Submitted, written, failed, held, batch and retry counters, plus queued and pending jobs
+        """
+        with self._condition:
+            return {
+                **self.metrics,
+                "queued": self._queue.qsize(),
+                "pending_sessions": len(self._pending),
+                "failed_writes": len(self._failed),
+            }
+
+    def _ensure_worker(self) -> None:
+        """Start the worker thread on first use. Must be called with the condition held."""
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._worker.start()
+
+    def _run(self) -> None:
+        """Worker loop collecting and writing batches."""
+        stop = False
+        while not stop:
+            self._replay_failed()
+            try:
+                # Wake up to replay the failed writes even when no job arrives
+                job = self._queue.get(timeout=self.replay_interval if self._failed else None)
+            except queue.Empty:
+                continue
+            if job is _STOP:
+                break
+            self._dequeued()
+
+            batch = [job]
+            deadline = time.monotonic() + self.max_wait
+
+            # Keep collecting until the batch is full or the wait budget is spent
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is _STOP:
+                    stop = True
+                    break
+                self._dequeued()
+                batch.append(job)
+
+            self._write_batch(batch)
+
+        self._replay_failed(force=True)
+        with self._condition:
+            if self._failed:
+                sessions = sorted({failed.job.session_id for failed in self._failed})
+                logger.error(f"Write-behind queue stopped with {len(self._failed)} failed writes of sessions {sessions}")
+                self._release([failed.job for failed in self._failed])
+                self._failed.clear()
+                self._held_from.clear()
+
+    def _write_batch(self, batch: List[PersistenceJob]) -> None:
+        """
+        Run every sink on each job of a batch, releasing the sessions waiting on the jobs written.
+
+        A job of a session with a failed write is held behind it without running
+        any sink. Once a sink gives up on a job, it is tried only once on the
+        following jobs of the batch, so an unavailable store does not stall the
+        worker while the jobs of other sessions are still written.
+
+        Args:
+            batch (List[PersistenceJob]): The jobs to write
+        """
+        given_up = set()
+        for job in batch:
+            with self._condition:
+                held = self._held_from.get(job.session_id, job.order) < job.order
+                if held:
+                    self.metrics["jobs_held"] += 1
+                    self._keep_failed(FailedWrite(job, list(self.sinks), "held behind an earlier failed write of the session"))
+            if held:
+                continue
+
+            failed = None
+            for sink in self.sinks:
+                error = self._run_with_retry(sink, job, max_retries=0 if sink in given_up else None)
+                if error is not None:
+                    given_up.add(sink)
+                    if failed is None:
+                        failed = FailedWrite(job, [], error)
+                    failed.sinks.append(sink)
+
+            with self._condition:
+                if failed is None:
+                    self.metrics["jobs_written"] += 1
+                    self._release([job])
+                else:
+                    self.metrics["jobs_failed"] += 1
+                    self._keep_failed(failed)
+
+        with self._condition:
+            self.metrics["batches"] += 1
+
+    def _run_with_retry(self, sink: Callable[[PersistenceJob], None], job: PersistenceJob,
+                        max_retries: Optional[int] = None) -> Optional[str]:
+        """
+        Run a sink on a job, retrying with exponential backoff.
+
+        Args:
+            sink (Callable): The function writing the job
+            job (PersistenceJob): The job to write
+            max_retries (int, optional): Number of retries, defaults to max_retries
+
+        Returns:
+            Optional[str]: None if the sink succeeded, otherwise the last error
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        backoff = self.retry_backoff
+        for attempt in range(max_retries + 1):
+            try:
+                with stage_timer(f"persist.{sink.__name__}"):
+                    sink(job)
+                return None
+            except Exception as e:
+                if attempt == max_retries:
+                    logger.error(f"Write-behind sink {sink.__name__} gave up on session {job.session_id}: {str(e)}")
+                    return str(e)
+                logger.warning(f"Write-behind sink {sink.__name__} failed (attempt {attempt + 1}), retrying: {str(e)}")
+                self.metrics["retries"] += 1
+                time.sleep(backoff)
+                backoff *= 2
+        return None
+
+    def _replay_failed(self, force: bool = False) -> None:
+        """
+        Run the sinks of the failed writes once more, keeping those that fail again.
+
+        Only the writes older than every queued job are replayed, oldest first,
+        and the later writes of a session failing again stay held behind it.
+
+        Args:
+            force (bool): Replay even if the replay interval has not passed
+        """
+        with self._condition:
+            if not self._failed or (not force and time.monotonic() < self._next_replay):
+                return
+            oldest_queued = self._queued[0] if self._queued else float("inf")
+            replaying = [failed for failed in self._failed if failed.job.order < oldest_queued]
+            self._failed = deque(failed for failed in self._failed if failed.job.order >= oldest_queued)
+            self._next_replay = time.monotonic() + self.replay_interval
+
+        still_failed = []
+        replayed = []
+        blocked = set()
+        for failed in replaying:
+            if failed.job.session_id in blocked:
+                still_failed.append(failed)
+                continue
+            sinks = []
+            error = failed.error
+            for sink in failed.sinks:
+                sink_error = self._run_with_retry(sink, failed.job, max_retries=0)
+                if sink_error is not None:
+                    sinks.append(sink)
+                    error = sink_error
+            if sinks:
+                still_failed.append(FailedWrite(failed.job, sinks, error))
+                blocked.add(failed.job.session_id)
+            else:
+                replayed.append(failed.job)
+
+        with self._condition:
+            self.metrics["jobs_replayed"] += len(replayed)
+            self._release(replayed)
+            self._failed = deque(sorted([*still_failed, *self._failed], key=lambda failed: failed.job.order))
+            self._trim_failed()
+            self._reset_held()
+
+    def _keep_failed(self, failed: FailedWrite) -> None:
+        """Keep a failed write for replay. Must be called with the condition held."""
+        # The first failed write waits a whole interval, so a store that just failed gets time to recover
+        if not self._failed:
+            self._next_replay = time.monotonic() + self.replay_interval
+        self._failed.append(failed)
+        # A job rejected by a full queue is newer than the queued jobs of its session that fail after it
+        if len(self._failed) > 1 and self._failed[-2].job.order > failed.job.order:
+            self._failed = deque(sorted(self._failed, key=lambda kept: kept.job.order))
+        session_id = failed.job.session_id
+        self._held_from[session_id] = min(self._held_from.get(session_id, failed.job.order), failed.job.order)
+        if self._trim_failed():
+            self._reset_held()
+
+    def _trim_failed(self) -> bool:
+        """
+        Drop the oldest failed writes beyond the limit. Must be called with the condition held.
+
+        Returns:
+            bool: True if any failed write was dropped
+        """
+        dropped_any = False
+        while len(self._failed) > self.max_failed_writes:
+            dropped = self._failed.popleft()
+            self.metrics["jobs_dropped"] += 1
+            self._release([dropped.job])
+            dropped_any = True
+            logger.error(f"Dropped the failed writes of session {dropped.job.session_id}: {dropped.error}")
+        return dropped_any
+
+    def _reset_held(self) -> None:
+        """Rebuild the oldest failed write of each session. Must be called with the condition held."""
+        self._held_from = {}
+        for failed in self._failed:
+            self._held_from.setdefault(failed.job.session_id, failed.job.order)
+
+    def _dequeued(self) -> None:
+        """Forget the oldest queued job, once the worker has taken it from the queue."""
+        with self._condition:
+            self._queued.popleft()
+
+    def _release(self, jobs: List[PersistenceJob]) -> None:
+        """Mark jobs as no longer pending and wake their waiters. Must be called with the condition held."""
+        for job in jobs:
+            remaining = self._pending.get(job.session_id, 0) - 1
+            if remaining > 0:
+                self._pending[job.session_id] = remaining
+            else:
+                self._pending.pop(job.session_id, None)
+        self._condition.notify_all()
+
+def write_session_messages(job: PersistenceJob) -> None:
+    """
+    Append the messages of a job to the chat session store in one write.
+
+    The sequence numbers are reserved once per job, so a retry writes the same
+    messages at the same place and never appends them twice.
+
+    Args:
+        job (PersistenceJob): The job to write
+    """
+    if not job.messages:
+        return
+
+    repo = ChatSessionRepository()
+    if job.reservation is None:
+        job.reservation = repo.reserve_messages(job.session_id, len(job.messages))
+        if job.reservation is None:
+            logger.warning(f"Chat session {job.session_id} not found or not migrated, dropping {len(job.messages)} messages")
+            return
+
+    repo.append_messages(job.session_id, *job.reservation, messages_to_session_records(job.messages))
+    remember_messages(job.session_id, job.messages)
+
+def write_vector_store(job: PersistenceJob) -> None:
+    """
+    Index the messages of a job through the vector store's buffered writer.
+
+    The points are only buffered here, so they are not covered by the per-session
+    ordering of the write-behind queue: the vector store flushes them in batches.
+
+    Args:
+        job (PersistenceJob): The job to write
+    """
+    vector_store = get_vector_store(collection_name="chat_messages")
+    for message in job.index_messages:
+        vector_store.buffer_message(message, job.session_id, {"timestamp": int(time.time())})
+
+_write_behind_queue: Optional[WriteBehindQueue] = None
+_write_behind_queue_lock = threading.Lock()
+
+def get_write_behind_queue() -> WriteBehindQueue:
+    """
+    Get the process-wide write-behind queue.
+
+    Returns:
+        WriteBehindQueue: The shared queue
+    """
+    global _write_behind_queue
+
+    if _write_behind_queue is None:
+        with _write_behind_queue_lock:
+            if _write_behind_queue is None:
+                _write_behind_queue = WriteBehindQueue(
+                    sinks=[write_session_messages, write_vector_store]
+                )
+                register_stats_source("write_behind_queue", _write_behind_queue.stats)
+
+    return _write_behind_queue
+
+def enqueue_message_writes(session_id: str, messages: Sequence[BaseMessage],
+                           index_messages: Optional[Sequence[BaseMessage]] = None) -> None:
+    """
+    Queue the messages of a turn to be written after the response is returned.
+
+    Args:
+        session_id (str): The session ID
+        messages (Sequence[BaseMessage]): Messages for the chat session store, usually the user and assistant pair
+        index_messages (Sequence[BaseMessage], optional): Messages to index in the vector store, defaults to messages
+    """
+    get_write_behind_queue().submit(PersistenceJob(
+        session_id=session_id,
+        messages=list(messages),
+        index_messages=list(messages if index_messages is None else index_messages),
+    ))
+
+def wait_for_session_writes(session_id: str) -> bool:
+    """
+    Wait until the previous turns of a session have been written.
+
+    Args:
+        session_id (str): The session ID
+
+    Returns:
+        bool: True if the session has no pending writes, False on timeout
+    """
+    if _write_behind_queue is None:
+        return True
+    return _write_behind_queue.wait_for_session(session_id)
+
+async def await_session_writes(session_id: str) -> bool:
+    """
+    Wait until the previous turns of a session have been written, without blocking the event loop.
+
+    Args:
+        session_id (str): The session ID
+
+    Returns:
+        bool: True if the session has no pending writes, False on timeout
+    """
+    if _write_behind_queue is None:
+        return True
+    return await _write_behind_queue.await_session(session_id)
+
+def drain_write_behind_queue() -> bool:
+    """
+    Write every pending job and stop the worker, for application shutdown.
+
+    Returns:
+        bool: True if every job was processed before the timeout
+    """
+    global _write_behind_queue
+
+    with _write_behind_queue_lock:
+        write_behind_queue = _write_behind_queue
+        _write_behind_queue = None
+
+    if write_behind_queue is None:
+        return True
+    return write_behind_queue.drain()
@@ -0,0 +1,223 @@
+"""
+In-process LRU cache with idle TTL and size accounting.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+class LRUTTLCache(Generic[V]):
+    """
+    Thread-safe LRU cache bounded by entry count, total size and idle time.
+    
+    Each entry carries an approximate size in bytes supplied by the caller. When
+    either the entry or the byte budget is exceeded, the least recently used
+    entries are evicted; entries not read or written for ttl_seconds expire. An
+    entry larger than the whole byte budget is never kept.
+    """
+    
+    def __init__(self, max_entries: int, max_bytes: int = 0, ttl_seconds: float = 0,
+                 on_evict: Optional[Callable[[Hashable, V], None]] = None):
+        """
+        Initialize the cache.
+        
+        Args:
+            max_entries (int): Maximum number of entries
+            max_bytes (int): Maximum total size of the entries, 0 for no limit
+            ttl_seconds (float): Idle time after which an entry expires, 0 for no expiry
+            on_evict (Callable, optional): Called with the key and value of every evicted, expired or invalidated entry
+        """
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(0, max_bytes)
+        self.ttl_seconds = max(0.0, ttl_seconds)
+        self.on_evict = on_evict
+        # key -> (value, size, last access time), least recently used first
+        self._entries: "OrderedDict[Hashable, Tuple[V, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+            "rejections": 0,
+        }
+    
+    def get(self, key: Hashable) -> Optional[V]:
+        """
+        Get an entry and mark it as recently used.
+        
+        Args:
+            key (Hashable): The entry key
+        
+        Returns:
+            Optional[V]: The value, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry is None:
+                self.metrics["misses"] += 1
+                return None
+            if self._is_expired(entry, now):
+                self._remove(key, "expirations")
+                self.metrics["misses"] += 1
+                return None
+            
+            value, size, _ = entry
+            self._entries[key] = (value, size, now)
+            self._entries.move_to_end(key)
+            self.metrics["hits"] += 1
+            return value
+    
+    def peek(self, key: Hashable) -> Optional[V]:
+        """
+        Get an entry without marking it as used or counting a hit or miss.
+        
+        Args:
+            key (Hashable): The entry key
+        
+        Returns:
+            Optional[V]: The value, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._is_expired(entry, time.monotonic()):
+                return None
+            return entry[0]
+    
+    def set(self, key: Hashable, value: V, size: int = 0) -> None:
+        """
+        Add or replace an entry, evicting others if the cache is over budget.
+        
+        An entry larger than max_bytes is not stored, and replaces nothing: any
+        previous value of the key is removed.
+        
+        Args:
+            key (Hashable): The entry key
+            value (V): The value
+            size (int): Approximate size of the value in bytes
+        """
+        with self._lock:
+            if self.max_bytes and size > self.max_bytes:
+                if key in self._entries:
+                    self._remove(key, "invalidations")
+                self.metrics["rejections"] += 1
+                return
+            if key in self._entries:
+                self._bytes -= self._entries[key][1]
+            self._entries[key] = (value, max(0, size), time.monotonic())
+            self._entries.move_to_end(key)
+            self._bytes += max(0, size)
+            self._enforce_limits()
+    
+    def resize(self, key: Hashable, delta: int) -> None:
+        """
+        Adjust the recorded size of an entry after its value grew or shrank in place.
+        
+        An entry growing beyond max_bytes is evicted.
+        
+        Args:
+            key (Hashable): The entry key
+            delta (int): Change of the size in bytes
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            value, size, accessed_at = entry
+            new_size = max(0, size + delta)
+            if self.max_bytes and new_size > self.max_bytes:
+                self._remove(key, "evictions")
+                return
+            self._entries[key] = (value, new_size, accessed_at)
+            self._bytes += new_size - size
+            self._enforce_limits()
+    
+    def invalidate(self, key: Hashable) -> bool:
+        """
+        Remove an entry.
+        
+        Args:
+            key (Hashable): The entry key
+        
+        Returns:
+            bool: True if the entry was cached
+        """
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._remove(key, "invalidations")
+            return True
+    
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key, "invalidations")
+    
+    def purge_expired(self) -> int:
+        """
+        Remove the entries whose idle TTL has passed.
+        
+        Returns:
+            int: Number of entries removed
+        """
+        if not self.ttl_seconds:
+            return 0
+        
+        with self._lock:
+            now = time.monotonic()
+            expired = [key for key, entry in self._entries.items() if self._is_expired(entry, now)]
+            for key in expired:
+                self._remove(key, "expirations")
+            return len(expired)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get the cache counters and current usage.
+        
+        Returns:
+            Dict[str, Any]: Counters plus entry count and total size in bytes
+        """
+        with self._lock:
+            return {**self.metrics, "entries": len(self._entries), "bytes": self._bytes}
+    
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and not self._is_expired(entry, time.monotonic())
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+    
+    def _is_expired(self, entry: Tuple[V, int, float], now: float) -> bool:
+        """Whether an entry has been idle for longer than the TTL."""
+        return bool(self.ttl_seconds) and now - entry[2] > self.ttl_seconds
+    
+    def _enforce_limits(self) -> None:
+        """Expire idle entries, then evict least recently used ones until within budget. Lock must be held."""
+        now = time.monotonic()
+        # Entries are ordered by last access, so expired ones are at the front
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if not self._is_expired(entry, now):
+                break
+            self._remove(key, "expirations")
+        
+        while len(self._entries) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes and self._entries):
+            key = next(iter(self._entries))
+            self._remove(key, "evictions")
+    
+    def _remove(self, key: Hashable, reason: str) -> None:
+        """Remove an entry and count why. Lock must be held."""
+        value, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        self.metrics[reason] += 1
+        if self.on_evict is not None:
+            self.on_evict(key, value)
@@ -1,11 +1,28 @@
-class MiaSystemPromptGenerator:
-    def generate_system_prompt():
-        """
-        Tạo prompt dựa trên thông tin nhân vật, giúp AI thể hiện rõ nét tính cách và cảm xúc.
+"""
+System prompts of the chatbot, compiled once per process.
 
-        :return: Chuỗi prompt hoàn chỉnh
-        """
-        system_prompt = f"""Bạn là một AI đóng vai nhân vật với các thông tin sau:
+Each prompt has a version and a content hash; the hash changes with any edit of
+the text, so it can be used as a cache key for answers generated with the prompt.
+"""
+
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+from langchain_core.messages import BaseMessage
+from app.config.config import PROMPT_CONTEXT_MAX_TOKENS, PROMPT_CONTEXT_MAX_MESSAGE_CHARS, PROMPT_TOKEN_ENCODING
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Prompt names
+MIA_SYSTEM_PROMPT = "mia_system"
+SIMPLE_CHAT_SYSTEM_PROMPT = "simple_chat_system"
+
+# Approximate characters per token when no tokenizer is available
+CHARS_PER_TOKEN = 3
+
+_MIA_SYSTEM_PROMPT_TEXT = """Bạn là một AI đóng vai nhân vật với các thông tin sau:
 1. **Tên**: mIA
 2. **Nghề nghiệp**: Giáo viên tiếng Trung
 3. **Vai trò**: Hỗ trợ người học về lí thuyết, từ vựng, ngữ pháp, giải thích các câu hỏi của người dùng
@@ -24,9 +41,175 @@ class MiaSystemPromptGenerator:
 - Trả lời linh hoạt theo ngôn ngữ mà người dùng đã nói, không được trả lời bằng ngôn ngữ khác.
 - Nội dung không được vượt quá 100 từ.
 ### Hãy bắt đầu cuộc trò chuyện với sự nhập vai chân thực nhất!"""
-        return system_prompt
 
-    def generate_context_prompt():
-        context_prompt = f"""\nThông tin về câu hỏi của tôi và câu trả lời trước đó của AI:"""
-        return context_prompt
+_MIA_CONTEXT_PROMPT_TEXT = """\nThông tin về câu hỏi của tôi và câu trả lời trước đó của AI:"""
+
+_SIMPLE_CHAT_SYSTEM_PROMPT_TEXT = """You are a friendly and helpful HSK chatbot assistant. Your name is "mIA"
+    Please respond in the same language as the user's input.
+    You specialize in teaching Chinese (HSK) and can help with vocabulary, grammar, and language learning."""
+
+# name -> (version, text); bump the version when the wording changes on purpose
+_PROMPT_SOURCES: Dict[str, Tuple[str, str]] = {
+    MIA_SYSTEM_PROMPT: ("1", _MIA_SYSTEM_PROMPT_TEXT),
+    SIMPLE_CHAT_SYSTEM_PROMPT: ("1", _SIMPLE_CHAT_SYSTEM_PROMPT_TEXT),
+}
+
+# Compiled prompts and the tokenizer, built once per process
+_compiled_prompts: Dict[str, "CompiledPrompt"] = {}
+_compiled_prompts_lock = threading.Lock()
+_encoding = None
+_encoding_loaded = False
+
+class CompiledPrompt(NamedTuple):
+    """A system prompt ready to be sent, with its version and content hash."""
+
+    name: str
+    version: str
+    text: str
+    hash: str
+    tokens: int
+
+    @property
+    def cache_key(self) -> str:
+        """Key identifying this exact prompt, for caches of generated answers."""
+        return f"{self.name}@{self.version}:{self.hash}"
+
+def _get_encoding():
+    """Get the tiktoken encoding, or None if it cannot be loaded."""
+    global _encoding, _encoding_loaded
+
+    if not _encoding_loaded:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(PROMPT_TOKEN_ENCODING)
+        except Exception as e:
+            logger.warning(f"Could not load tiktoken encoding {PROMPT_TOKEN_ENCODING}, estimating prompt tokens: {e}")
+            _encoding = None
+        _encoding_loaded = True
+
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a text.
+
+    Args:
+        text (str): The text
+
+    Returns:
+        int: Number of tokens, estimated from the length if no tokenizer is available
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def compile_prompts() -> Dict[str, CompiledPrompt]:
+    """
+    Compile every system prompt and load the tokenizer.
 
+    Called at startup so the first request does not pay for it; later calls
+    return the already compiled prompts.
+
+    Returns:
+        Dict[str, CompiledPrompt]: The compiled prompts by name
+    """
+    with _compiled_prompts_lock:
+        for name, (version, text) in _PROMPT_SOURCES.items():
+            if name not in _compiled_prompts:
+                _compiled_prompts[name] = CompiledPrompt(
+                    name=name,
+                    version=version,
+                    text=text,
+                    hash=hashlib.sha256(text.encode("utf-8")).hexdigest()[:12],
+                    tokens=count_tokens(text)
+                )
+        return dict(_compiled_prompts)
+
+def get_compiled_prompt(name: str) -> CompiledPrompt:
+    """
+    Get a compiled system prompt.
+
+    Args:
+        name (str): Name of the prompt
+
+    Returns:
+        CompiledPrompt: The compiled prompt
+
+    Raises:
+        KeyError: If no prompt has this name
+    """
+    prompt = _compiled_prompts.get(name)
+    if prompt is None:
+        prompt = compile_prompts()[name]
+    return prompt
+
+def _clip(text: str, max_chars: int) -> str:
+    """Shorten a text to max_chars characters, marking the cut."""
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max(0, max_chars - 1)].rstrip() + "…"
+
+def _interleave(first: List[BaseMessage], second: List[BaseMessage]) -> Iterable[Tuple[int, BaseMessage]]:
+    """Yield (list index, message) pairs alternating between two relevance-ordered lists."""
+    for position in range(max(len(first), len(second))):
+        if position < len(first):
+            yield 0, first[position]
+        if position < len(second):
+            yield 1, second[position]
+
+def build_context_block(similar_human_messages: List[BaseMessage], similar_ai_messages: List[BaseMessage],
+                        max_tokens: int = PROMPT_CONTEXT_MAX_TOKENS,
+                        max_message_chars: int = PROMPT_CONTEXT_MAX_MESSAGE_CHARS) -> str:
+    """
+    Build the context block of similar previous messages appended to the system prompt.
+
+    Messages are clipped to max_message_chars characters and taken alternately
+    from the two lists, most similar first, until the token budget is spent.
+
+    Args:
+        similar_human_messages (List[BaseMessage]): Similar previous user messages, most similar first
+        similar_ai_messages (List[BaseMessage]): Similar previous AI messages, most similar first
+        max_tokens (int): Maximum number of tokens of the block
+        max_message_chars (int): Maximum number of characters kept of each message
+
+    Returns:
+        str: The context block, or an empty string if no message fits
+    """
+    sections = ("\n- Questions:", "\n- AI:")
+    budget = max_tokens - count_tokens(_MIA_CONTEXT_PROMPT_TEXT) - sum(count_tokens(section) for section in sections)
+
+    selected: Tuple[List[str], List[str]] = ([], [])
+    for kind, message in _interleave(similar_human_messages, similar_ai_messages):
+        content = getattr(message, "content", None)
+        if not content:
+            continue
+        line = f"\n+ {_clip(content, max_message_chars)}"
+        cost = count_tokens(line)
+        if cost > budget:
+            continue
+        selected[kind].append(line)
+        budget -= cost
+
+    if not selected[0] and not selected[1]:
+        return ""
+
+    parts = [_MIA_CONTEXT_PROMPT_TEXT]
+    for section, lines in zip(sections, selected):
+        if lines:
+            parts.append(section)
+            parts.extend(lines)
+    return "".join(parts)
+
+class MiaSystemPromptGenerator:
+    def generate_system_prompt():
+        """
+        Tạo prompt dựa trên thông tin nhân vật, giúp AI thể hiện rõ nét tính cách và cảm xúc.
+
+        :return: Chuỗi prompt hoàn chỉnh (đã được biên dịch sẵn một lần)
+        """
+        return get_compiled_prompt(MIA_SYSTEM_PROMPT).text
+
+    def generate_context_prompt():
+        return _MIA_CONTEXT_PROMPT_TEXT
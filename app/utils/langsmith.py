@@ -1,6 +1,7 @@
 from langsmith import Client
 from langchain_core.tracers import LangChainTracer
 import logging
+import threading
 from app.config.config import (
     LANGSMITH_API_KEY, 
     LANGSMITH_PROJECT, 
@@ -72,4 +73,26 @@ def get_langsmith_tracer(run_name=None):
     """
     # In newer versions, LangSmithTracer doesn't exist separately
     # We'll use LangChainTracer for both cases
-    return get_langchain_tracer(run_name) 
\ No newline at end of file
+    return get_langchain_tracer(run_name) 
+# Shared tracer reused by every run; per-run names and metadata go through the invoke config
+_shared_tracer = None
+_shared_tracer_lock = threading.Lock()
+
+def get_shared_langchain_tracer():
+    """
+    Returns the process-wide LangChain tracer, creating it on first use
+    
+    Returns:
+        LangChainTracer or None: Shared tracer, or None if tracing is disabled
+    """
+    global _shared_tracer
+    
+    if not LANGSMITH_TRACING or not LANGSMITH_API_KEY:
+        return None
+    
+    if _shared_tracer is None:
+        with _shared_tracer_lock:
+            if _shared_tracer is None:
+                _shared_tracer = get_langchain_tracer()
+    
+    return _shared_tracer
@@ -1,26 +1,19 @@
-from pymongo import MongoClient
-from app.config.config import MONGODB_URI, MONGODB_DB_NAME
+from app.repositories.mongodb import get_mongodb_client as _get_shared_mongodb_client, get_database as _get_shared_database
 
 def get_mongodb_client():
     """
-    Returns a MongoDB client instance.
+    Returns the shared MongoDB client instance.
+    
+    The client is owned by the process-wide connection manager in
+    app.repositories.mongodb; this function no longer opens a new one per call.
     """
-    try:
-        client = MongoClient(MONGODB_URI)
-        # Test connection
-        client.admin.command('ping')
-        print("Connected to MongoDB successfully!")
-        return client
-    except Exception as e:
-        print(f"Failed to connect to MongoDB: {e}")
-        raise
+    return _get_shared_mongodb_client()
 
 def get_database():
     """
     Returns the database instance.
     """
-    client = get_mongodb_client()
-    return client[MONGODB_DB_NAME]
+    return _get_shared_database()
 
 def get_collection(collection_name):
     """
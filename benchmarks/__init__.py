@@ -0,0 +1,5 @@
+"""
+Offline benchmarks of the chat pipeline.
+
+Run with `python -m benchmarks.run`; see the Benchmarks section of the README.
+"""
@@ -0,0 +1,79 @@
+"""
+Compare two benchmark result files.
+
+    python -m benchmarks.compare base.json head.json [--threshold 0.1]
+
+Results are matched by benchmark name and parameters. The command exits with
+status 1 if the p50 latency of any benchmark grew by more than the threshold.
+"""
+
+import sys
+import json
+import argparse
+from typing import Any, Dict, Tuple
+
+def _key(result: Dict[str, Any]) -> Tuple[str, str]:
+    """Identify a result by its benchmark and parameters."""
+    return result["benchmark"], json.dumps(result["params"], sort_keys=True)
+
+def _change(base: float, head: float) -> float:
+    """Relative change from base to head, 0 if base is 0."""
+    return (head - base) / base if base else 0.0
+
+def compare(base: Dict[str, Any], head: Dict[str, Any], threshold: float) -> bool:
+    """
+    Print the latency and throughput changes between two runs.
+    
+    Args:
+        base (Dict[str, Any]): The reference run
+        head (Dict[str, Any]): The run to check
+        threshold (float): Relative p50 increase counted as a regression
+    
+    Returns:
+        bool: True if no benchmark regressed
+    """
+    base_results = {_key(result): result for result in base["results"]}
+    print(f"base {base['meta'].get('commit')} -> head {head['meta'].get('commit')}")
+    print(f"{'benchmark':<40} {'params':<45} {'p50 ms':>20} {'p99 ms':>20} {'calls/s':>20}")
+    
+    ok = True
+    for result in head["results"]:
+        key = _key(result)
+        reference = base_results.get(key)
+        if reference is None:
+            print(f"{key[0]:<40} {key[1]:<45} {'(new)':>20}")
+            continue
+        
+        columns = []
+        for before, after in (
+            (reference["latency_ms"]["p50"], result["latency_ms"]["p50"]),
+            (reference["latency_ms"]["p99"], result["latency_ms"]["p99"]),
+            (reference["throughput_per_s"], result["throughput_per_s"]),
+        ):
+            columns.append(f"{after:.2f} ({_change(before, after):+.0%})")
+        
+        regressed = _change(reference["latency_ms"]["p50"], result["latency_ms"]["p50"]) > threshold
+        ok = ok and not regressed
+        marker = "  REGRESSION" if regressed else ""
+        print(f"{key[0]:<40} {key[1]:<45} {columns[0]:>20} {columns[1]:>20} {columns[2]:>20}{marker}")
+    
+    return ok
+
+def main() -> None:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("base", help="Results of the reference commit")
+    parser.add_argument("head", help="Results of the commit to check")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative p50 latency increase reported as a regression")
+    args = parser.parse_args()
+    
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.head, encoding="utf-8") as f:
+        head = json.load(f)
+    
+    sys.exit(0 if compare(base, head, args.threshold) else 1)
+
+if __name__ == "__main__":
+    main()
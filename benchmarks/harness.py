@@ -0,0 +1,145 @@
+"""
+Timing helpers of the benchmarks.
+"""
+
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+def percentile(sorted_samples: List[float], fraction: float) -> float:
+    """
+    Get a percentile of sorted samples by linear interpolation.
+    
+    Args:
+        sorted_samples (List[float]): The samples, in ascending order
+        fraction (float): The percentile, between 0 and 1
+    
+    Returns:
+        float: The percentile, 0 if there are no samples
+    """
+    if not sorted_samples:
+        return 0.0
+    position = (len(sorted_samples) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_samples) - 1)
+    return sorted_samples[lower] + (sorted_samples[upper] - sorted_samples[lower]) * (position - lower)
+
+def summarize(samples: List[float], wall_seconds: float, errors: int = 0, first_error: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Summarize the latencies of a benchmark.
+    
+    Args:
+        samples (List[float]): Duration of each successful call in seconds
+        wall_seconds (float): Duration of the whole measurement
+        errors (int): Number of failed calls
+        first_error (str, optional): Message of the first failure
+    
+    Returns:
+        Dict[str, Any]: Call counts, latency statistics in milliseconds and throughput in calls per second
+    """
+    ordered = sorted(samples)
+    summary = {
+        "calls": len(samples),
+        "errors": errors,
+        "latency_ms": {
+            "mean": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+            "min": round(ordered[0] * 1000, 3) if ordered else 0.0,
+            "p50": round(percentile(ordered, 0.50) * 1000, 3),
+            "p90": round(percentile(ordered, 0.90) * 1000, 3),
+            "p99": round(percentile(ordered, 0.99) * 1000, 3),
+            "max": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        },
+        "throughput_per_s": round(len(samples) / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+    }
+    if first_error:
+        summary["first_error"] = first_error
+    return summary
+
+def measure(fn: Callable[[int], Any], iterations: int, warmup: int = 0) -> Dict[str, Any]:
+    """
+    Time sequential calls of a function.
+    
+    Args:
+        fn (Callable[[int], Any]): The benchmarked call, given the iteration number
+        iterations (int): Number of measured calls
+        warmup (int): Number of calls made before measuring
+    
+    Returns:
+        Dict[str, Any]: The summary of the measured calls
+    """
+    for i in range(warmup):
+        fn(-1 - i)
+    
+    samples: List[float] = []
+    errors = 0
+    first_error = None
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        try:
+            fn(i)
+        except Exception as e:
+            errors += 1
+            first_error = first_error or f"{type(e).__name__}: {str(e)}"
+            continue
+        samples.append(time.perf_counter() - call_started)
+    
+    return summarize(samples, time.perf_counter() - started, errors, first_error)
+
+async def ameasure(fn: Callable[[int, int], Awaitable[Any]], iterations: int, warmup: int = 0,
+                   concurrency: int = 1) -> Dict[str, Any]:
+    """
+    Time calls of a coroutine function made by concurrent workers.
+    
+    Args:
+        fn (Callable[[int, int], Awaitable[Any]]): The benchmarked call, given the iteration and worker numbers
+        iterations (int): Number of measured calls, shared by the workers
+        warmup (int): Number of calls made by each worker before measuring
+        concurrency (int): Number of workers
+    
+    Returns:
+        Dict[str, Any]: The summary of the measured calls, with the concurrency
+    """
+    concurrency = max(1, concurrency)
+    await asyncio.gather(*(fn(-1 - i, worker) for worker in range(concurrency) for i in range(warmup)))
+    
+    samples: List[float] = []
+    failures: List[str] = []
+    next_iteration = iter(range(iterations))
+    
+    async def worker(worker_number: int) -> None:
+        for i in next_iteration:
+            call_started = time.perf_counter()
+            try:
+                await fn(i, worker_number)
+            except Exception as e:
+                failures.append(f"{type(e).__name__}: {str(e)}")
+                continue
+            samples.append(time.perf_counter() - call_started)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(number) for number in range(concurrency)))
+    summary = summarize(samples, time.perf_counter() - started, len(failures), failures[0] if failures else None)
+    summary["concurrency"] = concurrency
+    return summary
+
+def record(results: List[Dict[str, Any]], benchmark: str, params: Dict[str, Any], summary: Dict[str, Any]) -> None:
+    """
+    Add a benchmark result and log it.
+    
+    Args:
+        results (List[Dict[str, Any]]): The results of the run
+        benchmark (str): Name of the benchmark
+        params (Dict[str, Any]): Parameters of the measurement
+        summary (Dict[str, Any]): The summary returned by measure or ameasure
+    """
+    results.append({"benchmark": benchmark, "params": params, **summary})
+    latency = summary["latency_ms"]
+    logger.info(
+        f"{benchmark} {params}: p50={latency['p50']}ms p99={latency['p99']}ms "
+        f"throughput={summary['throughput_per_s']}/s errors={summary['errors']}"
+    )
@@ -0,0 +1,135 @@
+"""
+Run the offline benchmarks of the chat pipeline and write the results as JSON.
+
+    python -m benchmarks.run [--suites vector_store,history,graph,api] [--session-lengths 10,100,1000]
+                             [--collection-sizes 1000,10000] [--iterations 50] [--output results.json]
+
+Every external service is replaced by a local stand-in (see benchmarks.standins),
+so the results measure the overhead of the service itself. Compare two runs with
+`python -m benchmarks.compare`.
+"""
+
+import sys
+import json
+import asyncio
+import argparse
+import logging
+import platform
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from benchmarks.standins import configure_environment, install_standins
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+SUITES = ("vector_store", "history", "graph", "api")
+
+def _int_list(value: str) -> List[int]:
+    """Parse a comma-separated list of integers."""
+    return [int(item) for item in value.split(",") if item.strip()]
+
+def _git_commit() -> Optional[str]:
+    """Get the commit the benchmarks run on, None outside a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def run_benchmarks(args: argparse.Namespace, standins: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run the selected suites.
+    
+    Args:
+        args (argparse.Namespace): The command-line arguments
+        standins (Dict[str, Any]): Description of the installed stand-ins
+    
+    Returns:
+        Dict[str, Any]: The run metadata and the results
+    """
+    from benchmarks.suites import bench_api, bench_graph, bench_history, bench_vector_store
+    from app.core.init import shutdown_application
+    
+    results: List[Dict[str, Any]] = []
+    started_at = datetime.now(timezone.utc)
+    try:
+        if "vector_store" in args.suites:
+            bench_vector_store(results, args.collection_sizes, args.iterations, args.warmup)
+        if "history" in args.suites:
+            bench_history(results, args.session_lengths, args.iterations, args.warmup)
+        if "graph" in args.suites:
+            bench_graph(results, args.session_lengths, args.iterations, args.warmup)
+        if "api" in args.suites:
+            asyncio.run(bench_api(results, args.session_lengths, args.concurrency, args.iterations, args.warmup))
+    finally:
+        shutdown_application()
+    
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "started_at": started_at.isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "standins": standins,
+            "config": {
+                "suites": args.suites,
+                "session_lengths": args.session_lengths,
+                "collection_sizes": args.collection_sizes,
+                "concurrency": args.concurrency,
+                "iterations": args.iterations,
+                "warmup": args.warmup,
+                "llm_latency_ms": args.llm_latency_ms,
+                "llm_jitter_ms": args.llm_jitter_ms,
+                "llm_tokens_per_second": args.llm_tokens_per_second,
+            },
+        },
+        "results": results,
+    }
+
+def main() -> None:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Run the offline benchmarks of the chat pipeline.")
+    parser.add_argument("--suites", type=lambda value: value.split(","), default=list(SUITES),
+                        help=f"Comma-separated suites to run, from {','.join(SUITES)}")
+    parser.add_argument("--session-lengths", type=_int_list, default=[10, 100, 1000],
+                        help="Messages per session for the history, graph and api suites")
+    parser.add_argument("--collection-sizes", type=_int_list, default=[1000, 10000],
+                        help="Points per collection for the vector_store suite")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 8],
+                        help="Concurrent clients for the api suite")
+    parser.add_argument("--iterations", type=int, default=50, help="Measured calls per benchmark")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured calls before each benchmark")
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="Time to first token of the fake LLM")
+    parser.add_argument("--llm-jitter-ms", type=float, default=0, help="Standard deviation of that time")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0,
+                        help="Generation rate of the fake LLM, 0 for no delay")
+    parser.add_argument("--embeddings", choices=["hash", "model"], default="hash",
+                        help="Hash model behind the real embedding batcher, or the configured embedding model")
+    parser.add_argument("--mongodb-uri", default=None, help="Local MongoDB server to use instead of mongomock")
+    parser.add_argument("--output", default=None, help="File to write the JSON results to (default: stdout)")
+    args = parser.parse_args()
+    
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"Unknown suites: {', '.join(sorted(unknown))}")
+    
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    
+    # The settings are read at import time, so the environment comes first
+    configure_environment(args.llm_latency_ms, args.llm_jitter_ms, args.llm_tokens_per_second, args.mongodb_uri)
+    standins = install_standins(mongodb_uri=args.mongodb_uri, embeddings=args.embeddings)
+    
+    report = run_benchmarks(args, standins)
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        logger.info(f"Wrote {len(report['results'])} results to {args.output}")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
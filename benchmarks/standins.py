@@ -0,0 +1,161 @@
+"""
+Local stand-ins for the services used by the chat pipeline.
+
+Qdrant runs in process (qdrant-client local mode) and MongoDB is replaced by
+mongomock unless a local server is given. The LLM is the fake provider. Unless
+the real model is requested, the sentence_transformers model is replaced by a
+deterministic hash model, so no model download is needed; embedding still goes
+through the app's embeddings wrapper and micro-batcher.
+
+The settings are read when the app modules are imported, so configure_environment
+must run before any of them is imported.
+"""
+
+import hashlib
+import os
+from typing import Any, Dict, List, Optional
+
+# Settings applied to every benchmark run
+BENCHMARK_ENV = {
+    "FAKE_LLM_ENABLED": "true",
+    "FAKE_LLM_ERROR_RATE": "0",
+    "LANGSMITH_TRACING": "false",
+    "TRACING_ENABLED": "false",
+    "MONGODB_DB_NAME": "hsk_chatbot_benchmark",
+    "QDRANT_COLLECTION_NAME": "hsk-chatbot-benchmark",
+}
+
+# Size of the vectors of the hash embeddings, the same as the default sentence-transformers model
+HASH_EMBEDDING_SIZE = 384
+
+class HashSentenceTransformer:
+    """
+    Stand-in for a sentence_transformers model returning deterministic hash vectors.
+    
+    The same text always gets the same vector, and different texts get unrelated ones.
+    """
+    
+    def __init__(self, model_name_or_path: Optional[str] = None, *args: Any, **kwargs: Any):
+        """
+        Initialize the model.
+        
+        Args:
+            model_name_or_path (str, optional): Name of the model it stands in for
+        """
+        self.model_name = model_name_or_path
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        """Dimension of the vectors."""
+        return HASH_EMBEDDING_SIZE
+    
+    def encode(self, sentences: List[str], batch_size: int = 32, convert_to_numpy: bool = True,
+               show_progress_bar: bool = False, **kwargs: Any) -> Any:
+        """
+        Embed texts.
+        
+        Args:
+            sentences (List[str]): Texts to embed
+            batch_size (int): Ignored
+            convert_to_numpy (bool): Ignored, an array is always returned
+            show_progress_bar (bool): Ignored
+        
+        Returns:
+            np.ndarray: Float32 array of shape (len(sentences), HASH_EMBEDDING_SIZE)
+        """
+        import numpy as np
+        
+        vectors = np.empty((len(sentences), HASH_EMBEDDING_SIZE), dtype=np.float32)
+        for row, text in enumerate(sentences):
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vectors[row] = np.random.default_rng(seed).standard_normal(HASH_EMBEDDING_SIZE)
+        return vectors
+
+class SyncBackedAsyncQdrantClient:
+    """
+    Asynchronous facade over a synchronous Qdrant client.
+    
+    Two local-mode clients do not share their data, so the asynchronous pipeline
+    is given this facade over the in-process client used by the synchronous one.
+    """
+    
+    def __init__(self, client: Any):
+        """
+        Initialize the facade.
+        
+        Args:
+            client (QdrantClient): The client the calls are forwarded to
+        """
+        self._client = client
+    
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._client, name)
+        if not callable(attribute):
+            return attribute
+        
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            return attribute(*args, **kwargs)
+        
+        return call
+    
+    async def close(self) -> None:
+        """The shared client is closed through the synchronous side."""
+
+def configure_environment(llm_latency_ms: float = 0, llm_jitter_ms: float = 0, llm_tokens_per_second: float = 0,
+                          mongodb_uri: Optional[str] = None) -> None:
+    """
+    Set the environment of a benchmark run.
+    
+    Args:
+        llm_latency_ms (float): Mean time to the first token of the fake LLM
+        llm_jitter_ms (float): Standard deviation of that time
+        llm_tokens_per_second (float): Streaming rate of the fake LLM, 0 for no delay
+        mongodb_uri (str, optional): URI of a local MongoDB server, None to use mongomock
+    """
+    os.environ.update(BENCHMARK_ENV)
+    os.environ["FAKE_LLM_LATENCY_DISTRIBUTION"] = "normal" if llm_jitter_ms > 0 else "fixed"
+    os.environ["FAKE_LLM_LATENCY_MS"] = str(llm_latency_ms)
+    os.environ["FAKE_LLM_LATENCY_JITTER_MS"] = str(llm_jitter_ms)
+    os.environ["FAKE_LLM_TOKENS_PER_SECOND"] = str(llm_tokens_per_second)
+    if mongodb_uri:
+        os.environ["MONGODB_URI"] = mongodb_uri
+
+def install_standins(mongodb_uri: Optional[str] = None, embeddings: str = "hash") -> Dict[str, Any]:
+    """
+    Point the app at the local stand-ins.
+    
+    Args:
+        mongodb_uri (str, optional): URI of a local MongoDB server, None to use mongomock
+        embeddings (str): "hash" to replace the embedding model by a hash model, "model" for the configured model
+    
+    Returns:
+        Dict[str, Any]: Description of the stand-ins, recorded with the results
+    """
+    from qdrant_client import QdrantClient
+    from app.models import embedding as embedding_module
+    from app.models import vector_store as vector_store_module
+    from app.repositories import mongodb as mongodb_module
+    
+    # One in-process Qdrant shared by every vector store, synchronous and asynchronous
+    qdrant = QdrantClient(location=":memory:")
+    vector_store_module.QdrantClient = lambda *args, **kwargs: qdrant
+    vector_store_module.AsyncQdrantClient = lambda *args, **kwargs: SyncBackedAsyncQdrantClient(qdrant)
+    
+    if mongodb_uri is None:
+        import mongomock
+        from mongomock_motor import AsyncMongoMockClient
+        
+        # The asynchronous client wraps the synchronous one, so both see the same data
+        mongo = mongomock.MongoClient()
+        mongodb_module.MongoClient = lambda *args, **kwargs: mongo
+        mongodb_module.AsyncIOMotorClient = lambda *args, **kwargs: AsyncMongoMockClient(mock_mongo_client=mongo)
+    
+    if embeddings == "hash":
+        # Only the model is replaced, so the embeddings wrapper and its batcher are still measured
+        embedding_module.SentenceTransformer = HashSentenceTransformer
+    
+    return {
+        "qdrant": "in-memory",
+        "mongodb": mongodb_uri or "mongomock",
+        "llm": "fake",
+        "embeddings": embeddings,
+    }
@@ -0,0 +1,182 @@
+"""
+Benchmark suites of the chat pipeline.
+
+Each suite seeds the stand-ins with sessions or collections of the requested
+sizes and times one entry point, adding its results to the list it is given.
+App modules are imported inside the suites, after the stand-ins are installed.
+"""
+
+import time
+import uuid
+from typing import Any, Dict, List, Sequence
+
+from benchmarks.harness import ameasure, measure, record
+
+# Messages written per call while seeding
+SEED_BATCH_SIZE = 256
+
+# Messages of each session of the collection-size benchmarks
+COLLECTION_SESSION_LENGTH = 100
+
+def conversation(length: int, topic: str) -> List[Any]:
+    """
+    Build a deterministic conversation alternating user and assistant messages.
+    
+    Args:
+        length (int): Number of messages
+        topic (str): Text making the conversation distinct from the others
+    
+    Returns:
+        List[BaseMessage]: The messages, oldest first
+    """
+    from langchain_core.messages import AIMessage, HumanMessage
+    
+    return [
+        HumanMessage(content=f"Câu hỏi {i} về từ vựng HSK, chủ đề {topic}")
+        if i % 2 == 0 else
+        AIMessage(content=f"Câu trả lời {i}: ví dụ và giải thích ngữ pháp cho chủ đề {topic}")
+        for i in range(length)
+    ]
+
+def seed_vectors(vector_store: Any, session_id: str, messages: Sequence[Any]) -> None:
+    """
+    Write the messages of a session to the vector store in batches.
+    
+    Args:
+        vector_store (MessageVectorStore): The vector store
+        session_id (str): The session ID
+        messages (Sequence[BaseMessage]): The messages
+    """
+    from app.models.vector_store import PendingVectorWrite
+    
+    timestamp = int(time.time())
+    for start in range(0, len(messages), SEED_BATCH_SIZE):
+        vector_store.add_messages([
+            PendingVectorWrite(message, session_id, {"timestamp": timestamp}, None)
+            for message in messages[start:start + SEED_BATCH_SIZE]
+        ])
+
+def seed_session(length: int, vector_store: Any = None) -> str:
+    """
+    Create a session holding a conversation of the given length.
+    
+    Args:
+        length (int): Number of messages of the session
+        vector_store (MessageVectorStore, optional): If provided, the messages are indexed too
+    
+    Returns:
+        str: The session ID
+    """
+    from app.enum.model import ModelProvider
+    from app.models.memory import messages_to_session_records
+    from app.repositories.chat_session import ChatSessionRepository
+    
+    repo = ChatSessionRepository()
+    session_id = repo.create_session(model_provider=ModelProvider.FAKE)
+    messages = conversation(length, session_id)
+    for start in range(0, len(messages), SEED_BATCH_SIZE):
+        repo.save_messages(session_id, messages_to_session_records(messages[start:start + SEED_BATCH_SIZE]))
+    
+    if vector_store is not None:
+        seed_vectors(vector_store, session_id, messages)
+    return session_id
+
+def bench_vector_store(results: List[Dict[str, Any]], collection_sizes: Sequence[int], iterations: int, warmup: int) -> None:
+    """
+    Time MessageVectorStore.add_message and search_similar_messages at each collection size.
+    
+    Searches are timed scoped to one session, as the chat pipeline does, and over
+    the whole collection.
+    """
+    from langchain_core.messages import HumanMessage
+    from app.models.vector_store import MessageVectorStore
+    
+    for size in collection_sizes:
+        vector_store = MessageVectorStore(namespace=f"benchmark_{size}")
+        session_ids = []
+        for start in range(0, size, COLLECTION_SESSION_LENGTH):
+            session_id = str(uuid.uuid4())
+            seed_vectors(vector_store, session_id, conversation(min(COLLECTION_SESSION_LENGTH, size - start), session_id))
+            session_ids.append(session_id)
+        target = session_ids[0]
+        params = {"collection_size": size}
+        
+        record(results, "vector_store.search_similar_messages", {**params, "scope": "session"}, measure(
+            lambda i: vector_store.search_similar_messages(f"Từ vựng HSK {i}", session_id=target, k=5),
+            iterations, warmup
+        ))
+        record(results, "vector_store.search_similar_messages", {**params, "scope": "collection"}, measure(
+            lambda i: vector_store.search_similar_messages(f"Từ vựng HSK {i}", k=5),
+            iterations, warmup
+        ))
+        
+        # Written to a session of its own, so the searched session keeps its size
+        writes_session = str(uuid.uuid4())
+        record(results, "vector_store.add_message", params, measure(
+            lambda i: vector_store.add_message(HumanMessage(content=f"Tin nhắn mới {i}"), writes_session),
+            iterations, warmup
+        ))
+        
+        # Free the memory of the in-process collection; the client is shared, so it stays open
+        vector_store.client.delete_collection(vector_store.collection_name)
+
+def bench_history(results: List[Dict[str, Any]], session_lengths: Sequence[int], iterations: int, warmup: int) -> None:
+    """Time LimitedMongoDBChatMessageHistory.messages at each session length."""
+    from app.models.memory import LimitedMongoDBChatMessageHistory
+    
+    for length in session_lengths:
+        history = LimitedMongoDBChatMessageHistory(seed_session(length), max_messages=10)
+        record(results, "history.messages", {"session_length": length}, measure(
+            lambda i: history.messages,
+            iterations, warmup
+        ))
+
+def bench_graph(results: List[Dict[str, Any]], session_lengths: Sequence[int], iterations: int, warmup: int) -> None:
+    """Time process_user_input with the fake LLM at each session length."""
+    from app.enum.model import ModelProvider
+    from app.graph.chat_graph import create_chat_graph, process_user_input
+    from app.models.vector_store import get_vector_store
+    
+    vector_store = get_vector_store(collection_name="chat_messages")
+    for length in session_lengths:
+        session_id = seed_session(length, vector_store)
+        graph = create_chat_graph(session_id, model_provider=ModelProvider.FAKE)
+        # Questions differ on every call, so the response cache does not answer them
+        record(results, "graph.process_user_input", {"session_length": length}, measure(
+            lambda i: process_user_input(graph, f"Câu hỏi mới số {i} về ngữ pháp HSK", session_id),
+            iterations, warmup
+        ))
+
+async def bench_api(results: List[Dict[str, Any]], session_lengths: Sequence[int], concurrency_levels: Sequence[int],
+                    iterations: int, warmup: int) -> None:
+    """
+    Time POST /api/chat through the whole application at each session length and concurrency.
+    
+    Each concurrent worker talks to a session of its own, as separate users would.
+    """
+    import httpx
+    from app import create_app
+    from app.core.init import startup_application
+    from app.models.vector_store import get_vector_store
+    
+    app = create_app()
+    startup_application()
+    vector_store = get_vector_store(collection_name="chat_messages")
+    
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for length in session_lengths:
+            for concurrency in concurrency_levels:
+                session_ids = [seed_session(length, vector_store) for _ in range(concurrency)]
+                
+                async def call(i: int, worker: int) -> None:
+                    response = await client.post("/api/chat", json={
+                        "user_input": f"Câu hỏi mới số {i} về ngữ pháp HSK",
+                        "session_id": session_ids[worker],
+                        "model_provider": "fake",
+                        "use_graph": True,
+                    })
+                    response.raise_for_status()
+                
+                record(results, "api.chat", {"session_length": length, "concurrency": concurrency},
+                       await ameasure(call, iterations, warmup, concurrency))
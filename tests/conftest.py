@@ -0,0 +1,70 @@
+"""
+Shared fixtures of the unit tests.
+
+MongoDB is replaced by mongomock and the sentence_transformers model by a
+deterministic hash model, so the tests need no external service or model download.
+"""
+
+import hashlib
+import threading
+from typing import Any, List, Optional
+
+import pytest
+
+# Size of the vectors of the hash model
+HASH_EMBEDDING_SIZE = 16
+
+class HashModel:
+    """Stand-in for a sentence_transformers model, recording the batches it encodes."""
+    
+    def __init__(self, model_name_or_path: Optional[str] = None, *args: Any, **kwargs: Any):
+        self.model_name = model_name_or_path
+        self.batches: List[List[str]] = []
+        self._lock = threading.Lock()
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        return HASH_EMBEDDING_SIZE
+    
+    def encode(self, sentences: List[str], **kwargs: Any) -> Any:
+        import numpy as np
+        
+        with self._lock:
+            self.batches.append(list(sentences))
+        vectors = np.empty((len(sentences), HASH_EMBEDDING_SIZE), dtype=np.float32)
+        for row, text in enumerate(sentences):
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vectors[row] = np.random.default_rng(seed).standard_normal(HASH_EMBEDDING_SIZE)
+        return vectors
+
+@pytest.fixture
+def hash_model(monkeypatch):
+    """Replace the embedding model by a hash model, with fresh model, batcher and embeddings registries."""
+    pytest.importorskip("sentence_transformers")
+    from app.models import embedding as embedding_module
+    
+    model = HashModel()
+    monkeypatch.setattr(embedding_module, "SentenceTransformer", lambda *args, **kwargs: model)
+    monkeypatch.setattr(embedding_module, "_models", {})
+    monkeypatch.setattr(embedding_module, "_batchers", {})
+    monkeypatch.setattr(embedding_module, "_embeddings", {})
+    yield model
+    embedding_module.close_embeddings()
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """Point the MongoDB connection manager at an empty mongomock server."""
+    mongomock = pytest.importorskip("mongomock")
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from app.repositories import mongodb as mongodb_module
+    from app.repositories import chat_session as chat_session_module
+    
+    # The asynchronous client wraps the synchronous one, so both see the same data
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(mongodb_module, "MongoClient", lambda *args, **kwargs: client)
+    monkeypatch.setattr(mongodb_module, "AsyncIOMotorClient",
+                        lambda *args, **kwargs: mongomock_motor.AsyncMongoMockClient(mock_mongo_client=client))
+    monkeypatch.setattr(mongodb_module, "_connection_manager", None)
+    monkeypatch.setattr(chat_session_module, "_indexes_ready", False)
+    chat_session_module._bucket_sizes.clear()
+    yield client
+    chat_session_module._bucket_sizes.clear()
@@ -0,0 +1,105 @@
+"""
+Tests of the LRU/TTL cache.
+"""
+
+import pytest
+
+pytest.importorskip("pydantic")
+
+from app.utils import cache as cache_module
+from app.utils.cache import LRUTTLCache
+
+class FakeClock:
+    """Replacement for the time module of the cache, moved by hand."""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def monotonic(self) -> float:
+        return self.now
+
+def test_evicts_least_recently_used_entry():
+    cache = LRUTTLCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    
+    assert cache.peek("a") == 1
+    assert cache.peek("b") is None
+    assert cache.peek("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_evicts_until_under_byte_budget():
+    evicted = []
+    cache = LRUTTLCache(max_entries=10, max_bytes=100, on_evict=lambda key, value: evicted.append(key))
+    cache.set("a", 1, size=40)
+    cache.set("b", 2, size=40)
+    cache.set("c", 3, size=40)
+    
+    assert evicted == ["a"]
+    assert cache.stats()["bytes"] == 80
+
+def test_rejects_entry_larger_than_byte_budget():
+    cache = LRUTTLCache(max_entries=10, max_bytes=100)
+    cache.set("small", 1, size=50)
+    cache.set("huge", 2, size=101)
+    
+    assert cache.peek("huge") is None
+    assert cache.peek("small") == 1
+    stats = cache.stats()
+    assert stats["rejections"] == 1
+    assert stats["bytes"] == 50
+
+def test_oversized_replacement_drops_previous_value():
+    cache = LRUTTLCache(max_entries=10, max_bytes=100)
+    cache.set("a", 1, size=50)
+    cache.set("a", 2, size=150)
+    
+    assert cache.peek("a") is None
+    assert cache.stats()["bytes"] == 0
+
+def test_resize_past_byte_budget_evicts_entry():
+    cache = LRUTTLCache(max_entries=10, max_bytes=100)
+    cache.set("a", 1, size=60)
+    cache.set("b", 2, size=30)
+    cache.resize("a", 50)
+    
+    assert cache.peek("a") is None
+    assert cache.peek("b") == 2
+    assert cache.stats()["bytes"] == 30
+
+def test_resize_evicts_others_to_fit():
+    cache = LRUTTLCache(max_entries=10, max_bytes=100)
+    cache.set("a", 1, size=40)
+    cache.set("b", 2, size=40)
+    cache.resize("b", 30)
+    
+    assert cache.peek("a") is None
+    assert cache.peek("b") == 2
+    assert cache.stats()["bytes"] == 70
+
+def test_idle_entries_expire(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module, "time", clock)
+    cache = LRUTTLCache(max_entries=10, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    
+    clock.now += 45
+    assert cache.get("a") == 1
+    clock.now += 45
+    
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.stats()["expirations"] == 1
+
+def test_invalidate_calls_on_evict():
+    evicted = []
+    cache = LRUTTLCache(max_entries=10, on_evict=lambda key, value: evicted.append((key, value)))
+    cache.set("a", 1)
+    cache.invalidate("a")
+    cache.invalidate("missing")
+    
+    assert evicted == [("a", 1)]
+    assert cache.stats()["invalidations"] == 1
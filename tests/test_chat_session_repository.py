@@ -0,0 +1,130 @@
+"""
+Tests of the bucketed chat session store.
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from pymongo.errors import DuplicateKeyError
+from app.repositories.chat_session import ChatSessionRepository, CHAT_SESSION_MESSAGES_COLLECTION
+
+def _turns(count):
+    """Build count alternating user and assistant messages."""
+    return [("user" if seq % 2 == 0 else "assistant", f"message {seq}") for seq in range(count)]
+
+def test_messages_are_split_into_buckets(mongo):
+    repo = ChatSessionRepository(bucket_size=3)
+    session_id = repo.create_session()
+    turns = _turns(7)
+    for offset in range(0, 7, 2):
+        assert repo.save_messages(session_id, turns[offset:offset + 2])
+    
+    messages = repo.get_messages(session_id)
+    assert [message["content"] for message in messages] == [content for _, content in turns]
+    assert [message["seq"] for message in messages] == list(range(7))
+    assert repo.messages_collection.count_documents({"session_id": session_id}) == 3
+    assert repo.get_session(session_id)["message_count"] == 7
+
+def test_get_messages_pages_back(mongo):
+    repo = ChatSessionRepository(bucket_size=3)
+    session_id = repo.create_session()
+    repo.save_messages(session_id, _turns(8))
+    
+    assert [message["seq"] for message in repo.get_messages(session_id, limit=4)] == [4, 5, 6, 7]
+    assert [message["seq"] for message in repo.get_messages(session_id, limit=2, before=4)] == [2, 3]
+    assert [message["seq"] for message in repo.get_messages(session_id, before=2)] == [0, 1]
+    assert repo.get_messages(session_id, before=0) == []
+
+def test_bucket_size_is_recorded_on_the_session(mongo):
+    session_id = ChatSessionRepository(bucket_size=3).create_session()
+    
+    # A process configured with another size keeps using the session's own size
+    repo = ChatSessionRepository(bucket_size=5)
+    assert repo.get_bucket_size(session_id) == 3
+    repo.save_messages(session_id, _turns(7))
+    
+    buckets = list(repo.messages_collection.find({"session_id": session_id}).sort("bucket", 1))
+    assert [bucket["count"] for bucket in buckets] == [3, 3, 1]
+    assert [message["seq"] for message in repo.get_messages(session_id, limit=4)] == [3, 4, 5, 6]
+
+def test_append_with_the_same_reservation_is_idempotent(mongo):
+    repo = ChatSessionRepository(bucket_size=3)
+    session_id = repo.create_session()
+    first_seq, bucket_size = repo.reserve_messages(session_id, 4)
+    
+    repo.append_messages(session_id, first_seq, bucket_size, _turns(4))
+    repo.append_messages(session_id, first_seq, bucket_size, _turns(4))
+    
+    assert [message["seq"] for message in repo.get_messages(session_id)] == [0, 1, 2, 3]
+
+def test_racing_bucket_insert_is_retried(mongo, monkeypatch):
+    repo = ChatSessionRepository(bucket_size=3)
+    session_id = repo.create_session()
+    update_one = repo.messages_collection.update_one
+    calls = []
+    
+    def racing_update_one(bucket_filter, bucket_update, upsert=False):
+        # The first upsert loses the race against a concurrent insert of the same bucket
+        calls.append(upsert)
+        if upsert and len(calls) == 1:
+            update_one({"session_id": session_id, "bucket": 0},
+                       {"$setOnInsert": {"messages": [], "count": 0}}, upsert=True)
+            raise DuplicateKeyError("E11000 duplicate key error")
+        return update_one(bucket_filter, bucket_update, upsert=upsert)
+    
+    monkeypatch.setattr(repo.messages_collection, "update_one", racing_update_one)
+    assert repo.save_messages(session_id, _turns(2))
+    
+    assert calls == [True, False]
+    assert [message["seq"] for message in repo.get_messages(session_id)] == [0, 1]
+
+def test_save_to_missing_session_fails(mongo):
+    repo = ChatSessionRepository()
+    
+    assert not repo.save_messages("missing", _turns(2))
+    assert repo.reserve_messages("missing", 2) is None
+    assert mongo.get_database(repo.db.name)[CHAT_SESSION_MESSAGES_COLLECTION].count_documents({}) == 0
+
+def test_async_reads_and_writes(mongo):
+    repo = ChatSessionRepository(bucket_size=3)
+    
+    async def run():
+        session_id = await repo.acreate_session()
+        assert await repo.asave_messages(session_id, _turns(5))
+        assert await repo.aget_bucket_size(session_id) == 3
+        return await repo.aget_messages(session_id, limit=3)
+    
+    assert [message["seq"] for message in asyncio.run(run())] == [2, 3, 4]
+
+def test_unmigrated_sessions_are_not_appended_to(mongo):
+    from app.scripts.migrate_chat_sessions import migrate_chat_sessions
+    
+    repo = ChatSessionRepository()
+    repo.collection.insert_one({"session_id": "legacy", "messages": [
+        {"role": role, "content": content, "timestamp": 0} for role, content in _turns(2)
+    ]})
+    assert not repo.save_messages("legacy", [("user", "new")])
+    
+    assert migrate_chat_sessions()["sessions"] == 1
+    assert repo.save_messages("legacy", [("user", "new")])
+    assert [message["content"] for message in repo.get_messages("legacy")] == ["message 0", "message 1", "new"]
+
+def test_migration_merges_messages_appended_before_it(mongo):
+    from app.scripts.migrate_chat_sessions import migrate_chat_sessions
+    
+    repo = ChatSessionRepository()
+    repo.collection.insert_one({"session_id": "legacy", "messages": [
+        {"role": role, "content": content, "timestamp": 0} for role, content in _turns(2)
+    ]})
+    # An older version appended to the session without migrating it
+    repo.collection.update_one({"session_id": "legacy"}, {"$set": {"message_count": 1}})
+    repo.append_messages("legacy", 0, repo.bucket_size, [("user", "new")])
+    
+    stats = migrate_chat_sessions()
+    assert stats["merged_sessions"] == 1
+    assert [message["content"] for message in repo.get_messages("legacy")] == ["message 0", "message 1", "new"]
+    assert [message["seq"] for message in repo.get_messages("legacy")] == [0, 1, 2]
+    assert repo.get_session("legacy")["message_count"] == 3
@@ -0,0 +1,84 @@
+"""
+Tests of the shared embeddings and their micro-batcher.
+"""
+
+import threading
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from conftest import HASH_EMBEDDING_SIZE
+
+def _in_thread(target, timeout=5):
+    """Run target in a thread, failing if it does not return in time."""
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("value", target()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "call did not return, deadlocked?"
+    return result["value"]
+
+def test_get_embeddings_builds_the_shared_instance(hash_model):
+    from app.models.embedding import get_embeddings
+    
+    embeddings = _in_thread(get_embeddings)
+    assert get_embeddings() is embeddings
+    
+    vector = _in_thread(lambda: embeddings.embed_query("xin chào"))
+    assert len(vector) == HASH_EMBEDDING_SIZE
+    assert embeddings.embed_documents(["xin chào"]) == [vector]
+    assert embeddings.embed_documents([]) == []
+
+def test_concurrent_requests_share_a_batch(hash_model):
+    from app.models.embedding import EmbeddingBatcher
+    
+    batcher = EmbeddingBatcher(max_batch_size=64, max_wait_ms=500)
+    futures = [batcher.submit([f"text {i}", f"other {i}"]) for i in range(4)]
+    results = [future.result(timeout=5) for future in futures]
+    batcher.close()
+    
+    assert [result.shape for result in results] == [(2, HASH_EMBEDDING_SIZE)] * 4
+    assert len(hash_model.batches) == 1
+    # Each caller gets the rows of its own texts
+    assert (results[2] == hash_model.encode(["text 2", "other 2"])).all()
+
+def test_full_batch_is_encoded_without_waiting(hash_model):
+    from app.models.embedding import EmbeddingBatcher
+    
+    batcher = EmbeddingBatcher(max_batch_size=2, max_wait_ms=60000)
+    assert batcher.submit(["a", "b"]).result(timeout=5).shape == (2, HASH_EMBEDDING_SIZE)
+    batcher.close()
+
+def test_encode_errors_reach_every_caller(hash_model, monkeypatch):
+    from app.models.embedding import EmbeddingBatcher
+    
+    def broken_encode(sentences, **kwargs):
+        raise ValueError("model failed")
+    
+    monkeypatch.setattr(hash_model, "encode", broken_encode)
+    batcher = EmbeddingBatcher(max_wait_ms=0)
+    with pytest.raises(ValueError):
+        batcher.submit(["a"]).result(timeout=5)
+    batcher.close()
+
+def test_closed_batcher_rejects_requests(hash_model):
+    from app.models.embedding import EmbeddingBatcher
+    
+    batcher = EmbeddingBatcher(max_wait_ms=0)
+    assert batcher.encode(["a"]).shape == (1, HASH_EMBEDDING_SIZE)
+    _in_thread(batcher.close)
+    
+    with pytest.raises(RuntimeError):
+        batcher.submit(["b"])
+
+def test_close_embeddings_stops_the_batchers(hash_model):
+    from app.models.embedding import close_embeddings, get_embeddings
+    
+    embeddings = get_embeddings()
+    embeddings.embed_query("a")
+    _in_thread(close_embeddings)
+    
+    with pytest.raises(RuntimeError):
+        embeddings.embed_query("b")
+    assert get_embeddings() is not embeddings
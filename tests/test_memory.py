@@ -0,0 +1,48 @@
+"""
+Tests of the cached conversation memories.
+"""
+
+import pytest
+
+pytest.importorskip("langchain")
+
+from langchain_core.messages import AIMessage, HumanMessage
+from app.core.config import settings
+from app.repositories.chat_session import ChatSessionRepository
+from app.services import memory as memory_service
+
+@pytest.fixture
+def memory_cache(monkeypatch):
+    """A fresh memory cache keeping the last 4 messages of a session."""
+    monkeypatch.setattr(settings, "MEMORY_CACHE_MAX_MESSAGES", 4)
+    cache = memory_service.LRUTTLCache(max_entries=10, max_bytes=1 << 20)
+    monkeypatch.setattr(memory_service, "_memory_cache", cache)
+    return cache
+
+def _contents(memory):
+    return [message.content for message in memory.chat_memory.messages]
+
+def test_memory_loads_only_the_recent_window(mongo, memory_cache):
+    repo = ChatSessionRepository(bucket_size=3)
+    session_id = repo.create_session()
+    repo.save_messages(session_id, [("user" if i % 2 == 0 else "assistant", f"m{i}") for i in range(10)])
+    
+    memory = memory_service.get_memory(session_id)
+    assert _contents(memory) == ["m6", "m7", "m8", "m9"]
+    assert memory_service.get_memory(session_id) is memory
+
+def test_remembered_messages_keep_the_window(mongo, memory_cache):
+    repo = ChatSessionRepository()
+    session_id = repo.create_session()
+    repo.save_messages(session_id, [("user", "m0"), ("assistant", "m1"), ("user", "m2")])
+    memory = memory_service.get_memory(session_id)
+    
+    memory_service.remember_messages(session_id, [AIMessage(content="m3"), HumanMessage(content="m4"), AIMessage(content="m5")])
+    
+    assert _contents(memory) == ["m2", "m3", "m4", "m5"]
+    expected_bytes = sum(memory_service._message_size(content) for content in _contents(memory))
+    assert memory_cache.stats()["bytes"] == expected_bytes
+
+def test_remember_ignores_sessions_not_cached(mongo, memory_cache):
+    memory_service.remember_messages("not-cached", [HumanMessage(content="hello")])
+    assert memory_cache.stats()["entries"] == 0
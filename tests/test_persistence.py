@@ -0,0 +1,246 @@
+"""
+Tests of the write-behind persistence queue.
+"""
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from app.services.persistence import PersistenceJob, WriteBehindQueue
+
+def _queue(sinks, **kwargs):
+    """Build a queue that retries without waiting and replays only when asked."""
+    options = {"max_retries": 1, "retry_backoff_ms": 0, "max_wait_ms": 0, "replay_interval": 3600}
+    options.update(kwargs)
+    return WriteBehindQueue(sinks, **options)
+
+def _wait_until(condition, timeout=5):
+    """Poll a condition until it holds or the timeout passes."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+def test_jobs_are_written_by_every_sink_in_order():
+    written = []
+    
+    def first_sink(job):
+        written.append(("first", job.session_id))
+    
+    def second_sink(job):
+        written.append(("second", job.session_id))
+    
+    write_queue = _queue([first_sink, second_sink], max_batch_size=1)
+    for session_id in ("a", "b"):
+        write_queue.submit(PersistenceJob(session_id))
+    assert write_queue.drain(timeout=5)
+    
+    assert written == [("first", "a"), ("second", "a"), ("first", "b"), ("second", "b")]
+    assert write_queue.stats()["jobs_written"] == 2
+
+def test_retry_does_not_rewrite_other_jobs():
+    writes = []
+    failures = {"b": 1}
+    
+    def flaky_sink(job):
+        if failures.get(job.session_id):
+            failures[job.session_id] -= 1
+            raise RuntimeError("store unavailable")
+        writes.append(job.session_id)
+    
+    write_queue = _queue([flaky_sink], max_batch_size=10, max_wait_ms=50)
+    for session_id in ("a", "b", "c"):
+        write_queue.submit(PersistenceJob(session_id))
+    assert write_queue.drain(timeout=5)
+    
+    assert sorted(writes) == ["a", "b", "c"]
+    stats = write_queue.stats()
+    assert stats["retries"] == 1
+    assert stats["jobs_failed"] == 0
+
+def test_failed_job_is_kept_and_replayed():
+    healthy = threading.Event()
+    writes = []
+    
+    def sink(job):
+        if job.session_id == "bad" and not healthy.is_set():
+            raise RuntimeError("store unavailable")
+        writes.append(job.session_id)
+    
+    write_queue = _queue([sink], max_batch_size=1)
+    for session_id in ("good", "bad", "other"):
+        write_queue.submit(PersistenceJob(session_id))
+    for session_id in ("good", "other"):
+        assert write_queue.wait_for_session(session_id, timeout=5)
+    # The failed session stays pending until its write is replayed
+    assert not write_queue.wait_for_session("bad", timeout=5)
+    
+    failed = write_queue.failed_writes()
+    assert [failed_write.job.session_id for failed_write in failed] == ["bad"]
+    assert failed[0].error == "store unavailable"
+    assert writes == ["good", "other"]
+    
+    # The last replay runs when the queue is drained
+    healthy.set()
+    assert write_queue.drain(timeout=5)
+    assert writes == ["good", "other", "bad"]
+    stats = write_queue.stats()
+    assert stats["jobs_failed"] == 1
+    assert stats["jobs_replayed"] == 1
+    assert stats["failed_writes"] == 0
+
+def test_replay_runs_only_the_sinks_that_failed():
+    healthy = threading.Event()
+    writes = []
+    
+    def first_sink(job):
+        writes.append("first")
+    
+    def second_sink(job):
+        if not healthy.is_set():
+            raise RuntimeError("store unavailable")
+        writes.append("second")
+    
+    write_queue = _queue([first_sink, second_sink])
+    write_queue.submit(PersistenceJob("a"))
+    assert _wait_until(lambda: write_queue.stats()["failed_writes"] == 1)
+    assert [failed.sinks for failed in write_queue.failed_writes()] == [[second_sink]]
+    
+    healthy.set()
+    assert write_queue.drain(timeout=5)
+    assert writes == ["first", "second"]
+
+def test_submit_does_not_block_when_full():
+    started = threading.Event()
+    release = threading.Event()
+    writes = []
+    
+    def slow_sink(job):
+        started.set()
+        release.wait(5)
+        writes.append(job.session_id)
+    
+    write_queue = _queue([slow_sink], max_batch_size=1, max_queue_size=1)
+    write_queue.submit(PersistenceJob("a"))
+    assert started.wait(5)
+    write_queue.submit(PersistenceJob("b"))
+    # The queue is full: the job is kept for replay instead of blocking the caller
+    write_queue.submit(PersistenceJob("c"))
+    
+    assert write_queue.stats()["jobs_rejected"] == 1
+    assert [failed.job.session_id for failed in write_queue.failed_writes()] == ["c"]
+    assert not write_queue.wait_for_session("c", timeout=0)
+    
+    release.set()
+    assert write_queue.drain(timeout=5)
+    assert writes == ["a", "b", "c"]
+
+def test_oldest_failed_writes_are_dropped_beyond_the_limit():
+    def failing_sink(job):
+        raise RuntimeError("store unavailable")
+    
+    write_queue = _queue([failing_sink], max_batch_size=1, max_retries=0, max_failed_writes=2)
+    for session_id in ("a", "b", "c"):
+        write_queue.submit(PersistenceJob(session_id))
+    assert _wait_until(lambda: write_queue.stats()["jobs_failed"] == 3)
+    
+    assert [failed.job.session_id for failed in write_queue.failed_writes()] == ["b", "c"]
+    assert write_queue.stats()["jobs_dropped"] == 1
+    # Only the dropped write releases its session
+    assert write_queue.wait_for_session("a", timeout=0)
+    assert not write_queue.wait_for_session("b", timeout=0)
+    write_queue.drain(timeout=5)
+
+def test_later_jobs_of_a_failed_session_are_held_behind_it():
+    healthy = threading.Event()
+    writes = []
+    
+    def sink(job):
+        if job.session_id == "a" and not healthy.is_set():
+            raise RuntimeError("store unavailable")
+        writes.append((job.session_id, job.order))
+    
+    write_queue = _queue([sink], max_batch_size=1)
+    for session_id in ("a", "b", "a"):
+        write_queue.submit(PersistenceJob(session_id))
+    assert write_queue.wait_for_session("b", timeout=5)
+    assert _wait_until(lambda: write_queue.stats()["failed_writes"] == 2)
+    
+    # The second job of the session is not tried while the first one is failed
+    healthy.set()
+    failed = write_queue.failed_writes()
+    assert [(failed_write.job.session_id, failed_write.job.order) for failed_write in failed] == [("a", 1), ("a", 3)]
+    assert write_queue.stats()["jobs_held"] == 1
+    
+    assert write_queue.drain(timeout=5)
+    assert writes == [("b", 2), ("a", 1), ("a", 3)]
+    assert write_queue.stats()["pending_sessions"] == 0
+
+def test_sink_failure_does_not_skip_other_sessions():
+    writes = []
+    
+    def sink(job):
+        if job.session_id == "a":
+            raise RuntimeError("store unavailable")
+        writes.append(job.session_id)
+    
+    write_queue = _queue([sink], max_batch_size=10, max_wait_ms=50)
+    for session_id in ("a", "b", "c"):
+        write_queue.submit(PersistenceJob(session_id))
+    assert write_queue.wait_for_session("b", timeout=5)
+    assert write_queue.wait_for_session("c", timeout=5)
+    
+    assert writes == ["b", "c"]
+    assert [failed.job.session_id for failed in write_queue.failed_writes()] == ["a"]
+    write_queue.drain(timeout=5)
+
+def test_rejected_job_is_replayed_after_the_queued_jobs_of_its_session():
+    started = threading.Event()
+    release = threading.Event()
+    writes = []
+    
+    def slow_sink(job):
+        started.set()
+        release.wait(5)
+        writes.append((job.session_id, job.order))
+    
+    write_queue = _queue([slow_sink], max_batch_size=1, max_queue_size=1)
+    write_queue.submit(PersistenceJob("x"))
+    assert started.wait(5)
+    write_queue.submit(PersistenceJob("a"))
+    # The queue is full: the second turn of the session is rejected
+    write_queue.submit(PersistenceJob("a"))
+    
+    release.set()
+    assert write_queue.drain(timeout=5)
+    assert writes == [("x", 1), ("a", 2), ("a", 3)]
+
+def test_drain_does_not_block_when_the_queue_is_full():
+    started = threading.Event()
+    release = threading.Event()
+    
+    def slow_sink(job):
+        started.set()
+        release.wait(5)
+    
+    write_queue = _queue([slow_sink], max_batch_size=1, max_queue_size=1)
+    write_queue.submit(PersistenceJob("a"))
+    assert started.wait(5)
+    write_queue.submit(PersistenceJob("b"))
+    
+    began = time.monotonic()
+    assert not write_queue.drain(timeout=0.2)
+    assert time.monotonic() - began < 2
+    release.set()
+
+def test_submit_after_drain_fails():
+    write_queue = _queue([lambda job: None])
+    write_queue.drain(timeout=5)
+    
+    with pytest.raises(RuntimeError):
+        write_queue.submit(PersistenceJob("a"))
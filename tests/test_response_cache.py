@@ -0,0 +1,72 @@
+"""
+Tests of the response cache and of the turns allowed to use it.
+"""
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+
+from langchain_core.embeddings import Embeddings
+from app.models.response_cache import ResponseCache, ResponseCacheScope, normalize_query, query_numbers
+
+SCOPE = ResponseCacheScope("fake", "fake-model", "mia_system@1")
+
+class DigitBlindEmbeddings(Embeddings):
+    """Embeddings ignoring digits, so questions differing by a number embed the same."""
+    
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+    
+    def embed_query(self, text):
+        text = "".join(char for char in text.casefold() if not char.isdigit())
+        return [float("từ" in text), float("ngữ pháp" in text), 1.0]
+
+def _cache():
+    return ResponseCache(embeddings=DigitBlindEmbeddings(), max_entries=10, max_bytes=1 << 20,
+                         ttl_seconds=0, similarity_threshold=0.99)
+
+def test_normalize_query():
+    assert normalize_query("  HSK1   có bao nhiêu từ?? ") == "hsk1 có bao nhiêu từ"
+
+def test_query_numbers():
+    assert query_numbers("HSK1 có bao nhiêu từ?") == ("1",)
+    assert query_numbers("HSK 4 và HSK５") == ("4", "5")
+    assert query_numbers("Xin chào") == ()
+
+def test_exact_match():
+    cache = _cache()
+    cache.store(SCOPE, "HSK1 có bao nhiêu từ?", "150 từ")
+    
+    lookup = cache.lookup(SCOPE, "hsk1 có bao nhiêu từ")
+    assert (lookup.response, lookup.match) == ("150 từ", "exact")
+
+def test_semantic_match_requires_the_same_numbers():
+    cache = _cache()
+    query = "HSK1 có bao nhiêu từ?"
+    cache.store(SCOPE, query, "150 từ", cache.embeddings.embed_query(query))
+    
+    assert cache.lookup(SCOPE, "HSK1 có tất cả bao nhiêu từ").match == "semantic"
+    assert cache.lookup(SCOPE, "HSK2 có bao nhiêu từ?").match == "miss"
+
+def test_entries_are_scoped():
+    cache = _cache()
+    cache.store(SCOPE, "HSK1 có bao nhiêu từ?", "150 từ")
+    
+    assert cache.lookup(SCOPE._replace(prompt_version="mia_system@2"), "HSK1 có bao nhiêu từ?").match == "miss"
+    assert cache.lookup(SCOPE._replace(provider="openai"), "HSK1 có bao nhiêu từ?").match == "miss"
+
+def test_only_turns_without_session_context_are_cacheable():
+    pytest.importorskip("langgraph")
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+    from app.graph.chat_graph import _cacheable_query
+    from app.utils.get_prompt import MIA_SYSTEM_PROMPT, get_compiled_prompt
+    
+    system = SystemMessage(content=get_compiled_prompt(MIA_SYSTEM_PROMPT).text)
+    question = HumanMessage(content="HSK1 có bao nhiêu từ?")
+    
+    assert _cacheable_query([system, question]) == "HSK1 có bao nhiêu từ?"
+    # A retrieved message or the history of the session makes the answer session-specific
+    assert _cacheable_query([SystemMessage(content=system.content + "\nTin nhắn liên quan: ..."), question]) is None
+    assert _cacheable_query([system, HumanMessage(content="Xin chào"), AIMessage(content="Chào bạn"), question]) is None
+    assert _cacheable_query([question]) is None
@@ -0,0 +1,80 @@
+"""
+Tests of the in-process session vector index.
+"""
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from app.models.session_vector_cache import SessionVectorCache, SessionVectorIndex
+
+TYPE_KEY = ("metadata", "type")
+
+def _point(point_id, vector, message_type="human"):
+    """Build a cached point of a message."""
+    return (point_id, vector, {"page_content": point_id, "metadata": {"type": message_type}})
+
+def _cache(**kwargs):
+    options = {"max_sessions": 10, "max_bytes": 1 << 20, "ttl_seconds": 0, "max_points": 100}
+    options.update(kwargs)
+    return SessionVectorCache(3, TYPE_KEY, **options)
+
+def test_search_ranks_by_cosine_similarity():
+    index = SessionVectorIndex(3, TYPE_KEY, capacity=1)
+    index.add([
+        _point("x", [1, 0, 0]),
+        _point("xy", [1, 1, 0], "ai"),
+        _point("y", [0, 2, 0]),
+    ])
+    
+    results = index.search([1, 0.1, 0], k=2)
+    assert [point_id for point_id, _, _ in results] == ["x", "xy"]
+    assert results[0][1] == pytest.approx(0.995, abs=1e-3)
+    assert [point_id for point_id, _, _ in index.search([1, 0, 0], k=3, filter_type="ai")] == ["xy"]
+
+def test_add_skips_known_points():
+    index = SessionVectorIndex(3, TYPE_KEY)
+    assert index.add([_point("x", [1, 0, 0])]) > 0
+    assert index.add([_point("x", [0, 1, 0])]) == 0
+    assert len(index) == 1
+
+def test_appends_during_load_are_merged():
+    cache = _cache()
+    cache.begin_load("s")
+    cache.append("s", [_point("new", [0, 1, 0])])
+    index = cache.finish_load("s", [_point("old", [1, 0, 0])])
+    
+    assert len(index) == 2
+    assert cache.get("s") is index
+    cache.append("s", [_point("newer", [0, 0, 1])])
+    assert len(index) == 3
+
+def test_invalidate_during_load_discards_the_loaded_points():
+    cache = _cache()
+    cache.begin_load("s")
+    cache.invalidate("s")
+    
+    assert cache.finish_load("s", [_point("deleted", [1, 0, 0])]) is None
+    assert cache.get("s") is None
+
+def test_invalidate_drops_the_index():
+    cache = _cache()
+    cache.begin_load("s")
+    cache.finish_load("s", [_point("x", [1, 0, 0])])
+    cache.invalidate("s")
+    
+    assert cache.get("s") is None
+    cache.append("s", [_point("y", [0, 1, 0])])
+    assert cache.get("s") is None
+
+def test_sessions_over_max_points_are_not_cached():
+    cache = _cache(max_points=2)
+    cache.begin_load("big")
+    assert cache.finish_load("big", [_point(str(i), [1, i, 0]) for i in range(3)]) is None
+    assert cache.is_oversized("big")
+    
+    cache.begin_load("growing")
+    cache.finish_load("growing", [_point("a", [1, 0, 0])])
+    cache.append("growing", [_point("b", [0, 1, 0]), _point("c", [0, 0, 1])])
+    assert cache.get("growing") is None
+    assert cache.is_oversized("growing")